@@ -1,48 +1,226 @@
-from flask import Flask, render_template
+import time
+import uuid
+from datetime import date, datetime, timedelta
+import click
+from flask import Flask, render_template, jsonify, Response
+from mysql.connector import Error
 from routes import register_blueprints
-from db import get_connection
+from db import get_connection, get_pool, pool_stats, PoolError
+from cache import cache_stats
+from refdata import get_hotels, warm_up as warm_refdata
+from rollups import rebuild as rebuild_rollups
+from archive import archive_bookings
+from reservations import cancel_bookings
+from bulk_import import run_import, detect_format, DATASETS
+import metrics
+import sessions
+import assets
+import jobs
+import ratecalendar
+from pagecache import cached_page, cached_fragment, precompile_templates
 from config import Config
 
-app = Flask(__name__, static_url_path='/static')
-app.config.from_object(Config)
-app.secret_key = 'secret.key'
+
+def create_app(config=Config):
+    app = Flask(__name__, static_url_path='/static')
+    app.config.from_object(config)
+    app.secret_key = 'secret.key'
+    metrics.init_app(app)
+    sessions.init_app(app, config)
+    assets.init_app(app)
+    register_pages(app)
+    register_stats(app)
+    register_commands(app)
+    register_blueprints(app)
+    if config.TEMPLATE_PRECOMPILE:
+        precompile_templates(app)
+    return app
+
+
+def warm_up(app):
+    """Open pool connections and fill the reference caches before taking traffic."""
+    try:
+        get_pool().warm(Config.WARMUP_CONNECTIONS)
+        warm_refdata()
+        # Builds every hotel's rate calendar in the background, then keeps it fresh.
+        ratecalendar.start_refresher()
+    except (PoolError, Error) as e:
+        # Requests will connect lazily once the database is reachable.
+        app.logger.warning("Warm-up skipped: %s", e)
+        return False
+    app.logger.info("Warm-up done: %s", pool_stats())
+    return True
+
 
 # ---------- Static Page Routes ----------
-@app.route('/')
-def main_page():
-    return render_template('projectMainPage.html')
+def register_pages(app):
+    @app.route('/')
+    def main_page():
+        return cached_page('projectMainPage.html')
+
+    @app.route('/Information.html')
+    def info():
+        return cached_page('Information.html')
+
+    @app.route('/login.html')
+    def login():
+        return cached_page('login.html')
+
+    @app.route('/signUp.html')
+    def signup():
+        return cached_page('signUp.html')
+
+    @app.route('/booking.html', methods=['GET'])
+    def show_booking_form():
+        hotels = get_hotels()
+        hotel_options = cached_fragment('hotel_options', hotels, 'hotel_options.html', hotels=hotels)
+        return render_template('booking.html', hotel_options=hotel_options, idempotency_key=uuid.uuid4().hex)
+
+    @app.route('/ForgotPassword.html')
+    def forgot_password():
+        return cached_page('ForgotPassword.html')
+
+    @app.route('/change_password.html')
+    def change_password():
+        return cached_page('ChangePassword.html')
+
+# ---------- Stats ----------
+def register_stats(app):
+    @app.route('/pool_stats')
+    def show_pool_stats():
+        return jsonify(pool_stats())
+
+    @app.route('/cache_stats')
+    def show_cache_stats():
+        return jsonify(cache_stats())
+
+    @app.route('/job_stats')
+    def show_job_stats():
+        return jsonify(jobs.queue_stats())
+
+    @app.route('/metrics')
+    def show_metrics():
+        pool = pool_stats()
+        caches = cache_stats()
+        queue = jobs.queue_stats()
+        extra = [
+            ('worldhotels_db_pool_connections', 'gauge', 'Pool connections by state.', 'state',
+             {'in_use': pool['in_use'], 'idle': pool['idle'], 'max': pool['size']}),
+            ('worldhotels_db_pool_events_total', 'counter', 'Pool checkouts, waits, timeouts and connect errors.', 'event',
+             {key: pool[key] for key in ('checkouts', 'waits', 'timeouts', 'connect_errors', 'fast_failures', 'discarded')}),
+            ('worldhotels_cache_hits_total', 'counter', 'Cache hits.', 'cache',
+             {name: stats['hits'] for name, stats in caches.items()}),
+            ('worldhotels_cache_misses_total', 'counter', 'Cache misses.', 'cache',
+             {name: stats['misses'] for name, stats in caches.items()}),
+            ('worldhotels_cache_entries', 'gauge', 'Entries currently cached.', 'cache',
+             {name: stats['size'] for name, stats in caches.items()}),
+            ('worldhotels_jobs', 'gauge', 'Background jobs by state (shared by every worker on the host).', 'state',
+             {state: queue[state] for state in ('queued', 'running', 'dead')}),
+            ('worldhotels_jobs_oldest_queued_seconds', 'gauge', 'Age of the oldest job waiting to run.', None,
+             {'': queue['oldest_queued_age_s']}),
+        ]
+        return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4')
+
+# ---------- CLI Commands ----------
+def register_commands(app):
+    @app.cli.command('rebuild-rollups')
+    @click.option('--from', 'date_from', help="First day to rebuild (YYYY-MM-DD), default: all")
+    @click.option('--to', 'date_to', help="Last day to rebuild (YYYY-MM-DD), default: all")
+    def rebuild_rollups_command(date_from, date_to):
+        """Recompute DailyRollup from bookings and cancellations."""
+        with get_connection() as conn:
+            rebuild_rollups(conn, date_from, date_to)
+        click.echo("Rollups rebuilt.")
+
+    @app.cli.command('import-data')
+    @click.argument('dataset', type=click.Choice(DATASETS))
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'json']), help="Default: from the file extension")
+    def import_data_command(dataset, path, fmt):
+        """Bulk-load hotels, rooms or rates from a CSV or JSON file."""
+        with open(path, encoding='utf-8-sig', newline='') as stream, get_connection() as conn:
+            report = run_import(conn, dataset, stream, fmt or detect_format(path))
+        click.echo(f"{report.rows} rows: {report.inserted} inserted, {report.updated} updated, "
+                   f"{report.error_count} rejected.")
+        for line, message in report.errors:
+            click.echo(f"  line {line}: {message}", err=True)
 
-@app.route('/Information.html')
-def info():
-    return render_template('Information.html')
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Fingerprint, optimise and precompress static/ into static/dist."""
+        manifest = assets.build(app.static_folder)
+        click.echo(f"{len(manifest['files'])} assets built, {len(manifest['webp'])} WebP alternates.")
 
-@app.route('/login.html')
-def login():
-    return render_template('login.html')
+    @app.cli.command('archive-bookings')
+    @click.option('--before', help="Archive stays that checked out before this day (YYYY-MM-DD), "
+                                   "default: ARCHIVE_AFTER_DAYS ago")
+    @click.option('--batch-size', type=int, help="Bookings per transaction, default: ARCHIVE_BATCH_SIZE")
+    @click.option('--max-batches', type=int, help="Stop after this many batches, default: until done")
+    def archive_bookings_command(before, batch_size, max_batches):
+        """Move past stays into the archive tables (safe to run while serving; schedule it nightly)."""
+        cutoff = datetime.strptime(before, "%Y-%m-%d").date() if before else (
+            date.today() - timedelta(days=Config.ARCHIVE_AFTER_DAYS))
+        with get_connection() as conn:
+            moved = archive_bookings(conn, cutoff, batch_size or Config.ARCHIVE_BATCH_SIZE, Config.ARCHIVE_PAUSE,
+                                     max_batches)
+        click.echo(f"{moved} bookings that checked out before {cutoff} archived.")
 
-@app.route('/signUp.html')
-def signup():
-    return render_template('signUp.html')
+    @app.cli.command('cancel-bookings')
+    @click.option('--hotel-id', type=int, help="Cancel this hotel's bookings")
+    @click.option('--from', 'date_from', help="First check-in day to cancel (YYYY-MM-DD)")
+    @click.option('--to', 'date_to', help="Last check-in day to cancel (YYYY-MM-DD)")
+    @click.option('--charge-fees', is_flag=True, help="Charge the usual cancellation fees instead of waiving them")
+    def cancel_bookings_command(hotel_id, date_from, date_to, charge_fees):
+        """Cancel open bookings of a hotel and/or check-in range (e.g. a closure) that have not checked out."""
+        try:
+            date_from, date_to = (datetime.strptime(value, "%Y-%m-%d").date() if value else None
+                                  for value in (date_from, date_to))
+            with get_connection() as conn:
+                count, fees = cancel_bookings(conn, date.today(), hotel_id, date_from, date_to,
+                                              waive_fees=not charge_fees)
+        except ValueError as e:
+            raise click.UsageError(str(e))
+        click.echo(f"{count} bookings cancelled (fees £{fees:.2f}).")
 
-@app.route('/booking.html', methods=['GET'])
-def show_booking_form():
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT HotelID, HotelName FROM Hotel")
-        hotels = cursor.fetchall()
-    return render_template('booking.html', hotels=hotels)
+    @app.cli.command('run-jobs')
+    @click.option('--workers', type=int, help="Worker threads, default: JOBS_WORKERS")
+    def run_jobs_command(workers):
+        """Run background job workers in the foreground (alongside or instead of the web workers')."""
+        jobs.start_workers(workers)
+        click.echo("Processing jobs, Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            pass
 
-@app.route('/ForgotPassword.html')
-def forgot_password():
-    return render_template('ForgotPassword.html')
+    @app.cli.command('drain-outbox')
+    @click.option('--grace', type=int, help="Only jobs staged this many seconds ago or more, default: JOBS_OUTBOX_GRACE")
+    def drain_outbox_command(grace):
+        """Queue staged jobs whose hand-off to the queue was lost (the job workers also do this)."""
+        total = 0
+        with get_connection() as conn:
+            while True:
+                count = jobs.drain_outbox(conn, grace)
+                total += count
+                if count < jobs.OUTBOX_BATCH:
+                    break
+        click.echo(f"{total} staged jobs queued.")
 
-@app.route('/change_password.html')
-def change_password():
-    return render_template('change_password.html')
+    @app.cli.command('requeue-jobs')
+    @click.argument('job_ids', nargs=-1, type=int)
+    def requeue_jobs_command(job_ids):
+        """Put dead-lettered jobs (all, or the given ids) back on the queue."""
+        for job_id, name, payload, attempts, _, error in jobs.get_queue().dead_jobs():
+            if not job_ids or job_id in job_ids:
+                click.echo(f"  {job_id} {name} {payload} after {attempts} attempts: {error}")
+        click.echo(f"{jobs.get_queue().requeue_dead(list(job_ids))} jobs requeued.")
 
-# ---------- Register Blueprints ----------
-register_blueprints(app)
+# ---------- Application ----------
+app = create_app()
 
 # ---------- Run Application ----------
+# Development server only; production runs gunicorn with gunicorn.conf.py.
 if __name__ == '__main__':
+    jobs.start_workers()
     app.run(host='0.0.0.0', port=5001, debug=True)
@@ -0,0 +1,111 @@
+import time
+from reservations import run_transaction
+
+# Hot/cold tiering for bookings. Bookings that checked out more than
+# ARCHIVE_AFTER_DAYS ago move, with their receipts, cancellations and room
+# nights, into *Archive tables of the same shape (CREATE TABLE ... LIKE, so
+# without foreign keys). The live tables then only hold current and upcoming
+# stays, small enough to stay in the buffer pool. Each batch is one short
+# transaction, and batches are paced, so `flask archive-bookings` can run
+# while the site is live (e.g. nightly from cron).
+#
+# The archive tables are plain copies: any column added to Booking, Receipt,
+# Cancellations or RoomNight must be added to its archive table too.
+
+HOT, COLD = 'Booking', 'BookingArchive'
+# Child tables first: their rows must leave before the bookings they reference.
+CHILD_TABLES = (
+    ('Receipt', 'ReceiptArchive'),
+    ('Cancellations', 'CancellationsArchive'),
+    ('RoomNight', 'RoomNightArchive'),
+)
+
+
+# ---------- Moving bookings ----------
+def archive_batch(cursor, cutoff, batch_size):
+    """Move up to batch_size bookings that checked out before cutoff; returns how many moved."""
+    cursor.execute(f"""
+        SELECT BookingID FROM {HOT}
+        WHERE CheckOut < %s
+        ORDER BY CheckOut, BookingID
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (cutoff, batch_size))
+    ids = [row[0] for row in cursor.fetchall()]
+    if not ids:
+        return 0
+
+    placeholders = ", ".join(["%s"] * len(ids))
+    for hot, cold in CHILD_TABLES:
+        cursor.execute(f"INSERT INTO {cold} SELECT * FROM {hot} WHERE BookingID IN ({placeholders})", ids)
+        cursor.execute(f"DELETE FROM {hot} WHERE BookingID IN ({placeholders})", ids)
+    cursor.execute(f"INSERT INTO {COLD} SELECT * FROM {HOT} WHERE BookingID IN ({placeholders})", ids)
+    # The stay is over, so a booking that was still Confirmed is now Completed.
+    cursor.execute(f"""
+        UPDATE {COLD} SET Status = 'Completed'
+        WHERE BookingID IN ({placeholders}) AND Status = 'Confirmed'
+    """, ids)
+    cursor.execute(f"DELETE FROM {HOT} WHERE BookingID IN ({placeholders})", ids)
+    return len(ids)
+
+
+def archive_bookings(conn, cutoff, batch_size, pause=0.0, max_batches=None):
+    """Archive in batches until nothing is left before cutoff (or max_batches ran); returns the total moved."""
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        count = run_transaction(conn, 'archive', lambda cursor: archive_batch(cursor, cutoff, batch_size))
+        moved += count
+        batches += 1
+        if count < batch_size:
+            break
+        # Give replicas and concurrent bookings room between batches.
+        time.sleep(pause)
+    return moved
+
+
+# ---------- Reading both tiers ----------
+def fetch_bookings(cursor, columns, joins, clauses, params, order, limit):
+    """One keyset page of bookings from the hot table, topped up from the archive only when needed.
+
+    `columns` must start with b.BookingID and the page is ordered by it
+    (`order` is 'ASC' or 'DESC'). Every row gets a trailing `archived` flag
+    (1 for BookingArchive rows), since archived bookings are read-only.
+
+    The archive is read only when its MIN/MAX BookingID under the same
+    filters belongs on this page, which is usually only once the user pages
+    back past the hot rows. That probe is a single index lookup when the
+    filters are a UserID prefix (as on My Bookings); with admin filters such
+    as Status, a date range or a Username join it is a range scan of the
+    archive rows matching them, so it costs about as much as the filters
+    are selective.
+    """
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    def query(table, select, tail=""):
+        return f"SELECT {select} FROM {table} b {' '.join(joins)} {where} {tail}"
+
+    page_sql = f"ORDER BY b.BookingID {order} LIMIT %s"
+    cursor.execute(query(HOT, f"{columns}, 0", page_sql), list(params) + [limit])
+    rows = cursor.fetchall()
+
+    descending = order == 'DESC'
+    cursor.execute(query(COLD, f"{'MAX' if descending else 'MIN'}(b.BookingID)"), list(params))
+    edge = cursor.fetchone()[0]
+    if edge is None:
+        return rows
+    if len(rows) == limit and (edge < rows[-1][0] if descending else edge > rows[-1][0]):
+        return rows
+
+    cursor.execute(query(COLD, f"{columns}, 1", page_sql), list(params) + [limit])
+    merged = sorted(rows + cursor.fetchall(), key=lambda row: row[0], reverse=descending)
+    return merged[:limit]
+
+
+def count_bookings(cursor, clauses, params):
+    """Bookings matching clauses across both tiers."""
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    total = 0
+    for table in (HOT, COLD):
+        cursor.execute(f"SELECT COUNT(*) FROM {table} b {where}", list(params))
+        total += cursor.fetchone()[0]
+    return total
@@ -0,0 +1,207 @@
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import re
+import shutil
+from flask import current_app, request, send_from_directory, url_for
+from config import Config
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional: images are then copied unchanged
+    Image = None
+
+try:
+    import brotli
+except ImportError:  # brotli is optional: only gzip variants are written
+    brotli = None
+
+# Asset pipeline. `flask build-assets` copies static/ into static/dist/ under
+# content-hashed names and writes manifest.json. While building it:
+# - downsizes large images and adds a WebP copy of each;
+# - rewrites url() references inside CSS to the hashed names;
+# - precompresses text assets with gzip, and brotli when available.
+# Templates call asset_url(). Hashed files are served with an immutable
+# Cache-Control, the best precompressed variant the client accepts, and WebP
+# to browsers that advertise it. Without a manifest everything falls back to
+# the plain static route.
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+RASTER_IMAGES = {'.jpg', '.jpeg', '.png', '.webp'}
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt'}
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+# ---------- Build ----------
+def _hashed_name(logical, data, ext=None):
+    stem, original_ext = os.path.splitext(logical)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext or original_ext}"
+
+
+def _write(out_dir, name, data):
+    path = os.path.join(out_dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def _encode_image(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'JPEG':
+        image.convert('RGB').save(buffer, 'JPEG', quality=Config.ASSET_IMAGE_QUALITY, optimize=True, progressive=True)
+    elif fmt == 'PNG':
+        image.save(buffer, 'PNG', optimize=True)
+    else:
+        image.save(buffer, 'WEBP', quality=Config.ASSET_IMAGE_QUALITY, method=6)
+    return buffer.getvalue()
+
+
+def _optimise_image(data):
+    """(default bytes, webp bytes or None): downsized to ASSET_IMAGE_MAX_WIDTH and recompressed."""
+    if Image is None:
+        return data, None
+    with Image.open(io.BytesIO(data)) as image:
+        fmt = image.format
+        image.load()
+        if image.width > Config.ASSET_IMAGE_MAX_WIDTH:
+            height = round(image.height * Config.ASSET_IMAGE_MAX_WIDTH / image.width)
+            image = image.resize((Config.ASSET_IMAGE_MAX_WIDTH, height), Image.LANCZOS)
+        optimised = _encode_image(image, fmt) if fmt in ('JPEG', 'PNG', 'WEBP') else data
+        webp = _encode_image(image, 'WEBP') if fmt != 'WEBP' else None
+    # Never ship a "optimised" file that is bigger than what we started with.
+    if len(optimised) >= len(data):
+        optimised = data
+    if webp is not None and len(webp) >= len(optimised):
+        webp = None
+    return optimised, webp
+
+
+def _rewrite_css(css, logical, files):
+    base = os.path.dirname(logical)
+
+    def replace(match):
+        ref = match.group(2).strip()
+        if ref.startswith(('data:', 'http:', 'https:', '//', '#')):
+            return match.group(0)
+        if ref.startswith('/static/'):
+            target = ref[len('/static/'):]
+        else:
+            target = os.path.normpath(os.path.join(base, ref)).replace(os.sep, '/')
+        hashed = files.get(target)
+        return f'url("/static/{DIST_DIR}/{hashed}")' if hashed else match.group(0)
+
+    return _CSS_URL.sub(replace, css)
+
+
+def _compress(out_dir, name, data):
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz) < len(data):
+        _write(out_dir, name + '.gz', gz)
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data):
+            _write(out_dir, name + '.br', br)
+
+
+def build(static_dir):
+    """Rebuild static/dist and its manifest; returns the manifest."""
+    out_dir = os.path.join(static_dir, DIST_DIR)
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+
+    sources = []
+    for root, dirs, names in os.walk(static_dir):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != out_dir]
+        for name in names:
+            path = os.path.join(root, name)
+            sources.append(os.path.relpath(path, static_dir).replace(os.sep, '/'))
+    # Images and other files before CSS, so stylesheets can point at hashed names.
+    sources.sort(key=lambda logical: (logical.endswith('.css'), logical))
+
+    manifest = {'files': {}, 'webp': {}}
+    for logical in sources:
+        with open(os.path.join(static_dir, logical), 'rb') as f:
+            data = f.read()
+        ext = os.path.splitext(logical)[1].lower()
+
+        if ext in RASTER_IMAGES:
+            data, webp = _optimise_image(data)
+            hashed = _hashed_name(logical, data)
+            if webp is not None:
+                manifest['webp'][hashed] = _hashed_name(logical, webp, '.webp')
+                _write(out_dir, manifest['webp'][hashed], webp)
+        elif ext == '.css':
+            data = _rewrite_css(data.decode('utf-8'), logical, manifest['files']).encode('utf-8')
+            hashed = _hashed_name(logical, data)
+        else:
+            hashed = _hashed_name(logical, data)
+
+        _write(out_dir, hashed, data)
+        if ext in COMPRESSIBLE:
+            _compress(out_dir, hashed, data)
+        manifest['files'][logical] = hashed
+
+    with open(os.path.join(out_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+# ---------- Serving ----------
+def load_manifest(static_dir):
+    try:
+        with open(os.path.join(static_dir, DIST_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def asset_url(filename):
+    """URL of the fingerprinted build of a static file, or the plain static URL if it wasn't built."""
+    manifest = current_app.extensions.get('assets')
+    hashed = manifest['files'].get(filename) if manifest else None
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return url_for('hashed_asset', filename=hashed)
+
+
+def serve_hashed(filename):
+    dist_dir = os.path.join(current_app.static_folder, DIST_DIR)
+    manifest = current_app.extensions.get('assets') or {}
+    mimetype = mimetypes.guess_type(filename)[0]
+    served, encoding, vary = filename, None, []
+
+    webp = manifest.get('webp', {}).get(filename)
+    if webp:
+        vary.append('Accept')
+        # Only an explicit image/webp counts; `*/*` is sent by clients that can't decode it.
+        if any(mimetype_ == 'image/webp' and quality > 0 for mimetype_, quality in request.accept_mimetypes):
+            served, mimetype = webp, 'image/webp'
+
+    if os.path.splitext(filename)[1].lower() in COMPRESSIBLE:
+        vary.append('Accept-Encoding')
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if request.accept_encodings[candidate] and os.path.isfile(os.path.join(dist_dir, served + suffix)):
+                served, encoding = served + suffix, candidate
+                break
+
+    response = send_from_directory(dist_dir, served, mimetype=mimetype, max_age=Config.ASSET_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    for header in vary:
+        response.vary.add(header)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    manifest = load_manifest(app.static_folder) if Config.ASSET_MANIFEST_ENABLED else None
+    if manifest:
+        app.extensions['assets'] = manifest
+    app.add_url_rule(f'{app.static_url_path}/{DIST_DIR}/<path:filename>', 'hashed_asset', serve_hashed)
+    app.add_template_global(asset_url)
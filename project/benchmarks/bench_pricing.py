@@ -0,0 +1,196 @@
+"""Micro-benchmark and parity check for rate-calendar pricing (ratecalendar.quote_many).
+
+Run from the project folder:
+
+    python -m benchmarks.bench_pricing --quotes 200000 --min-qps 50000
+
+Calendars are filled from generated rates (no database, no demand factor) and
+quotes are checked against a night-by-night reference built from pricing.py.
+Exits non-zero if any quote differs or if throughput falls below --min-qps.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import ratecalendar
+from pricing import CENT, PEAK_MONTHS, discount_rate, nightly_rate, twin_surcharge
+
+
+# ---------- Legacy baseline (routes/booking.py before pricing.py), for throughput only ----------
+class _RateCursor:
+    def __init__(self, rates):
+        self.rates = rates
+        self.row = None
+
+    def execute(self, sql, params):
+        self.row = self.rates.get(tuple(params))
+
+    def fetchone(self):
+        return self.row
+
+
+def legacy_calculate_total_price(check_in_date_str, check_out_date_str, booking_date_str, hotel_id, room_type_id, num_guests, db_cursor):
+    check_in = datetime.strptime(check_in_date_str, "%Y-%m-%d")
+    check_out = datetime.strptime(check_out_date_str, "%Y-%m-%d")
+    booking_date = datetime.strptime(booking_date_str, "%Y-%m-%d")
+
+    db_cursor.execute(
+        "SELECT PeakRate, OffPeakRate FROM Rate WHERE HotelID = %s AND RoomTypeID = %s",
+        (hotel_id, room_type_id)
+    )
+    result = db_cursor.fetchone()
+    if not result:
+        raise Exception("Rate not found for this hotel and room type")
+
+    peak_rate, off_peak_rate = map(Decimal, result)
+
+    peak_months = [4, 5, 6, 7, 8, 11, 12]
+    is_peak = check_in.month in peak_months
+    daily_rate = peak_rate if is_peak else off_peak_rate
+
+    if room_type_id == 2:
+        daily_rate *= Decimal("1.2")
+        if num_guests == 2:
+            daily_rate += peak_rate * Decimal("0.1")
+    elif room_type_id == 3:
+        daily_rate *= Decimal("1.5")
+
+    nights = (check_out - check_in).days
+    base_price = daily_rate * nights
+
+    days_advance = (check_in - booking_date).days
+    if 80 <= days_advance <= 90:
+        discount = Decimal("0.3")
+    elif 60 <= days_advance < 80:
+        discount = Decimal("0.2")
+    elif 45 <= days_advance < 60:
+        discount = Decimal("0.1")
+    else:
+        discount = Decimal("0")
+
+    final_price = base_price * (1 - discount)
+    return base_price.quantize(Decimal("0.01")), final_price.quantize(Decimal("0.01"))
+
+
+# ---------- Workload ----------
+def make_rates(hotels, seed):
+    rng = random.Random(seed)
+    rates = {}
+    for hotel_id in range(1, hotels + 1):
+        for room_type_id in (1, 2, 3):
+            off_peak = Decimal(rng.randint(4000, 20000)) / 100
+            peak = off_peak + Decimal(rng.randint(0, 10000)) / 100
+            rates[(hotel_id, room_type_id)] = (peak, off_peak)
+    return rates
+
+
+def make_stays(count, hotels, seed):
+    rng = random.Random(seed)
+    today = datetime(2025, 1, 1)
+    stays = []
+    for _ in range(count):
+        booking_date = today + timedelta(days=rng.randint(0, 365))
+        check_in = booking_date + timedelta(days=rng.randint(0, 120))
+        check_out = check_in + timedelta(days=rng.randint(1, 30))
+        stays.append((
+            rng.randint(1, hotels), rng.randint(1, 3), check_in, check_out, booking_date, rng.randint(1, 4)
+        ))
+    return stays
+
+
+# ---------- Checks ----------
+def make_grid(hotels, booking_date, days=30, nights=(1, 3, 7)):
+    """Search-page price grid: every hotel x room type x check-in day x stay length."""
+    stays = []
+    for hotel_id in range(1, hotels + 1):
+        for offset in range(days):
+            check_in = booking_date + timedelta(days=offset)
+            for length in nights:
+                for room_type_id in (1, 2, 3):
+                    stays.append((
+                        hotel_id, room_type_id, check_in, check_in + timedelta(days=length), booking_date, 2
+                    ))
+    return stays
+
+
+def reference_quote(stay, rates):
+    """Night-by-night price of one stay, each night rounded to pence as the calendar stores it."""
+    hotel_id, room_type_id, check_in, check_out, booking_date, guests = stay
+    peak_rate, off_peak_rate = rates[(hotel_id, room_type_id)]
+    surcharge = twin_surcharge(room_type_id, guests, peak_rate).quantize(CENT)
+    base_price = sum(
+        nightly_rate(room_type_id, (check_in + timedelta(days=i)).month in PEAK_MONTHS, peak_rate,
+                     off_peak_rate).quantize(CENT) + surcharge
+        for i in range((check_out - check_in).days)
+    )
+    final_price = base_price * (1 - discount_rate((check_in - booking_date).days))
+    return base_price.quantize(CENT), final_price.quantize(CENT)
+
+
+def load_calendars(rates, years):
+    for year in years:
+        ratecalendar.store(ratecalendar.fill(year, rates).values())
+
+
+def check_parity(stays, rates):
+    mismatches = 0
+    for stay, quote in zip(stays, ratecalendar.quote_many(stays, load=False)):
+        expected = reference_quote(stay, rates)
+        if (quote.total_price, quote.discounted_price) != expected:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"  mismatch for {stay}: reference={expected} calendar={quote}")
+    return mismatches
+
+
+def throughput(label, fn, count):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    qps = count / elapsed if elapsed else float('inf')
+    print(f"  {label:<28} {count:>9} quotes in {elapsed:8.3f}s  {qps:>12,.0f} quotes/sec")
+    return qps
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quotes', type=int, default=100000)
+    parser.add_argument('--parity-quotes', type=int, default=20000)
+    parser.add_argument('--hotels', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--min-qps', type=float, default=0, help="fail if bulk pricing is slower than this")
+    args = parser.parse_args(argv)
+
+    rates = make_rates(args.hotels, args.seed)
+    started = time.perf_counter()
+    load_calendars(rates, (2025, 2026))
+    print(f"Filled {args.hotels * 2} hotel-year calendars in {time.perf_counter() - started:.3f}s")
+
+    print(f"Parity against the night-by-night reference ({args.parity_quotes} quotes)")
+    mismatches = check_parity(make_stays(args.parity_quotes, args.hotels, args.seed), rates)
+    print(f"  {mismatches} mismatches")
+
+    print("Throughput")
+    stays = make_stays(args.quotes, args.hotels, args.seed + 1)
+    cursor = _RateCursor(rates)
+    legacy_args = [
+        (ci.strftime("%Y-%m-%d"), co.strftime("%Y-%m-%d"), bd.strftime("%Y-%m-%d"), h, t, g)
+        for h, t, ci, co, bd, g in stays
+    ]
+    throughput("legacy (strptime + query)", lambda: [legacy_calculate_total_price(*a, cursor) for a in legacy_args], len(stays))
+    bulk_qps = throughput("ratecalendar.quote_many", lambda: ratecalendar.quote_many(stays, load=False), len(stays))
+
+    grid = make_grid(args.hotels, datetime(2025, 3, 1))
+    throughput("quote_many (search grid)", lambda: ratecalendar.quote_many(grid, load=False), len(grid))
+
+    failed = mismatches > 0 or bulk_qps < args.min_qps
+    if bulk_qps < args.min_qps:
+        print(f"FAIL: bulk throughput {bulk_qps:,.0f} quotes/sec is below --min-qps {args.min_qps:,.0f}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
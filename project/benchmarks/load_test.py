@@ -0,0 +1,244 @@
+"""Concurrent load test for the booking, quote, login and admin flows.
+
+Run against the benchmark stack after seeding it (see benchmarks/seed.py):
+
+    python -m benchmarks.load_test --base-url http://localhost:5002 --users 50 --duration 60
+
+Each simulated user keeps its own keep-alive connection and session cookie,
+and logs in once before it starts. The seeded 'Bench Hotel' IDs are read from
+/api/v1/hotels up front. The report gives requests/sec and p50/p95/p99 latency per endpoint. It exits
+non-zero if any endpoint's p95 is above --max-p95-ms or its error rate is above
+--max-error-rate.
+"""
+import argparse
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import urlencode, urlsplit
+
+
+class Client:
+    """Minimal keep-alive HTTP client with a cookie jar; redirects are not followed."""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.cookies = {}
+        self.conn = None
+
+    def request(self, method, path, form=None):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        headers = {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            self.conn.close()
+            self.conn = None
+            raise
+        for header in response.headers.get_all('Set-Cookie') or []:
+            name, _, value = header.split(';', 1)[0].partition('=')
+            self.cookies[name.strip()] = value.strip()
+        return response.status, data
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, elapsed, ok):
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append(elapsed)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+def timed(recorder, client, endpoint, method, path, form=None):
+    start = time.perf_counter()
+    try:
+        status, body = client.request(method, path, form)
+        ok = status < 400
+    except (http.client.HTTPException, OSError):
+        status, body, ok = None, b'', False
+    recorder.record(endpoint, time.perf_counter() - start, ok)
+    return status, body
+
+
+def bench_hotels(base_url, timeout):
+    """[(HotelID, HotelName)] of the seeded 'Bench Hotel' rows, paged from the JSON API."""
+    client = Client(base_url, timeout)
+    hotels, cursor = [], None
+    while True:
+        query = {'fields': 'id,name', 'limit': 200}
+        if cursor:
+            query['cursor'] = cursor
+        status, body = client.request('GET', '/api/v1/hotels?' + urlencode(query))
+        if status != 200:
+            raise SystemExit(f"Could not list hotels: HTTP {status}")
+        page = json.loads(body)
+        hotels += [(h['id'], h['name']) for h in page['data'] if h['name'].startswith('Bench Hotel ')]
+        cursor = page['next_cursor']
+        if not cursor:
+            return hotels
+
+
+def login(recorder, client, username, password):
+    """Log in and report whether the session is now signed in (a redirect away from the form)."""
+    status, _ = timed(recorder, client, 'login', 'POST', '/login.html', {'Username': username, 'password': password})
+    return status == 302
+
+
+def random_stay(rng, today):
+    check_in = today + timedelta(days=rng.randint(1, 80))
+    return check_in, check_in + timedelta(days=rng.randint(1, 7))
+
+
+# ---------- Scenarios ----------
+def customer(args, recorder, stop, seed):
+    rng = random.Random(seed)
+    client = Client(args.base_url, args.timeout)
+    username = f"bench_user_{rng.randrange(args.seeded_users)}"
+    today = date.today()
+    # Without a signed-in session /booking and /my_bookings can't be exercised.
+    if not login(recorder, client, username, args.password):
+        return
+
+    while not stop.is_set():
+        roll = rng.random()
+        hotel_id, hotel_name = rng.choice(args.hotel_list)
+        room_type = rng.randint(1, 3)
+        if roll < 0.40:
+            check_in, check_out = random_stay(rng, today)
+            timed(recorder, client, 'calculate_price', 'GET', '/calculate_price?' + urlencode({
+                'roomTypeId': room_type, 'checkInDate': check_in.isoformat(), 'checkOutDate': check_out.isoformat(),
+                'guests': 1, 'hotelName': hotel_name,
+            }))
+        elif roll < 0.50:
+            timed(recorder, client, 'booking_form', 'GET', '/booking.html')
+        elif roll < 0.60:
+            check_in, check_out = random_stay(rng, today)
+            timed(recorder, client, 'booking', 'POST', '/booking', {
+                'hotel_id': hotel_id, 'roomType': room_type, 'check-in': check_in.isoformat(),
+                'check-out': check_out.isoformat(), 'booking-date': today.isoformat(), 'noOfGuests': 1,
+            })
+        elif roll < 0.95:
+            timed(recorder, client, 'my_bookings', 'GET', '/my_bookings')
+        else:
+            login(recorder, client, username, args.password)
+        if args.think_ms:
+            time.sleep(rng.uniform(0, args.think_ms) / 1000)
+
+
+def admin(args, recorder, stop, seed):
+    rng = random.Random(seed)
+    client = Client(args.base_url, args.timeout)
+    if not login(recorder, client, 'bench_admin', args.password):
+        return
+    while not stop.is_set():
+        query = rng.choice(['', f"bench_user_{rng.randrange(args.seeded_users)}", str(rng.randint(1, 100000))])
+        timed(recorder, client, 'manage_bookings', 'GET', '/manage_bookings?' + urlencode({'query': query}))
+        if args.think_ms:
+            time.sleep(rng.uniform(0, args.think_ms) / 1000)
+
+
+# ---------- Report ----------
+def percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return 0.0
+    index = max(int(round(pct / 100 * len(sorted_samples))) - 1, 0)
+    return sorted_samples[min(index, len(sorted_samples) - 1)]
+
+
+def summarise(recorder, elapsed):
+    report = {}
+    for endpoint, samples in sorted(recorder.samples.items()):
+        samples.sort()
+        report[endpoint] = {
+            'requests': len(samples),
+            'errors': recorder.errors.get(endpoint, 0),
+            'rps': round(len(samples) / elapsed, 2),
+            'p50_ms': round(percentile(samples, 50) * 1000, 2),
+            'p95_ms': round(percentile(samples, 95) * 1000, 2),
+            'p99_ms': round(percentile(samples, 99) * 1000, 2),
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WorldHotels load test")
+    parser.add_argument('--base-url', default='http://localhost:5002')
+    parser.add_argument('--users', type=int, default=50, help="concurrent customer sessions")
+    parser.add_argument('--admins', type=int, default=2, help="concurrent admin sessions")
+    parser.add_argument('--duration', type=float, default=60, help="seconds to run")
+    parser.add_argument('--think-ms', type=float, default=0, help="max random pause between requests")
+    parser.add_argument('--seeded-users', type=int, default=20000)
+    parser.add_argument('--password', default='benchpass')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="also write the report to this file")
+    parser.add_argument('--max-p95-ms', type=float, help="fail if any endpoint's p95 exceeds this")
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    args = parser.parse_args(argv)
+
+    args.hotel_list = bench_hotels(args.base_url, args.timeout)
+    if not args.hotel_list:
+        raise SystemExit("No 'Bench Hotel' rows found; run benchmarks.seed first")
+
+    recorder = Recorder()
+    stop = threading.Event()
+    threads = [threading.Thread(target=customer, args=(args, recorder, stop, args.seed + i), daemon=True)
+               for i in range(args.users)]
+    threads += [threading.Thread(target=admin, args=(args, recorder, stop, args.seed + 10000 + i), daemon=True)
+                for i in range(args.admins)]
+
+    print(f"Running {args.users} customers + {args.admins} admins against {args.base_url} for {args.duration:.0f}s")
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join(args.timeout)
+    elapsed = time.perf_counter() - started
+
+    report = summarise(recorder, elapsed)
+    print(f"\n{'endpoint':<18}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, row in report.items():
+        print(f"{endpoint:<18}{row['requests']:>10}{row['errors']:>8}{row['rps']:>10}"
+              f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+    total = sum(row['requests'] for row in report.values())
+    print(f"\nTotal: {total} requests, {total / elapsed:.1f} req/s")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'duration': elapsed, 'endpoints': report}, f, indent=2)
+
+    failed = False
+    for endpoint, row in report.items():
+        if args.max_p95_ms is not None and row['p95_ms'] > args.max_p95_ms:
+            print(f"FAIL: {endpoint} p95 {row['p95_ms']} ms > {args.max_p95_ms} ms")
+            failed = True
+        if row['requests'] and row['errors'] / row['requests'] > args.max_error_rate:
+            print(f"FAIL: {endpoint} error rate {row['errors'] / row['requests']:.2%}")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""Load benchmark-sized data on top of docker_sql/init.sql.
+
+Start the benchmark stack first (its MySQL container loads init.sql on boot):
+
+    docker compose -f benchmarks/docker-compose.yml up -d --build
+    python -m benchmarks.seed --port 3308 --password bench --bookings 1000000
+
+Every seeded user (bench_user_<n>) and the admin (bench_admin) has the
+password given by --user-password.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+import mysql.connector
+from werkzeug.security import generate_password_hash
+
+from rollups import rebuild as rebuild_rollups
+
+ROOM_TYPES = (1, 2, 3)
+
+
+def insert_batches(conn, sql, rows, batch_size):
+    """executemany() turns a single-row INSERT into multi-row INSERTs; commit per batch."""
+    cursor = conn.cursor()
+    for start in range(0, len(rows), batch_size):
+        cursor.executemany(sql, rows[start:start + batch_size])
+        conn.commit()
+
+
+def seed_reference(conn, args, rng):
+    cursor = conn.cursor()
+    names = [f"Bench Hotel {i}" for i in range(1, args.hotels + 1)]
+    insert_batches(conn, "INSERT INTO Hotel (HotelName, Capacity) VALUES (%s, %s)",
+                   [(name, args.rooms_per_hotel) for name in names], args.batch)
+    cursor.execute("SELECT HotelID FROM Hotel WHERE HotelName LIKE 'Bench Hotel %' ORDER BY HotelID")
+    hotel_ids = [row[0] for row in cursor.fetchall()]
+
+    rates, rate_rows = {}, []
+    for hotel_id in hotel_ids:
+        for room_type_id in ROOM_TYPES:
+            off_peak = Decimal(rng.randint(60, 160))
+            peak = off_peak * 2
+            rates[(hotel_id, room_type_id)] = off_peak
+            rate_rows.append((hotel_id, room_type_id, peak, off_peak))
+    insert_batches(conn, "INSERT INTO Rate (HotelID, RoomTypeID, PeakRate, OffPeakRate) VALUES (%s, %s, %s, %s)",
+                   rate_rows, args.batch)
+
+    room_rows = []
+    for hotel_id in hotel_ids:
+        for number in range(args.rooms_per_hotel):
+            room_rows.append((hotel_id, ROOM_TYPES[number % len(ROOM_TYPES)], 1, 0, 1, 0, 100 + number, 1))
+    insert_batches(conn, """
+        INSERT INTO Room (HotelID, RoomTypeID, Wifi, MiniBar, TV, Breakfast, RoomNumber, IsAvailable)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, room_rows, args.batch)
+    cursor.execute("""
+        SELECT r.RoomID, r.HotelID, r.RoomTypeID FROM Room r
+        JOIN Hotel h ON h.HotelID = r.HotelID
+        WHERE h.HotelName LIKE 'Bench Hotel %'
+    """)
+    rooms = cursor.fetchall()
+    return hotel_ids, rooms, rates
+
+
+def seed_users(conn, args):
+    hashed = generate_password_hash(args.user_password)
+    rows = [(f"bench_user_{i}", f"bench_user_{i}@example.com", hashed, 'customer', 'Bench', str(i))
+            for i in range(args.users)]
+    rows.append(("bench_admin", "bench_admin@example.com", hashed, 'admin', 'Bench', 'Admin'))
+    insert_batches(conn, """
+        INSERT INTO User (Username, Email, HashedPassword, Role, FirstName, LastName)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, rows, args.batch)
+    cursor = conn.cursor()
+    cursor.execute("SELECT UserID FROM User WHERE Username LIKE 'bench\\_user\\_%'")
+    return [row[0] for row in cursor.fetchall()]
+
+
+def seed_bookings(conn, args, rng, rooms, rates, user_ids):
+    """Non-overlapping stays per room, walking each room's calendar forward from --start."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT IFNULL(MAX(BookingID), 0) FROM Booking")
+    next_id = cursor.fetchone()[0] + 1
+    start = date.fromisoformat(args.start)
+    calendars = {room_id: start + timedelta(days=rng.randint(0, 30)) for room_id, _, _ in rooms}
+
+    bookings, nights, receipts = [], [], []
+    done = 0
+
+    def flush():
+        insert_batches(conn, """
+            INSERT INTO Booking (BookingID, UserID, HotelID, RoomTypeID, RoomID, CheckIn, CheckOut, BookingDate,
+                                 NoOfGuests, Status, TotalPrice, BookingCurrency)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, bookings, args.batch)
+        insert_batches(conn, "INSERT INTO RoomNight (RoomID, NightDate, BookingID) VALUES (%s, %s, %s)",
+                       nights, args.batch)
+        insert_batches(conn, "INSERT INTO Receipt (BookingID, TotalPrice, PaymentDate) VALUES (%s, %s, %s)",
+                       receipts, args.batch)
+        bookings.clear()
+        nights.clear()
+        receipts.clear()
+
+    while done < args.bookings:
+        room_id, hotel_id, room_type_id = rooms[done % len(rooms)]
+        check_in = calendars[room_id] + timedelta(days=rng.randint(0, 3))
+        length = rng.randint(1, 7)
+        check_out = check_in + timedelta(days=length)
+        calendars[room_id] = check_out
+
+        status = 'Cancelled' if rng.random() < args.cancel_ratio else 'Confirmed'
+        price = rates[(hotel_id, room_type_id)] * length
+        booking_date = check_in - timedelta(days=rng.randint(0, 90))
+        bookings.append((next_id, rng.choice(user_ids), hotel_id, room_type_id, room_id, check_in, check_out,
+                         booking_date, 1, status, price, 'GBP'))
+        receipts.append((next_id, price, booking_date))
+        if status != 'Cancelled':
+            nights.extend((room_id, check_in + timedelta(days=i), next_id) for i in range(length))
+
+        next_id += 1
+        done += 1
+        if len(bookings) >= args.batch * 10:
+            flush()
+            print(f"  {done:,} bookings", end='\r', flush=True)
+    flush()
+    print(f"  {done:,} bookings")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed benchmark volumes into the WorldHotels schema.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3308)
+    parser.add_argument('--user', default='root')
+    parser.add_argument('--password', default='bench')
+    parser.add_argument('--database', default='WorldHotels')
+    parser.add_argument('--hotels', type=int, default=2000)
+    parser.add_argument('--rooms-per-hotel', type=int, default=30)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--bookings', type=int, default=1000000)
+    parser.add_argument('--cancel-ratio', type=float, default=0.1)
+    parser.add_argument('--start', default='2022-01-01', help="first check-in date for seeded stays")
+    parser.add_argument('--user-password', default='benchpass')
+    parser.add_argument('--batch', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    conn = mysql.connector.connect(host=args.host, port=args.port, user=args.user,
+                                   password=args.password, database=args.database)
+    cursor = conn.cursor()
+    cursor.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+
+    started = time.perf_counter()
+    print("Seeding hotels, rates and rooms")
+    hotel_ids, rooms, rates = seed_reference(conn, args, rng)
+    print(f"  {len(hotel_ids):,} hotels, {len(rooms):,} rooms")
+    print("Seeding users")
+    user_ids = seed_users(conn, args)
+    print(f"  {len(user_ids):,} users")
+    print("Seeding bookings")
+    seed_bookings(conn, args, rng, rooms, rates, user_ids)
+    print("Rebuilding rollups")
+    rebuild_rollups(conn)
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+    conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
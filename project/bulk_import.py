@@ -0,0 +1,310 @@
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+from mysql.connector import Error
+from config import Config
+from refdata import get_room_types, invalidate_hotels, invalidate_rates, invalidate_room_counts
+import ratecalendar
+
+# Bulk loading of Hotel, Room and Rate rows from CSV or JSON (an array or one
+# object per line). Input is read record by record. Every row is validated
+# in memory against the current hotels, room types, room numbers and rates,
+# and valid rows are written with executemany() (sent as multi-row INSERTs),
+# committing every IMPORT_CHUNK_SIZE rows. Bad rows are reported with their
+# line or record number and never stop the rest of the file.
+
+DATASETS = ('hotels', 'rooms', 'rates')
+ROOM_FLAGS = ('Wifi', 'MiniBar', 'TV', 'Breakfast')
+_TRUE = {'1', 'true', 'yes', 'y'}
+_FALSE = {'0', 'false', 'no', 'n', ''}
+
+
+class RowError(ValueError):
+    """A row that fails validation; the message is reported against its line."""
+
+
+class ImportReport:
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []  # (line, message), capped at IMPORT_MAX_ERRORS
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < Config.IMPORT_MAX_ERRORS:
+            self.errors.append((line, message))
+
+    def as_dict(self):
+        return {
+            'dataset': self.dataset,
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'error_count': self.error_count,
+            'errors': [{'line': line, 'error': message} for line, message in self.errors],
+        }
+
+
+# ---------- Readers ----------
+def iter_csv(stream):
+    reader = csv.DictReader(stream)
+    for record in reader:
+        yield reader.line_num, record
+
+
+def iter_json(stream, chunk_size=65536):
+    """Yield objects from a JSON array or JSON Lines without loading the whole input."""
+    decoder = json.JSONDecoder()
+    buffer, index, eof = '', 0, False
+    while True:
+        # Skip whitespace, array brackets and separators between objects.
+        while index < len(buffer) and buffer[index] in ' \t\r\n,[]':
+            index += 1
+        if index == len(buffer):
+            if eof:
+                return
+            buffer, index = stream.read(chunk_size), 0
+            eof = not buffer
+            continue
+        try:
+            record, index = decoder.raw_decode(buffer, index)
+        except json.JSONDecodeError:
+            more = stream.read(chunk_size)
+            if not more:
+                raise RowError(f"Invalid JSON near: {buffer[index:index + 60]!r}")
+            buffer, index = buffer[index:] + more, 0
+            continue
+        yield record
+
+
+def iter_records(stream, fmt):
+    if fmt == 'csv':
+        yield from iter_csv(stream)
+    elif fmt == 'json':
+        for number, record in enumerate(iter_json(stream), start=1):
+            yield number, record
+    else:
+        raise ValueError(f"Unsupported format {fmt!r}; use csv or json")
+
+
+# ---------- Field parsing ----------
+def _field(record, name, required=True):
+    if not isinstance(record, dict):
+        raise RowError("Expected an object")
+    value = record.get(name)
+    if isinstance(value, str):
+        value = value.strip()
+    if value in (None, ''):
+        if required:
+            raise RowError(f"Missing {name}")
+        return None
+    return value
+
+
+def _int(record, name, required=True, minimum=None):
+    value = _field(record, name, required)
+    if value is None:
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise RowError(f"{name} must be a whole number")
+    if minimum is not None and number < minimum:
+        raise RowError(f"{name} must be at least {minimum}")
+    return number
+
+
+def _money(record, name):
+    try:
+        value = Decimal(str(_field(record, name)))
+    except InvalidOperation:
+        raise RowError(f"{name} must be a number")
+    if not value.is_finite() or value < 0 or value >= Decimal('100000000'):
+        raise RowError(f"{name} must be between 0 and 99999999.99")
+    return value.quantize(Decimal('0.01'))
+
+
+def _flag(record, name, default):
+    value = record.get(name)
+    if isinstance(value, bool):
+        return int(value)
+    value = str(value if value is not None else '').strip().lower()
+    if value == '':
+        return default
+    if value in _TRUE:
+        return 1
+    if value in _FALSE:
+        return 0
+    raise RowError(f"{name} must be true/false or 1/0")
+
+
+# ---------- Import ----------
+class _Importer:
+    def __init__(self, conn, report):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.report = report
+        self.hotel_ids = {}    # HotelName -> HotelID, None when the name is ambiguous
+        self.known_hotels = set()
+        self.cursor.execute("SELECT HotelID, HotelName FROM Hotel")
+        for hotel_id, name in self.cursor.fetchall():
+            self.known_hotels.add(hotel_id)
+            self.hotel_ids[name] = None if name in self.hotel_ids else hotel_id
+        self.room_types = {room_type_id for room_type_id, _, _ in get_room_types(self.cursor)}
+
+    def hotel(self, record):
+        hotel_id = _int(record, 'HotelID', required=False)
+        if hotel_id is not None:
+            if hotel_id not in self.known_hotels:
+                raise RowError(f"Unknown HotelID {hotel_id}")
+            return hotel_id
+        name = _field(record, 'HotelName')
+        if name not in self.hotel_ids:
+            raise RowError(f"Unknown hotel {name!r}")
+        if self.hotel_ids[name] is None:
+            raise RowError(f"Hotel name {name!r} is ambiguous; use HotelID")
+        return self.hotel_ids[name]
+
+    def room_type(self, record):
+        room_type_id = _int(record, 'RoomTypeID')
+        if room_type_id not in self.room_types:
+            raise RowError(f"Unknown RoomTypeID {room_type_id}")
+        return room_type_id
+
+    def flush(self, sql, batch, counter):
+        """Write one chunk in its own transaction; on failure every row of the chunk is reported."""
+        if not batch:
+            return
+        try:
+            self.cursor.executemany(sql, [params for _, params in batch])
+            self.conn.commit()
+            setattr(self.report, counter, getattr(self.report, counter) + len(batch))
+        except Error as e:
+            self.conn.rollback()
+            for line, _ in batch:
+                self.report.error(line, f"Not saved, chunk failed: {e.msg}")
+        finally:
+            batch.clear()
+
+    def run(self, records, validate, statements):
+        """validate(record) -> (statement key, params) or raises RowError."""
+        batches = {key: [] for key in statements}
+        try:
+            for line, record in records:
+                self.report.rows += 1
+                try:
+                    key, params = validate(record)
+                except RowError as e:
+                    self.report.error(line, str(e))
+                    continue
+                batch = batches[key]
+                batch.append((line, params))
+                if len(batch) >= Config.IMPORT_CHUNK_SIZE:
+                    self.flush(statements[key][0], batch, statements[key][1])
+        finally:
+            for key, batch in batches.items():
+                self.flush(statements[key][0], batch, statements[key][1])
+
+
+def import_hotels(importer, records):
+    seen = set(importer.hotel_ids)
+
+    def validate(record):
+        name = _field(record, 'HotelName')
+        if len(name) > 255:
+            raise RowError("HotelName is longer than 255 characters")
+        if name in seen:
+            raise RowError(f"Hotel {name!r} already exists")
+        capacity = _int(record, 'Capacity', minimum=0)
+        seen.add(name)
+        return 'insert', (name, capacity)
+
+    importer.run(records, validate, {
+        'insert': ("INSERT INTO Hotel (HotelName, Capacity) VALUES (%s, %s)", 'inserted'),
+    })
+    invalidate_hotels()
+
+
+def import_rooms(importer, records):
+    importer.cursor.execute("SELECT HotelID, RoomNumber FROM Room")
+    taken = set(importer.cursor.fetchall())
+
+    def validate(record):
+        hotel_id = importer.hotel(record)
+        room_type_id = importer.room_type(record)
+        room_number = _int(record, 'RoomNumber', minimum=0)
+        if (hotel_id, room_number) in taken:
+            raise RowError(f"Room {room_number} already exists at hotel {hotel_id}")
+        flags = tuple(_flag(record, name, 0) for name in ROOM_FLAGS)
+        available = _flag(record, 'IsAvailable', 1)
+        taken.add((hotel_id, room_number))
+        return 'insert', (hotel_id, room_type_id, *flags, room_number, available)
+
+    importer.run(records, validate, {
+        'insert': ("""
+            INSERT INTO Room (HotelID, RoomTypeID, Wifi, MiniBar, TV, Breakfast, RoomNumber, IsAvailable)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, 'inserted'),
+    })
+    invalidate_room_counts()
+
+
+def import_rates(importer, records):
+    importer.cursor.execute("SELECT HotelID, RoomTypeID FROM Rate")
+    existing = set(importer.cursor.fetchall())
+    seen = set()
+
+    def validate(record):
+        hotel_id = importer.hotel(record)
+        room_type_id = importer.room_type(record)
+        peak, off_peak = _money(record, 'PeakRate'), _money(record, 'OffPeakRate')
+        key = (hotel_id, room_type_id)
+        if key in seen:
+            raise RowError(f"Duplicate rate for hotel {hotel_id}, room type {room_type_id}")
+        seen.add(key)
+        if key in existing:
+            return 'update', (peak, off_peak, hotel_id, room_type_id)
+        return 'insert', (hotel_id, room_type_id, peak, off_peak)
+
+    importer.run(records, validate, {
+        'insert': ("INSERT INTO Rate (HotelID, RoomTypeID, PeakRate, OffPeakRate) VALUES (%s, %s, %s, %s)",
+                   'inserted'),
+        'update': ("UPDATE Rate SET PeakRate = %s, OffPeakRate = %s WHERE HotelID = %s AND RoomTypeID = %s",
+                   'updated'),
+    })
+    invalidate_rates()
+    ratecalendar.invalidate()
+
+
+_IMPORTERS = {'hotels': import_hotels, 'rooms': import_rooms, 'rates': import_rates}
+
+
+def detect_format(filename, content_type=None):
+    name = (filename or '').lower()
+    if name.endswith(('.json', '.jsonl', '.ndjson')) or (content_type or '').endswith(('json', 'ndjson')):
+        return 'json'
+    return 'csv'
+
+
+def run_import(conn, dataset, stream, fmt):
+    """Import `dataset` from a text stream; returns an ImportReport."""
+    if dataset not in _IMPORTERS:
+        raise ValueError(f"Unknown dataset {dataset!r}; expected one of {', '.join(DATASETS)}")
+    report = ImportReport(dataset)
+    importer = _Importer(conn, report)
+    try:
+        _IMPORTERS[dataset](importer, iter_records(stream, fmt))
+    except RowError as e:
+        # Unparseable input: rows already committed stay, the rest is reported as one error.
+        report.error(report.rows + 1, str(e))
+    except csv.Error as e:
+        report.error(report.rows + 1, f"Invalid CSV: {e}")
+    return report
+
+
+def open_text(binary_stream):
+    return io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
@@ -1,5 +1,6 @@
 # config.py
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,3 +11,142 @@ class Config:
     DB_USER = os.getenv("DB_USER", "root")
     DB_PASSWORD = os.getenv("DB_PASSWORD", "")
     DB_NAME = os.getenv("DB_NAME", "WorldHotels")
+
+    # Sessions: sqlite/file are shared by all workers on a host, memory is per process, cookie is Flask's default
+    SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite")
+    SESSION_TTL = int(os.getenv("SESSION_TTL", "43200"))
+    SESSION_FILE_DIR = os.getenv("SESSION_FILE_DIR", os.path.join(tempfile.gettempdir(), "worldhotels-sessions"))
+    SESSION_SQLITE_PATH = os.getenv("SESSION_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "worldhotels-sessions.db"))
+
+    # User role cache used by admin_required (per worker; TTL bounds staleness across workers)
+    ROLE_CACHE_TTL = int(os.getenv("ROLE_CACHE_TTL", "30"))
+    ROLE_CACHE_SIZE = int(os.getenv("ROLE_CACHE_SIZE", "10000"))
+
+    # Password hashing (werkzeug method string, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000")
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_SALT_LENGTH = int(os.getenv("PASSWORD_SALT_LENGTH", "16"))
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "16"))
+    PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "10"))
+
+    # Login rate limiting (token buckets: attempts per minute, burst)
+    LOGIN_RATE_PER_IP = float(os.getenv("LOGIN_RATE_PER_IP", "30"))
+    LOGIN_BURST_PER_IP = int(os.getenv("LOGIN_BURST_PER_IP", "10"))
+    LOGIN_RATE_PER_USER = float(os.getenv("LOGIN_RATE_PER_USER", "10"))
+    LOGIN_BURST_PER_USER = int(os.getenv("LOGIN_BURST_PER_USER", "5"))
+    RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+    # Connection pool
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PING_INTERVAL = float(os.getenv("DB_POOL_PING_INTERVAL", "10"))
+    DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+    DB_BACKOFF_BASE = float(os.getenv("DB_BACKOFF_BASE", "0.5"))
+    DB_BACKOFF_MAX = float(os.getenv("DB_BACKOFF_MAX", "30"))
+
+    # Read replicas: comma-separated host[:port] list, empty = all reads on DB_HOST.
+    DB_REPLICA_HOSTS = os.getenv("DB_REPLICA_HOSTS", "")
+    DB_REPLICA_POOL_SIZE = int(os.getenv("DB_REPLICA_POOL_SIZE", os.getenv("DB_POOL_SIZE", "10")))
+    DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))
+    DB_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_LAG_CHECK_INTERVAL", "2"))
+    DB_STICKY_SECONDS = float(os.getenv("DB_STICKY_SECONDS", "15"))
+
+    # Pricing
+    QUOTE_BATCH_LIMIT = int(os.getenv("QUOTE_BATCH_LIMIT", "500"))
+
+    # Availability search (keep SEARCH_WORKERS below DB_POOL_SIZE). Hotels are
+    # split into at most SEARCH_WORKERS chunks of at least SEARCH_CHUNK_SIZE.
+    SEARCH_CHUNK_SIZE = int(os.getenv("SEARCH_CHUNK_SIZE", "50"))
+    SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "4"))
+    SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "5"))
+
+    # Reference data cache (Hotel, Rate, RoomType)
+    REFDATA_CACHE_TTL = int(os.getenv("REFDATA_CACHE_TTL", "300"))
+    REFDATA_CACHE_SIZE = int(os.getenv("REFDATA_CACHE_SIZE", "10000"))
+
+    # My bookings
+    BOOKING_COUNT_CACHE_TTL = int(os.getenv("BOOKING_COUNT_CACHE_TTL", "300"))
+    BOOKING_COUNT_CACHE_SIZE = int(os.getenv("BOOKING_COUNT_CACHE_SIZE", "10000"))
+
+    # Booking transactions (deadlock / lock wait timeout retries)
+    BOOKING_TX_ATTEMPTS = int(os.getenv("BOOKING_TX_ATTEMPTS", "3"))
+    BOOKING_RETRY_BACKOFF = float(os.getenv("BOOKING_RETRY_BACKOFF", "0.05"))
+
+    # Cancellation fees and bulk cancellation (admin)
+    CANCELLATION_FEE_BATCH_LIMIT = int(os.getenv("CANCELLATION_FEE_BATCH_LIMIT", "500"))
+    BULK_CANCEL_BATCH_SIZE = int(os.getenv("BULK_CANCEL_BATCH_SIZE", "500"))
+    BULK_CANCEL_PAUSE = float(os.getenv("BULK_CANCEL_PAUSE", "0.1"))
+
+    # Admin lists
+    ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", "25"))
+    ADMIN_PAGE_SIZE_MAX = int(os.getenv("ADMIN_PAGE_SIZE_MAX", "100"))
+
+    # JSON API (/api/v1) list pages
+    API_PAGE_SIZE = int(os.getenv("API_PAGE_SIZE", "50"))
+    API_PAGE_SIZE_MAX = int(os.getenv("API_PAGE_SIZE_MAX", "200"))
+
+    # Admin exports
+    EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+    EXPORT_MAX_CONCURRENT = int(os.getenv("EXPORT_MAX_CONCURRENT", "2"))
+
+    # Bulk import
+    IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))
+    IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+
+    # Page and fragment cache for the public pages
+    PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE_ENABLED", "1") == "1"
+    PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", "3600"))
+    PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "256"))
+    TEMPLATE_PRECOMPILE = os.getenv("TEMPLATE_PRECOMPILE", "1") == "1"
+
+    # Booking archive (`flask archive-bookings`)
+    ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+    ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+    ARCHIVE_PAUSE = float(os.getenv("ARCHIVE_PAUSE", "0.2"))
+
+    # Rate calendar: nightly prices per hotel-year. RATE_DEMAND_STEPS lists
+    # occupancy:multiplier pairs; a night at or above an occupancy costs that much more.
+    RATE_CALENDAR_TTL = int(os.getenv("RATE_CALENDAR_TTL", "900"))
+    # Minimum entries; the cache grows to hold every hotel-year a refresh builds.
+    RATE_CALENDAR_SIZE = int(os.getenv("RATE_CALENDAR_SIZE", "1024"))
+    RATE_CALENDAR_REFRESH = int(os.getenv("RATE_CALENDAR_REFRESH", "300"))
+    MAX_STAY_NIGHTS = int(os.getenv("MAX_STAY_NIGHTS", "90"))
+    RATE_DEMAND_STEPS = os.getenv("RATE_DEMAND_STEPS", "0.7:1.10,0.9:1.25")
+
+    # Background jobs (receipts, cancellation bookkeeping, rollups). JOBS_ENABLED=0 runs them inline.
+    JOBS_ENABLED = os.getenv("JOBS_ENABLED", "1") == "1"
+    # Keep the queue on persistent storage (the jobs_data volume in docker-compose) so queued and dead
+    # jobs survive container restarts.
+    JOBS_SQLITE_PATH = os.getenv("JOBS_SQLITE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                  "data", "jobs.db"))
+    JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+    JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "5"))
+    JOBS_RETRY_BACKOFF = float(os.getenv("JOBS_RETRY_BACKOFF", "2.0"))
+    JOBS_LEASE = int(os.getenv("JOBS_LEASE", "300"))
+    JOBS_POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL", "1.0"))
+    JOBS_RETENTION = int(os.getenv("JOBS_RETENTION", "604800"))
+    # Staged jobs (JobOutbox) not handed to the queue within JOBS_OUTBOX_GRACE seconds are queued by a reconciler.
+    JOBS_OUTBOX_GRACE = int(os.getenv("JOBS_OUTBOX_GRACE", "30"))
+    JOBS_OUTBOX_INTERVAL = float(os.getenv("JOBS_OUTBOX_INTERVAL", "15"))
+
+    # Static assets built by `flask build-assets`
+    ASSET_MANIFEST_ENABLED = os.getenv("ASSET_MANIFEST_ENABLED", "1") == "1"
+    ASSET_MAX_AGE = int(os.getenv("ASSET_MAX_AGE", "31536000"))
+    ASSET_IMAGE_MAX_WIDTH = int(os.getenv("ASSET_IMAGE_MAX_WIDTH", "1920"))
+    ASSET_IMAGE_QUALITY = int(os.getenv("ASSET_IMAGE_QUALITY", "82"))
+
+    # Instrumentation
+    SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+    # WSGI server (gunicorn.conf.py). Each worker has its own pool, so keep
+    # DB_POOL_SIZE >= WEB_THREADS and WEB_WORKERS * DB_POOL_SIZE under MySQL's max_connections.
+    WEB_BIND = os.getenv("WEB_BIND", "0.0.0.0:5001")
+    WEB_WORKERS = int(os.getenv("WEB_WORKERS", str((os.cpu_count() or 1) * 2 + 1)))
+    WEB_THREADS = int(os.getenv("WEB_THREADS", "8"))
+    WEB_KEEPALIVE = int(os.getenv("WEB_KEEPALIVE", "5"))
+    WEB_TIMEOUT = int(os.getenv("WEB_TIMEOUT", "30"))
+    WEB_GRACEFUL_TIMEOUT = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+    WEB_MAX_REQUESTS = int(os.getenv("WEB_MAX_REQUESTS", "5000"))
+    WEB_MAX_REQUESTS_JITTER = int(os.getenv("WEB_MAX_REQUESTS_JITTER", "500"))
+    WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "2"))
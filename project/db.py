@@ -1,23 +1,366 @@
-import os
+import threading
 import time
-from dotenv import load_dotenv
+from collections import deque
 import mysql.connector
 from mysql.connector import Error
+from config import Config
+from metrics import InstrumentedCursor, db_acquire_duration, db_read_routes
 
-load_dotenv()
 
-def get_connection():
-    for i in range(10):
+class PoolError(Exception):
+    """Raised when no connection can be handed out by the pool."""
+
+
+class PooledConnection:
+    """Proxy around a MySQL connection that goes back to the pool on close."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool._release(conn)
+
+
+class ConnectionPool:
+    """Bounded pool of MySQL connections with health checks and connect backoff."""
+
+    def __init__(self, size, timeout, recycle, ping_interval, backoff_base, backoff_max, **connect_args):
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_interval = ping_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.connect_args = connect_args
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, created_at, last_used)
+        self._created = {}    # id(conn) -> created_at
+        self._in_use = 0
+        self._failures = 0
+        self._retry_at = 0.0
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'timeouts': 0,
+            'connect_errors': 0,
+            'fast_failures': 0,
+            'discarded': 0,
+        }
+
+    # ---------- Checkout ----------
+    def get(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+
+        with self._cond:
+            while not self._idle and self._in_use >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolError(f"Timed out after {self.timeout}s waiting for a database connection.")
+                waited = True
+                self._cond.wait(remaining)
+
+            entry = self._idle.pop() if self._idle else None
+            self._in_use += 1
+            self._record_wait(time.monotonic() - start, waited)
+
         try:
-            conn = mysql.connector.connect(
-                host=os.getenv("DB_HOST"),
-                user=os.getenv("DB_USER"),
-                password=os.getenv("DB_PASSWORD"),
-                database=os.getenv("DB_NAME")
-            )
-            if conn.is_connected():
+            conn = self._checkout(entry)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, conn)
+
+    def _checkout(self, entry):
+        if entry is not None:
+            conn, created_at, last_used = entry
+            if self._healthy(conn, created_at, last_used):
                 return conn
+            self._discard(conn)
+        return self._connect()
+
+    def _healthy(self, conn, created_at, last_used):
+        now = time.monotonic()
+        if self.recycle and now - created_at > self.recycle:
+            return False
+        if now - last_used < self.ping_interval:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Error:
+            return False
+
+    def _connect(self):
+        with self._cond:
+            if time.monotonic() < self._retry_at:
+                self._stats['fast_failures'] += 1
+                raise PoolError("Database unavailable, backing off before reconnecting.")
+
+        try:
+            conn = mysql.connector.connect(**self.connect_args)
         except Error as e:
-            print(f"Attempt {i+1}/10 failed: {e}")
-            time.sleep(3)
-    raise Exception("Failed to connect to MySQL after multiple attempts.")
+            with self._cond:
+                self._failures += 1
+                self._stats['connect_errors'] += 1
+                delay = min(self.backoff_base * 2 ** (self._failures - 1), self.backoff_max)
+                self._retry_at = time.monotonic() + delay
+            print(f"Connection attempt failed ({self._failures} in a row), retrying in {delay:.1f}s: {e}")
+            raise PoolError(f"Failed to connect to MySQL: {e}") from e
+
+        with self._cond:
+            self._failures = 0
+            self._retry_at = 0.0
+            self._created[id(conn)] = time.monotonic()
+        return conn
+
+    # ---------- Return ----------
+    def _release(self, conn):
+        try:
+            # Never hand the next request an open transaction or a stale snapshot.
+            if conn.unread_result or conn.in_transaction:
+                conn.rollback()
+            reusable = True
+        except Error:
+            reusable = False
+
+        with self._cond:
+            self._in_use -= 1
+            if reusable:
+                created_at = self._created.get(id(conn), time.monotonic())
+                self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+        if not reusable:
+            self._discard(conn)
+
+    def _discard(self, conn):
+        with self._cond:
+            self._created.pop(id(conn), None)
+            self._stats['discarded'] += 1
+        try:
+            conn.close()
+        except Error:
+            pass
+
+    def _record_wait(self, elapsed, waited):
+        self._stats['checkouts'] += 1
+        self._stats['wait_time_total'] += elapsed
+        self._stats['wait_time_max'] = max(self._stats['wait_time_max'], elapsed)
+        if waited:
+            self._stats['waits'] += 1
+
+    # ---------- Warm-up ----------
+    def warm(self, count):
+        """Open up to count connections ahead of traffic and leave them idle."""
+        conns = []
+        try:
+            for _ in range(min(count, self.size)):
+                conns.append(self.get())
+        finally:
+            for conn in conns:
+                conn.close()
+        return len(conns)
+
+    # ---------- Stats ----------
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(
+                size=self.size,
+                in_use=self._in_use,
+                idle=len(self._idle),
+                consecutive_failures=self._failures,
+            )
+        checkouts = stats['checkouts'] or 1
+        stats['wait_time_avg_ms'] = round(stats['wait_time_total'] / checkouts * 1000, 3)
+        stats['wait_time_total_ms'] = round(stats.pop('wait_time_total') * 1000, 3)
+        stats['wait_time_max_ms'] = round(stats.pop('wait_time_max') * 1000, 3)
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    size=Config.DB_POOL_SIZE,
+                    timeout=Config.DB_POOL_TIMEOUT,
+                    recycle=Config.DB_POOL_RECYCLE,
+                    ping_interval=Config.DB_POOL_PING_INTERVAL,
+                    backoff_base=Config.DB_BACKOFF_BASE,
+                    backoff_max=Config.DB_BACKOFF_MAX,
+                    host=Config.DB_HOST,
+                    user=Config.DB_USER,
+                    password=Config.DB_PASSWORD,
+                    database=Config.DB_NAME,
+                    connection_timeout=Config.DB_CONNECT_TIMEOUT,
+                )
+    return _pool
+
+
+def get_connection():
+    start = time.perf_counter()
+    try:
+        return get_pool().get()
+    finally:
+        db_acquire_duration.observe(time.perf_counter() - start)
+
+
+class UnpooledConnection(PooledConnection):
+    """Instrumented connection that is really closed rather than returned to a pool."""
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            conn.close()
+
+
+def get_unpooled_connection():
+    """Dedicated connection for long-running work (e.g. exports) that shouldn't hold a pool slot."""
+    return UnpooledConnection(None, mysql.connector.connect(**get_pool().connect_args))
+
+
+def pool_stats():
+    stats = get_pool().stats()
+    if Config.DB_REPLICA_HOSTS:
+        stats['replicas'] = [replica.stats() for replica in get_replicas()]
+    return stats
+
+
+# ---------- Read replicas ----------
+# Reads that can tolerate a little lag go to a replica from DB_REPLICA_HOSTS,
+# taken round-robin. A replica is skipped while its reported lag is unknown
+# or above DB_REPLICA_MAX_LAG, or while it can't be reached; if none is
+# usable the read goes to the primary. A user who wrote within the last
+# DB_STICKY_SECONDS reads from the primary, so they always see their own
+# booking or cancellation.
+
+class Replica:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.pool = ConnectionPool(
+            size=Config.DB_REPLICA_POOL_SIZE,
+            timeout=Config.DB_POOL_TIMEOUT,
+            recycle=Config.DB_POOL_RECYCLE,
+            ping_interval=Config.DB_POOL_PING_INTERVAL,
+            backoff_base=Config.DB_BACKOFF_BASE,
+            backoff_max=Config.DB_BACKOFF_MAX,
+            host=host,
+            port=port,
+            user=Config.DB_USER,
+            password=Config.DB_PASSWORD,
+            database=Config.DB_NAME,
+            connection_timeout=Config.DB_CONNECT_TIMEOUT,
+        )
+        self.lag = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _measure_lag(self, conn):
+        """Seconds behind the primary, or None when replication isn't running."""
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except Error:
+            cursor.execute("SHOW SLAVE STATUS")  # MySQL before 8.0.22
+        row = cursor.fetchone()
+        cursor.fetchall()
+        if not row:
+            return None
+        return row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+
+    def usable(self):
+        """Re-check the lag at most every DB_REPLICA_LAG_CHECK_INTERVAL; False means use the primary."""
+        if time.monotonic() - self._checked_at >= Config.DB_REPLICA_LAG_CHECK_INTERVAL and self._lock.acquire(False):
+            try:
+                with self.pool.get() as conn:
+                    self.lag = self._measure_lag(conn)
+            except (PoolError, Error):
+                self.lag = None
+            finally:
+                self._checked_at = time.monotonic()
+                self._lock.release()
+        return self.lag is not None and self.lag <= Config.DB_REPLICA_MAX_LAG
+
+    def stats(self):
+        return {'host': f"{self.host}:{self.port}", 'lag_s': self.lag, 'usable': self.usable(), **self.pool.stats()}
+
+
+_replicas = None
+_next_replica = 0
+
+
+def get_replicas():
+    global _replicas
+    if _replicas is None:
+        with _pool_lock:
+            if _replicas is None:
+                replicas = []
+                for address in filter(None, (a.strip() for a in Config.DB_REPLICA_HOSTS.split(','))):
+                    host, _, port = address.partition(':')
+                    replicas.append(Replica(host, int(port or 3306)))
+                _replicas = replicas
+    return _replicas
+
+
+def get_read_connection(last_write_at=None):
+    """Connection for reads that tolerate replica lag.
+
+    Pass the time.time() of the caller's last write (e.g. from the session) to
+    read from the primary for DB_STICKY_SECONDS after it.
+    """
+    global _next_replica
+    replicas = get_replicas()
+    if not replicas:
+        return get_connection()
+    if last_write_at and time.time() - last_write_at < Config.DB_STICKY_SECONDS:
+        db_read_routes.inc('primary', 'sticky')
+        return get_connection()
+
+    start = _next_replica = (_next_replica + 1) % len(replicas)
+    reason = 'lagging'
+    for offset in range(len(replicas)):
+        replica = replicas[(start + offset) % len(replicas)]
+        if not replica.usable():
+            continue
+        begin = time.perf_counter()
+        try:
+            conn = replica.pool.get()
+        except PoolError:
+            reason = 'unavailable'
+            continue
+        finally:
+            db_acquire_duration.observe(time.perf_counter() - begin)
+        db_read_routes.inc('replica', 'ok')
+        return conn
+    db_read_routes.inc('primary', reason)
+    return get_connection()
@@ -41,9 +41,11 @@ CREATE TABLE `Booking` (
   `TotalPrice` decimal(10,2) DEFAULT NULL,
   `BookingCurrency` varchar(45) DEFAULT NULL,
   PRIMARY KEY (`BookingID`),
-  KEY `UserID_idx` (`UserID`),
+  KEY `UserBooking_idx` (`UserID`,`BookingID`),
   KEY `RoomIDfk_idx` (`RoomID`),
-  KEY `HotelIDfk_idx` (`HotelID`),
+  KEY `HotelIDfk_idx` (`HotelID`,`BookingID`),
+  KEY `StatusBooking_idx` (`Status`,`BookingID`),
+  KEY `CheckIn_idx` (`CheckIn`),
   KEY `RoomTypeID1fk_idx` (`RoomTypeID`),
   CONSTRAINT `HotelIDfk` FOREIGN KEY (`HotelID`) REFERENCES `Hotel` (`HotelID`),
   CONSTRAINT `RoomIDfk` FOREIGN KEY (`RoomID`) REFERENCES `Room` (`RoomID`),
@@ -90,6 +92,26 @@ INSERT INTO `Cancellations` VALUES (1,'2024-5-3','0.00',6),(2,'2024-5-3','1.00',
 /*!40000 ALTER TABLE `Cancellations` ENABLE KEYS */;
 UNLOCK TABLES;
 
+--
+-- Table structure for table `DailyRollup`
+--
+
+DROP TABLE IF EXISTS `DailyRollup`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `DailyRollup` (
+  `HotelID` int NOT NULL,
+  `RoomTypeID` int NOT NULL,
+  `Day` date NOT NULL,
+  `RoomNights` int NOT NULL DEFAULT '0',
+  `Revenue` decimal(12,2) NOT NULL DEFAULT '0.00',
+  `Cancellations` int NOT NULL DEFAULT '0',
+  `CancellationFees` decimal(12,2) NOT NULL DEFAULT '0.00',
+  PRIMARY KEY (`HotelID`,`RoomTypeID`,`Day`),
+  KEY `DailyRollupDay_idx` (`Day`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 --
 -- Table structure for table `Hotel`
 --
@@ -194,6 +216,7 @@ CREATE TABLE `Room` (
   PRIMARY KEY (`RoomID`),
   KEY `fkHotelID_idx` (`HotelID`),
   KEY `fkRoomTypeID_1_idx` (`RoomTypeID`),
+  KEY `HotelRoomType_idx` (`HotelID`,`RoomTypeID`,`RoomID`),
   CONSTRAINT `fkHotelID` FOREIGN KEY (`HotelID`) REFERENCES `Hotel` (`HotelID`),
   CONSTRAINT `fkRoomTypeID_1` FOREIGN KEY (`RoomTypeID`) REFERENCES `RoomType` (`RoomTypeID`)
 ) ENGINE=InnoDB AUTO_INCREMENT=9030 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
@@ -209,6 +232,24 @@ INSERT INTO `Room` VALUES (3530,1,1,1,0,1,1,100,0),(3531,1,1,1,0,1,1,101,0),(353
 /*!40000 ALTER TABLE `Room` ENABLE KEYS */;
 UNLOCK TABLES;
 
+--
+-- Table structure for table `RoomNight`
+--
+
+DROP TABLE IF EXISTS `RoomNight`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `RoomNight` (
+  `RoomID` int NOT NULL,
+  `NightDate` date NOT NULL,
+  `BookingID` int NOT NULL,
+  PRIMARY KEY (`RoomID`,`NightDate`),
+  KEY `RoomNightBooking_idx` (`BookingID`),
+  CONSTRAINT `fkRoomNightRoom` FOREIGN KEY (`RoomID`) REFERENCES `Room` (`RoomID`),
+  CONSTRAINT `fkRoomNightBooking` FOREIGN KEY (`BookingID`) REFERENCES `Booking` (`BookingID`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 --
 -- Table structure for table `RoomType`
 --
@@ -249,7 +290,9 @@ CREATE TABLE `User` (
   `Role` varchar(45) NOT NULL,
   `FirstName` varchar(45) NOT NULL,
   `LastName` varchar(45) NOT NULL,
-  PRIMARY KEY (`UserID`)
+  PRIMARY KEY (`UserID`),
+  UNIQUE KEY `Username_idx` (`Username`),
+  UNIQUE KEY `Email_idx` (`Email`)
 ) ENGINE=InnoDB AUTO_INCREMENT=12 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -262,6 +305,89 @@ LOCK TABLES `User` WRITE;
 INSERT INTO `User` VALUES (4,'john','john@gmail.com','scrypt:32768:8:1$UNsBCm5jgseScycQ$9916fce874ff8f027349ab0b1199ddf44a61827712b5a54aea32f69cad8ba36e00317e306a1729e4f184c2d088769767dd4f31772399128376240c463d1d1d35','admin','John','Martin'),(5,'test123','test@gmail.com','scrypt:32768:8:1$IgkZ6hQftACTuSXd$14982afe00369464272c386e5c05141f2f7a7e3ff3763b70bad5b9029a1bbdabedfa0f120a50c4ac6261b078ab5718fc37b63f5bfb70f15cf590b1f3b18c7c6c','admin','test','test'),(6,'lukehart123','dummy@gmail.com','scrypt:32768:8:1$mYWQ6CGf1qwTEucV$b3e32c1e5eab0029de6ea5ea314e0f4aaf07cf248edd86f6204c6b35f15a26a55f2c45ff5bfdc7639f8f855c8ea6b0f1636f9596738f222219ef7169a683dc33','user','Luke','Hart'),(7,'testAdmin','admin@gmail.com','scrypt:32768:8:1$gqzppykyJQsVY91s$47fd3d504de50ce085267d28cf4c797cc6c7efbc62f4a4621d86d014a08e4693e6c22a905a0dd0ef285dcd17f47c3163a3700cba2d96a6c6048bba1e8a37c8ef','admin','test','admin'),(8,'testUser','user@gmail.com','scrypt:32768:8:1$Q1tmrztuexfCjaAi$683229fcebb9fe82eed86201503e7de6e9412746bb5b34a819ec7b5f12ee1bdb75d2aec793af6b05ef72c32448b7d6d6703b99c7fec2858720b53ead124441db','user','test','user');
 /*!40000 ALTER TABLE `User` ENABLE KEYS */;
 UNLOCK TABLES;
+--
+-- Idempotency keys for booking form submissions
+--
+
+ALTER TABLE `Booking`
+  ADD COLUMN `IdempotencyKey` varchar(64) DEFAULT NULL,
+  ADD UNIQUE KEY `UserIdempotency_idx` (`UserID`,`IdempotencyKey`);
+
+--
+-- Archive tier for past stays (see archive.py / `flask archive-bookings`)
+--
+
+ALTER TABLE `Booking` ADD KEY `CheckOut_idx` (`CheckOut`);
+
+CREATE TABLE `BookingArchive` LIKE `Booking`;
+CREATE TABLE `ReceiptArchive` LIKE `Receipt`;
+CREATE TABLE `CancellationsArchive` LIKE `Cancellations`;
+CREATE TABLE `RoomNightArchive` LIKE `RoomNight`;
+
+--
+-- Row versions for the JSON API's ETags (see routes/api.py)
+--
+
+ALTER TABLE `Hotel` ADD COLUMN `UpdatedAt` timestamp(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6);
+ALTER TABLE `Room` ADD COLUMN `UpdatedAt` timestamp(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6);
+ALTER TABLE `Rate` ADD COLUMN `UpdatedAt` timestamp(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6);
+ALTER TABLE `Booking` ADD COLUMN `UpdatedAt` timestamp(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6);
+ALTER TABLE `BookingArchive` ADD COLUMN `UpdatedAt` timestamp(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6);
+
+--
+-- Transactional outbox for background jobs (see jobs.stage / jobs.dispatch)
+--
+
+CREATE TABLE `JobOutbox` (
+  `OutboxID` bigint NOT NULL AUTO_INCREMENT,
+  `Name` varchar(64) NOT NULL,
+  `Payload` mediumtext NOT NULL,
+  `CreatedAt` timestamp(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+  PRIMARY KEY (`OutboxID`),
+  KEY `CreatedAt_idx` (`CreatedAt`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+--
+-- Backfill per-night room occupancy from existing bookings
+--
+
+INSERT IGNORE INTO `RoomNight` (`RoomID`, `NightDate`, `BookingID`)
+WITH RECURSIVE `nights` AS (
+  SELECT `BookingID`, `RoomID`, `CheckIn` AS `NightDate`, `CheckOut`
+  FROM `Booking`
+  WHERE `RoomID` IS NOT NULL AND `Status` <> 'Cancelled' AND `CheckOut` > `CheckIn`
+  UNION ALL
+  SELECT `BookingID`, `RoomID`, `NightDate` + INTERVAL 1 DAY, `CheckOut`
+  FROM `nights`
+  WHERE `NightDate` + INTERVAL 1 DAY < `CheckOut`
+)
+SELECT `RoomID`, `NightDate`, `BookingID` FROM `nights`;
+
+--
+-- Build the daily occupancy/revenue rollups (same as `flask rebuild-rollups`)
+--
+
+INSERT INTO `DailyRollup` (`HotelID`, `RoomTypeID`, `Day`, `RoomNights`, `Revenue`)
+SELECT b.`HotelID`, b.`RoomTypeID`, n.`NightDate`, COUNT(*),
+       SUM(CASE
+           WHEN n.`NightDate` = b.`CheckOut` - INTERVAL 1 DAY
+           THEN IFNULL(b.`TotalPrice`, 0) - ROUND(IFNULL(b.`TotalPrice`, 0) / DATEDIFF(b.`CheckOut`, b.`CheckIn`), 2) * (DATEDIFF(b.`CheckOut`, b.`CheckIn`) - 1)
+           ELSE ROUND(IFNULL(b.`TotalPrice`, 0) / DATEDIFF(b.`CheckOut`, b.`CheckIn`), 2)
+       END)
+FROM `RoomNight` n
+JOIN `Booking` b ON b.`BookingID` = n.`BookingID`
+GROUP BY b.`HotelID`, b.`RoomTypeID`, n.`NightDate`;
+
+INSERT INTO `DailyRollup` (`HotelID`, `RoomTypeID`, `Day`, `Cancellations`, `CancellationFees`)
+SELECT * FROM (
+  SELECT b.`HotelID`, b.`RoomTypeID`, DATE(c.`CancellationDate`) AS `CancelDay`, COUNT(*) AS `CancelCount`,
+         SUM(CAST(c.`CancellationFee` AS DECIMAL(12, 2))) AS `CancelFees`
+  FROM `Cancellations` c
+  JOIN `Booking` b ON b.`BookingID` = c.`BookingID`
+  GROUP BY b.`HotelID`, b.`RoomTypeID`, DATE(c.`CancellationDate`)
+) AS `cancelled`
+ON DUPLICATE KEY UPDATE `Cancellations` = `CancelCount`, `CancellationFees` = `CancelFees`;
+
 /*!40103 SET TIME_ZONE=@OLD_TIME_ZONE */;
 
 /*!40101 SET SQL_MODE=@OLD_SQL_MODE */;
@@ -0,0 +1,31 @@
+#!/bin/bash
+# Runs once, from the replica container's docker-entrypoint-initdb.d, after
+# init.sql has loaded the same starting data the primary has. The primary's
+# current GTID set is marked as already applied, then replication starts from
+# there, so init.sql isn't replayed on top of itself.
+set -e
+
+primary=(mysql -h db -uroot -p"$MYSQL_ROOT_PASSWORD" -N -s)
+local_mysql=(mysql --protocol=socket -uroot -p"$MYSQL_ROOT_PASSWORD")
+
+# The primary only accepts TCP connections once its own initialisation is done.
+for _ in $(seq 1 120); do
+    if "${primary[@]}" -e "SELECT 1" >/dev/null 2>&1; then
+        break
+    fi
+    sleep 1
+done
+
+gtids=$("${primary[@]}" -e "SELECT @@GLOBAL.gtid_executed" | tr -d '\n')
+
+"${local_mysql[@]}" <<SQL
+RESET MASTER;
+SET GLOBAL gtid_purged = '${gtids}';
+CHANGE REPLICATION SOURCE TO
+    SOURCE_HOST = 'db',
+    SOURCE_USER = 'root',
+    SOURCE_PASSWORD = '${MYSQL_ROOT_PASSWORD}',
+    SOURCE_AUTO_POSITION = 1,
+    GET_SOURCE_PUBLIC_KEY = 1;
+START REPLICA;
+SQL
@@ -0,0 +1,32 @@
+# gunicorn.conf.py
+# Production server: gunicorn -c gunicorn.conf.py app:app
+# Send SIGHUP to the master for a graceful reload (new workers start and warm
+# up, old ones finish in-flight requests within graceful_timeout).
+from config import Config
+
+bind = Config.WEB_BIND
+workers = Config.WEB_WORKERS
+worker_class = 'gthread'
+threads = Config.WEB_THREADS
+keepalive = Config.WEB_KEEPALIVE
+timeout = Config.WEB_TIMEOUT
+graceful_timeout = Config.WEB_GRACEFUL_TIMEOUT
+
+# Recycle workers periodically; the jitter stops them all restarting at once.
+max_requests = Config.WEB_MAX_REQUESTS
+max_requests_jitter = Config.WEB_MAX_REQUESTS_JITTER
+
+# Load the app in each worker so no pool connection or cache crosses a fork.
+preload_app = False
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_worker_init(worker):
+    # Runs in the worker after the app is loaded and before it accepts connections.
+    from app import warm_up
+    import jobs
+    warm_up(worker.wsgi)
+    # Pick up jobs left queued by earlier workers without waiting for a new one.
+    jobs.start_workers()
@@ -0,0 +1,143 @@
+from datetime import date, datetime, timedelta
+from mysql.connector.errors import IntegrityError
+
+# Room occupancy is stored one row per booked night in RoomNight, keyed on
+# (RoomID, NightDate). The primary key makes a double booking impossible:
+# two stays overlapping on any night collide on the same key.
+
+
+class RoomUnavailable(Exception):
+    """Raised when no room of the requested type is free for the whole stay."""
+
+
+def to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value), "%Y-%m-%d").date()
+
+
+def stay_nights(check_in, check_out):
+    """Return the nights covered by the half-open stay [check_in, check_out)."""
+    start, end = to_date(check_in), to_date(check_out)
+    if end <= start:
+        raise ValueError("Check-out date must be after check-in date.")
+    return [start + timedelta(days=i) for i in range((end - start).days)]
+
+
+def find_free_rooms(cursor, hotel_id, room_type_id, check_in, check_out, limit=10, lock=False, skip_locked=True):
+    """Rooms of the given type at the hotel with no booked night in the stay.
+
+    With lock=True the returned Room rows are locked FOR UPDATE. By default
+    rows already locked by concurrent bookings are skipped, so parallel
+    requests for the same room type are handed different rooms instead of
+    queueing; skip_locked=False waits for those locks instead.
+    """
+    cursor.execute(f"""
+        SELECT r.RoomID, r.RoomNumber
+        FROM Room r
+        WHERE r.HotelID = %s AND r.RoomTypeID = %s
+          AND NOT EXISTS (
+              SELECT 1 FROM RoomNight n
+              WHERE n.RoomID = r.RoomID AND n.NightDate >= %s AND n.NightDate < %s
+          )
+        ORDER BY r.RoomID
+        LIMIT %s
+        {("FOR UPDATE OF r SKIP LOCKED" if skip_locked else "FOR UPDATE OF r") if lock else ""}
+    """, (hotel_id, room_type_id, to_date(check_in), to_date(check_out), limit))
+    return cursor.fetchall()
+
+
+def count_free_rooms(cursor, hotel_id, room_type_id, check_in, check_out):
+    cursor.execute("""
+        SELECT COUNT(*)
+        FROM Room r
+        WHERE r.HotelID = %s AND r.RoomTypeID = %s
+          AND NOT EXISTS (
+              SELECT 1 FROM RoomNight n
+              WHERE n.RoomID = r.RoomID AND n.NightDate >= %s AND n.NightDate < %s
+          )
+    """, (hotel_id, room_type_id, to_date(check_in), to_date(check_out)))
+    return cursor.fetchone()[0]
+
+
+def count_free_rooms_by_type(cursor, hotel_ids, room_type_ids, check_in, check_out):
+    """Free rooms per (HotelID, RoomTypeID) across several hotels in one grouped query."""
+    hotel_marks = ", ".join(["%s"] * len(hotel_ids))
+    type_marks = ", ".join(["%s"] * len(room_type_ids))
+    cursor.execute(f"""
+        SELECT r.HotelID, r.RoomTypeID, COUNT(*)
+        FROM Room r
+        WHERE r.HotelID IN ({hotel_marks}) AND r.RoomTypeID IN ({type_marks})
+          AND NOT EXISTS (
+              SELECT 1 FROM RoomNight n
+              WHERE n.RoomID = r.RoomID AND n.NightDate >= %s AND n.NightDate < %s
+          )
+        GROUP BY r.HotelID, r.RoomTypeID
+    """, (*hotel_ids, *room_type_ids, to_date(check_in), to_date(check_out)))
+    return {(hotel_id, room_type_id): count for hotel_id, room_type_id, count in cursor.fetchall()}
+
+
+def reserve_nights(cursor, room_id, booking_id, check_in, check_out):
+    """Claim every night of the stay for the booking in a single statement.
+
+    Raises IntegrityError if any night is already taken; InnoDB rolls back the
+    whole statement so no partial claim is left behind.
+    """
+    nights = stay_nights(check_in, check_out)
+    placeholders = ", ".join(["(%s, %s, %s)"] * len(nights))
+    params = []
+    for night in nights:
+        params.extend((room_id, night, booking_id))
+    cursor.execute(
+        f"INSERT INTO RoomNight (RoomID, NightDate, BookingID) VALUES {placeholders}",
+        params
+    )
+
+
+def allocate_room(cursor, hotel_id, room_type_id, check_in, check_out, booking_id, attempts=5, batch=3):
+    """Atomically assign a free room to the booking; returns (RoomID, RoomNumber).
+
+    The caller owns the transaction. Candidate rooms are locked a few at a time
+    (SKIP LOCKED); one that still loses a race on the RoomNight primary key is
+    skipped and the next candidate is tried. When every free room is locked,
+    the lookup is repeated waiting for the locks, because a room locked by a
+    booking for other dates is still free for this stay.
+    """
+    tried = set()
+
+    def free_rooms(skip_locked):
+        return [
+            row for row in find_free_rooms(cursor, hotel_id, room_type_id, check_in, check_out,
+                                           limit=len(tried) + batch, lock=True, skip_locked=skip_locked)
+            if row[0] not in tried
+        ]
+
+    for _ in range(attempts):
+        candidates = free_rooms(skip_locked=True) or free_rooms(skip_locked=False)
+        if not candidates:
+            break
+        for room_id, room_number in candidates:
+            tried.add(room_id)
+            try:
+                reserve_nights(cursor, room_id, booking_id, check_in, check_out)
+            except IntegrityError:
+                continue
+            return room_id, room_number
+    raise RoomUnavailable("No rooms of this type are free for the selected dates.")
+
+
+def release_booking(cursor, booking_id):
+    """Free every night held by the booking; returns the number of nights released."""
+    cursor.execute("DELETE FROM RoomNight WHERE BookingID = %s", (booking_id,))
+    return cursor.rowcount
+
+
+def release_bookings(cursor, booking_ids):
+    """Free every night held by any of the bookings in one statement; returns the number released."""
+    if not booking_ids:
+        return 0
+    placeholders = ", ".join(["%s"] * len(booking_ids))
+    cursor.execute(f"DELETE FROM RoomNight WHERE BookingID IN ({placeholders})", list(booking_ids))
+    return cursor.rowcount
@@ -0,0 +1,330 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from config import Config
+from db import get_connection
+import metrics
+
+# Background jobs for side effects the user doesn't wait for: receipts,
+# cancellation bookkeeping and rollup maintenance. Jobs live in a local
+# SQLite table, so they survive restarts and are shared by every worker
+# process on the host. Each process runs JOBS_WORKERS threads that claim
+# jobs one at a time. A failed job is retried with exponential backoff and
+# moved to 'dead' after JOBS_MAX_ATTEMPTS; `flask requeue-jobs` puts dead
+# jobs back. Handlers must be idempotent: a job whose worker died mid-run is
+# claimed again once its lease expires.
+#
+# Jobs that follow a MySQL write are staged in the JobOutbox table inside
+# that write's transaction and handed to the queue once it commits. If the
+# hand-off is lost (the process dies, SQLite stays locked), the row is still
+# in JobOutbox. One worker thread per process queues such rows after
+# JOBS_OUTBOX_GRACE seconds, so a committed booking never loses its follow-up
+# work. With JOBS_ENABLED=0 there are no workers; run `flask drain-outbox`
+# from cron instead.
+
+logger = logging.getLogger('worldhotels.jobs')
+
+QUEUED, RUNNING, DONE, DEAD = 'queued', 'running', 'done', 'dead'
+_handlers = {}
+
+
+def handler(name):
+    """Register fn(conn, **payload) as the handler for jobs called `name`."""
+    def register(fn):
+        _handlers[name] = fn
+        return fn
+    return register
+
+
+class JobQueue:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    enqueued_at REAL NOT NULL,
+                    run_at REAL NOT NULL,
+                    locked_until REAL,
+                    finished_at REAL,
+                    last_error TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready_idx ON jobs (status, run_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode; claim() opens its own write transaction.
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        return conn
+
+    def enqueue(self, name, payload):
+        if name not in _handlers:
+            raise ValueError(f"No handler registered for job {name!r}")
+        now = time.time()
+        cursor = self._connect().execute(
+            "INSERT INTO jobs (name, payload, status, enqueued_at, run_at) VALUES (?, ?, ?, ?, ?)",
+            (name, json.dumps(payload), QUEUED, now, now)
+        )
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def claim(self):
+        """Take the oldest due job: (id, name, payload, attempts, enqueued_at), or None."""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Jobs whose worker died are handed out again once their lease runs out.
+            conn.execute("UPDATE jobs SET status = ? WHERE status = ? AND locked_until < ?", (QUEUED, RUNNING, now))
+            row = conn.execute(
+                "SELECT id, name, payload, attempts, enqueued_at FROM jobs "
+                "WHERE status = ? AND run_at <= ? ORDER BY run_at, id LIMIT 1", (QUEUED, now)
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, locked_until = ? WHERE id = ?",
+                    (RUNNING, now + Config.JOBS_LEASE, row[0])
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        job_id, name, payload, attempts, enqueued_at = row
+        return job_id, name, json.loads(payload), attempts + 1, enqueued_at
+
+    def complete(self, job_id):
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, locked_until = NULL, last_error = NULL WHERE id = ?",
+            (DONE, time.time(), job_id)
+        )
+
+    def fail(self, job_id, error, retry_at=None):
+        """Schedule a retry at `retry_at`, or dead-letter the job when it is None."""
+        if retry_at is None:
+            self._connect().execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, locked_until = NULL, last_error = ? WHERE id = ?",
+                (DEAD, time.time(), error, job_id)
+            )
+        else:
+            self._connect().execute(
+                "UPDATE jobs SET status = ?, run_at = ?, locked_until = NULL, last_error = ? WHERE id = ?",
+                (QUEUED, retry_at, error, job_id)
+            )
+
+    def requeue_dead(self, job_ids=None):
+        query = "UPDATE jobs SET status = ?, attempts = 0, run_at = ?, finished_at = NULL WHERE status = ?"
+        params = [QUEUED, time.time(), DEAD]
+        if job_ids:
+            query += f" AND id IN ({', '.join('?' * len(job_ids))})"
+            params.extend(job_ids)
+        count = self._connect().execute(query, params).rowcount
+        self._wakeup.set()
+        return count
+
+    def purge(self, older_than):
+        return self._connect().execute(
+            "DELETE FROM jobs WHERE status = ? AND finished_at < ?", (DONE, time.time() - older_than)
+        ).rowcount
+
+    def dead_jobs(self, limit=50):
+        return self._connect().execute(
+            "SELECT id, name, payload, attempts, finished_at, last_error FROM jobs WHERE status = ? "
+            "ORDER BY id DESC LIMIT ?", (DEAD, limit)
+        ).fetchall()
+
+    def stats(self):
+        conn = self._connect()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        oldest = conn.execute(
+            "SELECT MIN(enqueued_at) FROM jobs WHERE status = ? AND run_at <= ?", (QUEUED, time.time())
+        ).fetchone()[0]
+        return {
+            'queued': counts.get(QUEUED, 0),
+            'running': counts.get(RUNNING, 0),
+            'done': counts.get(DONE, 0),
+            'dead': counts.get(DEAD, 0),
+            'oldest_queued_age_s': round(time.time() - oldest, 3) if oldest else 0.0,
+        }
+
+    def wait(self, timeout):
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+
+# ---------- Workers ----------
+def run_one(queue):
+    """Claim and run one job; returns False when nothing was due."""
+    job = queue.claim()
+    if job is None:
+        return False
+    job_id, name, payload, attempt, enqueued_at = job
+    started = time.time()
+    if attempt == 1:
+        metrics.job_wait.observe(started - enqueued_at, name)
+    try:
+        with get_connection() as conn:
+            _handlers[name](conn, **payload)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        if attempt >= Config.JOBS_MAX_ATTEMPTS:
+            logger.error("Job %s %s dead after %d attempts: %s", job_id, name, attempt, error)
+            queue.fail(job_id, error)
+            metrics.jobs_processed.inc(name, 'dead')
+        else:
+            delay = Config.JOBS_RETRY_BACKOFF * 2 ** (attempt - 1)
+            queue.fail(job_id, error, time.time() + random.uniform(delay / 2, delay))
+            metrics.jobs_processed.inc(name, 'retried')
+        return True
+    finally:
+        metrics.job_duration.observe(time.time() - started, name)
+    queue.complete(job_id)
+    metrics.jobs_processed.inc(name, 'succeeded')
+    return True
+
+
+def _work(queue, stop, reconcile=False):
+    last_purge = last_reconcile = 0.0
+    while not stop.is_set():
+        try:
+            if time.time() - last_purge > 3600:
+                queue.purge(Config.JOBS_RETENTION)
+                last_purge = time.time()
+            if reconcile and time.time() - last_reconcile > Config.JOBS_OUTBOX_INTERVAL:
+                last_reconcile = time.time()
+                with get_connection() as conn:
+                    while drain_outbox(conn) == OUTBOX_BATCH:
+                        pass
+            if not run_one(queue):
+                queue.wait(Config.JOBS_POLL_INTERVAL)
+        except Exception:
+            # The queue file itself failed (locked too long, disk full); keep the thread alive.
+            logger.exception("Job worker error")
+            stop.wait(Config.JOBS_POLL_INTERVAL)
+
+
+_queue = None
+_workers = []
+_stop = threading.Event()
+_lock = threading.Lock()
+
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        with _lock:
+            if _queue is None:
+                _queue = JobQueue(Config.JOBS_SQLITE_PATH)
+    return _queue
+
+
+def start_workers(count=None):
+    """Start this process's worker threads once; later calls are no-ops."""
+    if _workers or not Config.JOBS_ENABLED:
+        return
+    queue = get_queue()
+    with _lock:
+        if _workers:
+            return
+        for i in range(count or Config.JOBS_WORKERS):
+            thread = threading.Thread(target=_work, args=(queue, _stop, i == 0), name=f'jobs-{os.getpid()}-{i}',
+                                      daemon=True)
+            thread.start()
+            _workers.append(thread)
+
+
+def enqueue(name, **payload):
+    """Queue a job for the background workers; with JOBS_ENABLED off it runs right away instead."""
+    if not Config.JOBS_ENABLED:
+        with get_connection() as conn:
+            _handlers[name](conn, **payload)
+        return None
+    start_workers()
+    return get_queue().enqueue(name, payload)
+
+
+def queue_stats():
+    return get_queue().stats()
+
+
+# ---------- Transactional outbox ----------
+OUTBOX_BATCH = 100
+
+
+def stage(cursor, name, **payload):
+    """Record a job in JobOutbox inside the caller's MySQL transaction; pass the result to dispatch()."""
+    if name not in _handlers:
+        raise ValueError(f"No handler registered for job {name!r}")
+    cursor.execute("INSERT INTO JobOutbox (Name, Payload) VALUES (%s, %s)", (name, json.dumps(payload)))
+    return cursor.lastrowid, name, payload
+
+
+def dispatch(conn, staged):
+    """Queue jobs staged by a transaction that has committed, then clear them from JobOutbox.
+
+    Never raises: a job that can't be queued now stays in JobOutbox for the
+    reconciler, and the caller's write has already succeeded.
+    """
+    queued = []
+    for outbox_id, name, payload in staged:
+        try:
+            enqueue(name, **payload)
+        except Exception:
+            logger.exception("Could not queue job %s (outbox %s); the reconciler will retry it", name, outbox_id)
+            continue
+        queued.append(outbox_id)
+    if not queued:
+        return
+    try:
+        conn.cursor().execute(
+            f"DELETE FROM JobOutbox WHERE OutboxID IN ({', '.join(['%s'] * len(queued))})", queued
+        )
+        conn.commit()
+    except Exception:
+        # The rows will be queued a second time; handlers are idempotent.
+        logger.exception("Could not clear dispatched jobs from JobOutbox")
+
+
+def drain_outbox(conn, grace=None):
+    """Queue up to OUTBOX_BATCH staged jobs older than `grace` seconds; returns how many were queued."""
+    grace = Config.JOBS_OUTBOX_GRACE if grace is None else grace
+    if conn.in_transaction:
+        conn.rollback()
+    conn.start_transaction(isolation_level='READ COMMITTED')
+    try:
+        cursor = conn.cursor()
+        # SKIP LOCKED lets every process reconcile without handing out the same row twice.
+        cursor.execute("""
+            SELECT OutboxID, Name, Payload FROM JobOutbox
+            WHERE CreatedAt < NOW(6) - INTERVAL %s SECOND
+            ORDER BY OutboxID
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (grace, OUTBOX_BATCH))
+        rows = cursor.fetchall()
+        for outbox_id, name, payload in rows:
+            logger.warning("Queueing job %s from outbox %s after a lost hand-off", name, outbox_id)
+            enqueue(name, **json.loads(payload))
+        if rows:
+            ids = [row[0] for row in rows]
+            cursor.execute(f"DELETE FROM JobOutbox WHERE OutboxID IN ({', '.join(['%s'] * len(ids))})", ids)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return len(rows)
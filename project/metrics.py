@@ -0,0 +1,243 @@
+import logging
+import re
+import threading
+import time
+from functools import lru_cache
+from flask import g, request
+from config import Config
+
+# Per-process metrics in Prometheus text format. Each worker process keeps its
+# own registry, so scrape every worker (or sum across them) when running more
+# than one.
+
+logger = logging.getLogger('worldhotels.sql')
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _labels(self.labels + ('le',), label_values + (bound,))
+                    lines.append(f'{self.name}_bucket{labels} {count}')
+                labels = _labels(self.labels + ('le',), label_values + ('+Inf',))
+                lines.append(f'{self.name}_bucket{labels} {series[-1]}')
+                labels = _labels(self.labels, label_values)
+                lines.append(f'{self.name}_sum{labels} {series[-2]:.6f}')
+                lines.append(f'{self.name}_count{labels} {series[-1]}')
+        return lines
+
+
+http_request_duration = Histogram(
+    'worldhotels_http_request_duration_seconds', 'Request latency by endpoint.',
+    ('endpoint', 'method', 'status')
+)
+sql_query_duration = Histogram(
+    'worldhotels_sql_query_duration_seconds', 'SQL statement execution time.', ('statement',)
+)
+sql_rows_fetched = Counter(
+    'worldhotels_sql_rows_fetched_total', 'Rows fetched per SQL statement.', ('statement',)
+)
+sql_slow_queries = Counter(
+    'worldhotels_sql_slow_queries_total', 'Statements slower than SLOW_QUERY_MS.', ('statement',)
+)
+db_acquire_duration = Histogram(
+    'worldhotels_db_connection_acquire_seconds', 'Time to check a connection out of the pool.'
+)
+db_read_routes = Counter(
+    'worldhotels_db_read_routes_total', 'Where read-only connections were sent, and why.', ('target', 'reason')
+)
+booking_transactions = Counter(
+    'worldhotels_booking_transactions_total', 'Booking/cancellation transactions by outcome.', ('operation', 'outcome')
+)
+booking_retries = Counter(
+    'worldhotels_booking_retries_total', 'Booking/cancellation transactions retried after a lock conflict.',
+    ('operation', 'reason')
+)
+login_throttled = Counter(
+    'worldhotels_login_throttled_total', 'Login/sign-up requests refused by rate limits or a busy hasher.', ('reason',)
+)
+jobs_processed = Counter(
+    'worldhotels_jobs_processed_total', 'Background job runs by outcome (succeeded, retried, dead).', ('job', 'outcome')
+)
+job_duration = Histogram(
+    'worldhotels_job_duration_seconds', 'Background job run time.', ('job',)
+)
+job_wait = Histogram(
+    'worldhotels_job_wait_seconds', 'Time from enqueue to the first run of a job.', ('job',),
+    buckets=LATENCY_BUCKETS + (30.0, 60.0, 300.0)
+)
+
+_REGISTRY = [
+    http_request_duration, sql_query_duration, sql_rows_fetched, sql_slow_queries, db_acquire_duration, db_read_routes,
+    booking_transactions, booking_retries, login_throttled, jobs_processed, job_duration, job_wait,
+]
+
+
+# ---------- SQL ----------
+_WHITESPACE = re.compile(r'\s+')
+_REPEATED_GROUPS = re.compile(r'(\([^()]*\))(?:, \1)+')
+_PLACEHOLDER_LISTS = re.compile(r'\(%s(?:, %s)+\)')
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """Collapse a statement to a stable label: one line, multi-row VALUES and IN lists folded."""
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    sql = _REPEATED_GROUPS.sub(r'\1, ...', sql)
+    sql = _PLACEHOLDER_LISTS.sub('(%s, ...)', sql)
+    return sql[:200]
+
+
+def observe_query(statement, elapsed):
+    sql_query_duration.observe(elapsed, statement)
+    if elapsed * 1000 >= Config.SLOW_QUERY_MS:
+        sql_slow_queries.inc(statement)
+        logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, statement)
+
+
+class InstrumentedCursor:
+    """Cursor proxy recording statement timings and rows fetched."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._statement = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+
+    def __iter__(self):
+        for row in self._cursor:
+            sql_rows_fetched.inc(self._statement)
+            yield row
+
+    def _timed(self, method, operation, args, kwargs):
+        self._statement = normalize_sql(operation)
+        start = time.perf_counter()
+        try:
+            return method(operation, *args, **kwargs)
+        finally:
+            observe_query(self._statement, time.perf_counter() - start)
+
+    def execute(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.execute, operation, args, kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.executemany, operation, args, kwargs)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            sql_rows_fetched.inc(self._statement)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        if rows:
+            sql_rows_fetched.inc(self._statement, amount=len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        if rows:
+            sql_rows_fetched.inc(self._statement, amount=len(rows))
+        return rows
+
+
+# ---------- HTTP ----------
+def _record_request(status):
+    start = g.pop('metrics_start', None)
+    if start is not None:
+        http_request_duration.observe(
+            time.perf_counter() - start, request.endpoint or 'unmatched', request.method, str(status)
+        )
+
+
+def init_app(app):
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_latency(response):
+        _record_request(response.status_code)
+        return response
+
+    @app.teardown_request
+    def record_failure(exc):
+        # Only reached with a pending timer when the view raised before a response existed.
+        _record_request(500)
+
+
+def render(extra=()):
+    """Prometheus text for every metric, plus (name, type, help, label, {label value: value}) extras."""
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    for name, metric_type, help_text, label_name, values in extra:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for label_value, value in sorted(values.items()):
+            labels = _labels((label_name,), (label_value,)) if label_name else ''
+            lines.append(f'{name}{labels} {value}')
+    return '\n'.join(lines) + '\n'
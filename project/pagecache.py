@@ -0,0 +1,58 @@
+import hashlib
+from flask import current_app, render_template, request, session
+from markupsafe import Markup
+from cache import make_cache
+from config import Config
+
+# Rendered-page and fragment caches. The public pages only differ by the
+# navigation shown for the visitor's role, so each is cached once per
+# (template, role). A page is never cached while it has flashed messages
+# waiting. ETags come from the rendered body, so every worker answers a
+# conditional GET the same way. There is no Last-Modified: every role's
+# variant would share it, and a client revalidating by date after logging
+# in or out would be told its old navigation is current.
+
+_pages = make_cache('pages', Config.PAGE_CACHE_SIZE, Config.PAGE_CACHE_TTL)
+_fragments = make_cache('fragments', Config.PAGE_CACHE_SIZE, Config.PAGE_CACHE_TTL)
+
+
+def _render_page(template_name):
+    body = render_template(template_name).encode('utf-8')
+    return body, hashlib.sha1(body).hexdigest()
+
+
+def cached_page(template_name):
+    """Render a context-free template through the page cache, answering 304 when the client is current."""
+    if not Config.PAGE_CACHE_ENABLED or '_flashes' in session:
+        return render_template(template_name)
+
+    body, etag = _pages.get_or_load(
+        (template_name, session.get('role')), lambda: _render_page(template_name)
+    )
+    response = current_app.response_class(body, mimetype='text/html')
+    response.set_etag(etag)
+    # The nav depends on the session, so only the browser may keep a copy, and it must revalidate.
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
+
+
+def cached_fragment(name, source, template_name, **context):
+    """Render a partial once per `source` object (e.g. the cached hotel list).
+
+    Reference data caches hand out the same object until they are invalidated
+    or expire, so a new object means the fragment must be rendered again.
+    """
+    entry = _fragments.get(name)
+    if entry is None or entry[0] is not source:
+        generation = _fragments.generation()
+        entry = (source, Markup(render_template(template_name, **context)))
+        _fragments.set(name, entry, generation)
+    return entry[1]
+
+
+def precompile_templates(app):
+    """Compile every template up front so the first request doesn't pay for it."""
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
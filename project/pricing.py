@@ -0,0 +1,122 @@
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal
+
+# Pure pricing engine. Nothing here touches the database: callers pass in the
+# (PeakRate, OffPeakRate) pair, or a dict of them keyed on (HotelID, RoomTypeID),
+# typically from refdata.get_rates(). price_stay() and price_many() use one
+# rate for the whole stay, chosen by the check-in month. Quotes shown to
+# guests come from ratecalendar, which prices every night on its own.
+
+PEAK_MONTHS = frozenset({4, 5, 6, 7, 8, 11, 12})
+CENT = Decimal("0.01")
+ROOM_MULTIPLIERS = {2: Decimal("1.2"), 3: Decimal("1.5")}
+TWIN_SURCHARGE = Decimal("0.1")
+NO_DISCOUNT = Decimal("0")
+
+Quote = namedtuple('Quote', ['total_price', 'discounted_price', 'error'])
+
+
+def parse_date(value):
+    if isinstance(value, str):
+        return datetime.strptime(value, "%Y-%m-%d")
+    return value
+
+
+def discount_rate(days_advance):
+    """Early-booking discount for a stay booked `days_advance` days ahead."""
+    if 80 <= days_advance <= 90:
+        return Decimal("0.3")
+    if 60 <= days_advance < 80:
+        return Decimal("0.2")
+    if 45 <= days_advance < 60:
+        return Decimal("0.1")
+    return NO_DISCOUNT
+
+
+def nightly_rate(room_type_id, is_peak, peak_rate, off_peak_rate):
+    """One night's room rate before the twin surcharge."""
+    rate = peak_rate if is_peak else off_peak_rate
+    multiplier = ROOM_MULTIPLIERS.get(room_type_id)
+    if multiplier is not None:
+        rate *= multiplier
+    return rate
+
+
+def twin_surcharge(room_type_id, num_guests, peak_rate):
+    """Per-night extra for two guests sharing a twin room."""
+    if room_type_id == 2 and num_guests == 2:
+        return peak_rate * TWIN_SURCHARGE
+    return NO_DISCOUNT
+
+
+def daily_rate(room_type_id, num_guests, is_peak, peak_rate, off_peak_rate):
+    return nightly_rate(room_type_id, is_peak, peak_rate, off_peak_rate) + twin_surcharge(
+        room_type_id, num_guests, peak_rate
+    )
+
+
+def parse_demand_steps(spec):
+    """'0.7:1.10,0.9:1.25' -> [(0.7, Decimal('1.10')), (0.9, Decimal('1.25'))], sorted by occupancy."""
+    steps = []
+    for part in filter(None, (p.strip() for p in spec.split(','))):
+        occupancy, factor = part.split(':')
+        steps.append((float(occupancy), Decimal(factor)))
+    return sorted(steps)
+
+
+def demand_factor(occupancy, steps):
+    """Multiplier for a night that is `occupancy` (0..1) full: the highest step reached, else 1."""
+    factor = Decimal(1)
+    for threshold, step_factor in steps:
+        if occupancy >= threshold:
+            factor = step_factor
+    return factor
+
+
+def price_stay(check_in, check_out, booking_date, room_type_id, num_guests, peak_rate, off_peak_rate):
+    """Return (total_price, discounted_price) for one stay, rounded to pence."""
+    nights = (check_out - check_in).days
+    if nights <= 0:
+        raise ValueError("Check-out date must be after check-in date")
+
+    rate = daily_rate(room_type_id, num_guests, check_in.month in PEAK_MONTHS, peak_rate, off_peak_rate)
+    base_price = rate * nights
+    final_price = base_price * (1 - discount_rate((check_in - booking_date).days))
+    return base_price.quantize(CENT), final_price.quantize(CENT)
+
+
+def price_many(stays, rates):
+    """Price many stays at once against pre-loaded rates.
+
+    `stays` yields (hotel_id, room_type_id, check_in, check_out, booking_date, num_guests)
+    and `rates` maps (hotel_id, room_type_id) to (peak_rate, off_peak_rate). Returns one
+    Quote per stay, in order. Daily rates and discount multipliers are computed once per
+    distinct tariff and lead time rather than once per stay.
+    """
+    results = []
+    daily_rates = {}
+    multipliers = {}
+    for hotel_id, room_type_id, check_in, check_out, booking_date, num_guests in stays:
+        nights = (check_out - check_in).days
+        if nights <= 0:
+            results.append(Quote(None, None, "Check-out date must be after check-in date"))
+            continue
+
+        rate_key = (hotel_id, room_type_id, room_type_id == 2 and num_guests == 2, check_in.month in PEAK_MONTHS)
+        rate = daily_rates.get(rate_key)
+        if rate is None:
+            tariff = rates.get((hotel_id, room_type_id))
+            if tariff is None:
+                results.append(Quote(None, None, "Rate not found for this hotel and room type"))
+                continue
+            rate = daily_rates[rate_key] = daily_rate(room_type_id, num_guests, rate_key[3], *tariff)
+
+        days_advance = (check_in - booking_date).days
+        multiplier = multipliers.get(days_advance)
+        if multiplier is None:
+            multiplier = multipliers[days_advance] = 1 - discount_rate(days_advance)
+
+        base_price = rate * nights
+        results.append(Quote(base_price.quantize(CENT), (base_price * multiplier).quantize(CENT), None))
+    return results
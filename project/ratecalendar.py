@@ -0,0 +1,285 @@
+import logging
+import threading
+from array import array
+from datetime import date, timedelta
+from decimal import Decimal
+from cache import make_cache
+from config import Config
+from db import get_connection
+from inventory import to_date
+from pricing import (
+    CENT, PEAK_MONTHS, Quote, demand_factor, discount_rate, nightly_rate, parse_demand_steps, twin_surcharge
+)
+from refdata import get_hotels, get_rates, get_room_counts, get_room_types, invalidate_rates
+
+# Precomputed nightly prices. For each hotel and calendar year there is one
+# array per room type, with one entry per night, holding that night's price
+# in pence. The price comes from the Rate row, the peak/off-peak month rules
+# and a demand factor based on the night's DailyRollup occupancy. A quote is
+# the sum of a slice (two for stays across New Year), minus the early-booking
+# discount.
+#
+# Calendars are built in bulk: every hotel for a year from one rates lookup
+# and one DailyRollup query. A background thread per process rebuilds every
+# hotel for this year and next every RATE_CALENDAR_REFRESH seconds, well
+# inside RATE_CALENDAR_TTL, so the entries searches read never expire under
+# them. The search path only reads calendars. A missing calendar wakes the
+# refresher, and that hotel is left out of the results until it is built.
+# Single quotes and bookings still build a missing hotel-year on demand.
+# invalidate() and recompute() only affect the process that runs them, like
+# refdata; other workers catch up at their next refresh.
+
+logger = logging.getLogger('worldhotels.ratecalendar')
+
+DEMAND_STEPS = parse_demand_steps(Config.RATE_DEMAND_STEPS)
+NOT_READY = "Prices for this hotel are still loading"
+
+_calendars = make_cache('rate_calendar', Config.RATE_CALENDAR_SIZE, Config.RATE_CALENDAR_TTL)
+
+
+class HotelYear:
+    __slots__ = ('hotel_id', 'year', 'nights', 'surcharges')
+
+    def __init__(self, hotel_id, year):
+        self.hotel_id = hotel_id
+        self.year = year
+        self.nights = {}      # RoomTypeID -> array('l') of pence, index 0 = 1 January
+        self.surcharges = {}  # RoomTypeID -> twin surcharge per night, in pence
+
+
+class CalendarNotReady(Exception):
+    """A calendar the caller may not build (the search path) is not cached yet."""
+
+
+def _pence(amount):
+    return int((amount * 100).to_integral_value())
+
+
+# ---------- Building ----------
+def _occupancy(cursor, hotel_ids, first, last):
+    """{(HotelID, RoomTypeID): [(day index, occupancy)]} from DailyRollup and the room counts."""
+    counts = get_room_counts(cursor)
+    cursor.execute(f"""
+        SELECT HotelID, RoomTypeID, Day, RoomNights
+        FROM DailyRollup
+        WHERE HotelID IN ({', '.join(['%s'] * len(hotel_ids))}) AND Day BETWEEN %s AND %s AND RoomNights > 0
+    """, (*hotel_ids, first, last))
+    occupancy = {}
+    for hotel_id, room_type_id, day, room_nights in cursor.fetchall():
+        rooms = counts.get((hotel_id, room_type_id))
+        if rooms:
+            occupancy.setdefault((hotel_id, room_type_id), []).append(((day - first).days, room_nights / rooms))
+    return occupancy
+
+
+def fill(year, rates, occupancy=None):
+    """Materialise hotel-years from rates {(HotelID, RoomTypeID): (peak, off_peak) or None} and occupancy.
+
+    Pure: build_many() supplies both from the database; benchmarks pass them in.
+    Returns {HotelID: HotelYear}.
+    """
+    occupancy = occupancy or {}
+    first = date(year, 1, 1)
+    peak_days = [(first + timedelta(days=i)).month in PEAK_MONTHS
+                 for i in range((date(year + 1, 1, 1) - first).days)]
+    calendars = {}
+    for (hotel_id, room_type_id), tariff in rates.items():
+        calendar = calendars.get(hotel_id)
+        if calendar is None:
+            calendar = calendars[hotel_id] = HotelYear(hotel_id, year)
+        if tariff is None:
+            continue
+        peak_rate, off_peak_rate = tariff
+        base = {is_peak: nightly_rate(room_type_id, is_peak, peak_rate, off_peak_rate) for is_peak in (True, False)}
+        base_pence = {is_peak: _pence(rate.quantize(CENT)) for is_peak, rate in base.items()}
+        nights = array('l', [base_pence[is_peak] for is_peak in peak_days])
+        for i, load in occupancy.get((hotel_id, room_type_id), ()):
+            nights[i] = _pence((base[peak_days[i]] * demand_factor(load, DEMAND_STEPS)).quantize(CENT))
+        calendar.nights[room_type_id] = nights
+        calendar.surcharges[room_type_id] = _pence(twin_surcharge(room_type_id, 2, peak_rate).quantize(CENT))
+    return calendars
+
+
+def build_many(hotel_ids, year, cursor):
+    """Build one year for many hotels: one rates lookup and one DailyRollup query. Returns {HotelID: HotelYear}."""
+    hotel_ids = list(hotel_ids)
+    if not hotel_ids:
+        return {}
+    room_type_ids = [room_type_id for room_type_id, _, _ in get_room_types(cursor)]
+    rates = get_rates([(hotel_id, room_type_id) for hotel_id in hotel_ids for room_type_id in room_type_ids], cursor)
+    occupancy = _occupancy(cursor, hotel_ids, date(year, 1, 1), date(year, 12, 31)) if DEMAND_STEPS else {}
+    calendars = fill(year, rates, occupancy)
+    for hotel_id in hotel_ids:
+        calendars.setdefault(hotel_id, HotelYear(hotel_id, year))
+    return calendars
+
+
+def build(hotel_id, year, cursor):
+    return build_many([hotel_id], year, cursor)[hotel_id]
+
+
+def store(calendars, generation=None):
+    """Cache built HotelYears, growing the cache so a full refresh never evicts its own entries."""
+    calendars = list(calendars)
+    _calendars.resize(max(Config.RATE_CALENDAR_SIZE, len(calendars) * 3, _calendars.maxsize))
+    for calendar in calendars:
+        _calendars.set((calendar.hotel_id, calendar.year), calendar, generation)
+
+
+def _load(hotel_id, year, cursor=None):
+    if cursor is not None:
+        return build(hotel_id, year, cursor)
+    with get_connection() as conn:
+        return build(hotel_id, year, conn.cursor())
+
+
+def get_calendar(hotel_id, year, cursor=None, load=True):
+    if not load:
+        calendar = _calendars.get((hotel_id, year))
+        if calendar is None:
+            wake_refresher()
+            raise CalendarNotReady(hotel_id, year)
+        return calendar
+    return _calendars.get_or_load((hotel_id, year), lambda: _load(hotel_id, year, cursor))
+
+
+def stay_pence(hotel_id, room_type_id, check_in, check_out, num_guests, cursor=None, load=True):
+    """Undiscounted price of the nights [check_in, check_out) in pence, or None without a rate.
+
+    With load=False a calendar that isn't cached raises CalendarNotReady instead of being built.
+    """
+    total, night = 0, check_in
+    while night < check_out:
+        calendar = get_calendar(hotel_id, night.year, cursor, load)
+        nights = calendar.nights.get(room_type_id)
+        if nights is None:
+            return None
+        end = min(check_out, date(night.year + 1, 1, 1))
+        start = night.timetuple().tm_yday - 1
+        count = (end - night).days
+        total += sum(nights[start:start + count])
+        if num_guests == 2:
+            total += calendar.surcharges[room_type_id] * count
+        night = end
+    return total
+
+
+def quote_many(stays, cursor=None, load=True):
+    """Price stays from the calendar: same input and Quote output as pricing.price_many, minus the rates.
+
+    With load=False (the search path) nothing is built: a stay whose calendar
+    isn't cached yet gets a Quote with the NOT_READY error.
+    """
+    results = []
+    multipliers = {}
+    for hotel_id, room_type_id, check_in, check_out, booking_date, num_guests in stays:
+        check_in, check_out, booking_date = to_date(check_in), to_date(check_out), to_date(booking_date)
+        if check_out <= check_in:
+            results.append(Quote(None, None, "Check-out date must be after check-in date"))
+            continue
+        if (check_out - check_in).days > Config.MAX_STAY_NIGHTS:
+            results.append(Quote(None, None, f"Stays are limited to {Config.MAX_STAY_NIGHTS} nights"))
+            continue
+        try:
+            pence = stay_pence(hotel_id, room_type_id, check_in, check_out, num_guests, cursor, load)
+        except CalendarNotReady:
+            results.append(Quote(None, None, NOT_READY))
+            continue
+        if pence is None:
+            results.append(Quote(None, None, "Rate not found for this hotel and room type"))
+            continue
+
+        days_advance = (check_in - booking_date).days
+        multiplier = multipliers.get(days_advance)
+        if multiplier is None:
+            multiplier = multipliers[days_advance] = 1 - discount_rate(days_advance)
+
+        base_price = Decimal(pence) / 100
+        results.append(Quote(base_price.quantize(CENT), (base_price * multiplier).quantize(CENT), None))
+    return results
+
+
+def quote(hotel_id, room_type_id, check_in, check_out, booking_date, num_guests, cursor=None):
+    """(total_price, discounted_price) for one stay; raises ValueError when it can't be priced."""
+    result = quote_many([(hotel_id, room_type_id, check_in, check_out, booking_date, num_guests)], cursor)[0]
+    if result.error:
+        raise ValueError(result.error)
+    return result.total_price, result.discounted_price
+
+
+# ---------- Invalidation and refresh ----------
+def invalidate(hotel_id=None, refresh=True):
+    if hotel_id is None:
+        _calendars.invalidate()
+    else:
+        _calendars.invalidate_where(lambda key: key[0] == hotel_id)
+    if refresh:
+        wake_refresher()
+
+
+def recompute(hotel_ids, years, cursor):
+    """Rebuild the given hotel-years now (after a rate change); returns how many were built.
+
+    The hotels' cached rates are dropped too, so the rebuild reads the rates
+    as they are in the database now.
+    """
+    for hotel_id in hotel_ids:
+        invalidate_rates(hotel_id)
+        invalidate(hotel_id, refresh=False)
+    built = 0
+    for year in years:
+        generation = _calendars.generation()
+        calendars = build_many(hotel_ids, year, cursor).values()
+        store(calendars, generation)
+        built += len(calendars)
+    return built
+
+
+def default_years(today=None):
+    """This year and the next, which is as far ahead as anyone books."""
+    year = (today or date.today()).year
+    return [year, year + 1]
+
+
+def refresh_all(cursor, years=None):
+    """Rebuild every hotel for `years` (default: this year and next) in bulk; returns how many were built."""
+    hotel_ids = [hotel_id for hotel_id, _, _ in get_hotels(cursor)]
+    built = 0
+    for year in years or default_years():
+        generation = _calendars.generation()
+        calendars = build_many(hotel_ids, year, cursor).values()
+        store(calendars, generation)
+        built += len(calendars)
+    return built
+
+
+_refresher = None
+_refresher_lock = threading.Lock()
+_refresh_wakeup = threading.Event()
+
+
+def _refresh_loop():
+    while True:
+        _refresh_wakeup.clear()
+        try:
+            with get_connection() as conn:
+                refresh_all(conn.cursor())
+        except Exception:
+            logger.exception("Rate calendar refresh failed")
+        _refresh_wakeup.wait(Config.RATE_CALENDAR_REFRESH)
+
+
+def start_refresher():
+    """Start this process's calendar refresh thread once; it builds everything straight away."""
+    global _refresher
+    if _refresher is None:
+        with _refresher_lock:
+            if _refresher is None:
+                _refresher = threading.Thread(target=_refresh_loop, name='rate-calendar', daemon=True)
+                _refresher.start()
+
+
+def wake_refresher():
+    """Ask for a refresh now (a calendar was missing or invalidated), starting the thread if needed."""
+    _refresh_wakeup.set()
+    start_refresher()
@@ -0,0 +1,33 @@
+import threading
+import time
+from collections import OrderedDict
+
+# In-memory token buckets, per process. Each worker enforces its own limit, so
+# the effective limit across a host is roughly WEB_WORKERS times the setting.
+
+
+class TokenBucket:
+    """`rate` tokens per minute per key, up to `burst` saved; least recently used keys are dropped past max_keys."""
+
+    def __init__(self, rate, burst, max_keys):
+        self.rate = rate / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Spend one token for key; returns 0 if allowed, else seconds until a token is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / self.rate if self.rate else float('inf')
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
@@ -0,0 +1,127 @@
+from decimal import Decimal
+from cache import make_cache
+from config import Config
+from db import get_connection
+
+# Hotel, Rate and RoomType only change through the admin blueprint, so they
+# are served from in-process caches. Admin writes invalidate explicitly; the
+# TTL bounds staleness between worker processes.
+
+_hotels = make_cache('hotels', 1, Config.REFDATA_CACHE_TTL)
+_rates = make_cache('rates', Config.REFDATA_CACHE_SIZE, Config.REFDATA_CACHE_TTL)
+_room_types = make_cache('room_types', 1, Config.REFDATA_CACHE_TTL)
+_room_counts = make_cache('room_counts', 1, Config.REFDATA_CACHE_TTL)
+
+
+def _fetchall(cursor, sql, params=()):
+    if cursor is not None:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+# ---------- Hotels ----------
+def _load_hotels(cursor):
+    rows = _fetchall(cursor, "SELECT HotelID, HotelName, Capacity FROM Hotel ORDER BY HotelID")
+    return rows, {name: hotel_id for hotel_id, name, _ in rows}
+
+
+def get_hotels(cursor=None):
+    """All hotels as (HotelID, HotelName, Capacity) tuples."""
+    return _hotels.get_or_load('all', lambda: _load_hotels(cursor))[0]
+
+
+def get_hotel_id(hotel_name, cursor=None):
+    return _hotels.get_or_load('all', lambda: _load_hotels(cursor))[1].get(hotel_name)
+
+
+def invalidate_hotels():
+    _hotels.invalidate()
+
+
+# ---------- Rates ----------
+def get_rates(keys, cursor=None):
+    """Map each (HotelID, RoomTypeID) to (PeakRate, OffPeakRate) or None.
+
+    Cache misses are loaded together in a single query.
+    """
+    found, missing = {}, []
+    for key in set(keys):
+        rate = _rates.get(key, False)
+        if rate is False:
+            missing.append(key)
+        else:
+            found[key] = rate
+
+    if missing:
+        generation = _rates.generation()
+        placeholders = ", ".join(["(%s, %s)"] * len(missing))
+        params = [value for key in missing for value in key]
+        rows = _fetchall(cursor, f"""
+            SELECT HotelID, RoomTypeID, PeakRate, OffPeakRate
+            FROM Rate
+            WHERE (HotelID, RoomTypeID) IN ({placeholders})
+        """, params)
+        loaded = {(h, t): (Decimal(peak), Decimal(off)) for h, t, peak, off in rows}
+        for key in missing:
+            # Cache absent rates too, so unknown combinations don't hit the DB each time.
+            found[key] = loaded.get(key)
+            _rates.set(key, found[key], generation)
+    return found
+
+
+def get_rate(hotel_id, room_type_id, cursor=None):
+    key = (hotel_id, room_type_id)
+    return get_rates([key], cursor)[key]
+
+
+def invalidate_rates(hotel_id=None):
+    if hotel_id is None:
+        _rates.invalidate()
+    else:
+        _rates.invalidate_where(lambda key: key[0] == hotel_id)
+
+
+# ---------- Room types ----------
+def get_room_types(cursor=None):
+    """All room types as (RoomTypeID, TypeName, MaxGuests) tuples."""
+    return _room_types.get_or_load('all', lambda: _fetchall(
+        cursor, "SELECT RoomTypeID, TypeName, MaxGuests FROM RoomType ORDER BY RoomTypeID"
+    ))
+
+
+def invalidate_room_types():
+    _room_types.invalidate()
+
+
+# ---------- Room counts ----------
+def get_room_counts(cursor=None):
+    """Number of rooms per (HotelID, RoomTypeID)."""
+    return _room_counts.get_or_load('all', lambda: {
+        (hotel_id, room_type_id): count
+        for hotel_id, room_type_id, count in _fetchall(
+            cursor, "SELECT HotelID, RoomTypeID, COUNT(*) FROM Room GROUP BY HotelID, RoomTypeID"
+        )
+    })
+
+
+def invalidate_room_counts():
+    _room_counts.invalidate()
+
+
+# ---------- Warm-up ----------
+def warm_up():
+    """Load hotels, room types, room counts and rates into the caches on one connection."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        get_hotels(cursor)
+        get_room_types(cursor)
+        get_room_counts(cursor)
+        generation = _rates.generation()
+        rows = _fetchall(cursor, "SELECT HotelID, RoomTypeID, PeakRate, OffPeakRate FROM Rate LIMIT %s",
+                         (Config.REFDATA_CACHE_SIZE,))
+        for hotel_id, room_type_id, peak, off in rows:
+            _rates.set((hotel_id, room_type_id), (Decimal(peak), Decimal(off)), generation)
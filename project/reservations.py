@@ -0,0 +1,376 @@
+import logging
+import random
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal
+from mysql.connector.errors import DatabaseError, IntegrityError
+from config import Config
+from inventory import allocate_room, release_booking, release_bookings, to_date
+from rollups import refresh as refresh_rollups
+import jobs
+import metrics
+
+logger = logging.getLogger('worldhotels.reservations')
+
+# Booking and cancellation writes each run in one explicit READ COMMITTED
+# transaction. Work that needs no locks (pricing, the idempotency lookup) is
+# done before it starts. The transaction only covers what the user needs to
+# see: the booking and its room, or the cancelled status and freed nights.
+# The receipt, the Cancellations row and the DailyRollup refresh are staged
+# in JobOutbox within that transaction and queued as background jobs once it
+# commits (see jobs.stage / jobs.dispatch).
+
+RETRYABLE_ERRORS = {1213: 'deadlock', 1205: 'lock_wait_timeout'}
+DUPLICATE_ENTRY = 1062
+
+Booked = namedtuple('Booked', [
+    'booking_id', 'room_number', 'check_in', 'check_out', 'guests', 'total_price', 'currency', 'payment_date'
+])
+Cancelled = namedtuple('Cancelled', ['booking_id', 'hotel_id', 'room_type_id', 'check_in', 'check_out', 'fee'])
+
+# Bookings in these states can no longer be cancelled.
+CLOSED_STATUSES = ('Cancelled', 'Completed')
+
+
+def run_transaction(conn, operation, work, attempts=None):
+    """Run work(cursor) in a fresh transaction and commit, retrying deadlocks and lock wait timeouts."""
+    attempts = attempts or Config.BOOKING_TX_ATTEMPTS
+    for attempt in range(1, attempts + 1):
+        if conn.in_transaction:
+            # End the implicit snapshot left by earlier reads on this connection.
+            conn.rollback()
+        conn.start_transaction(isolation_level='READ COMMITTED')
+        try:
+            result = work(conn.cursor())
+            conn.commit()
+        except DatabaseError as e:
+            conn.rollback()
+            reason = RETRYABLE_ERRORS.get(e.errno)
+            if reason is None or attempt == attempts:
+                metrics.booking_transactions.inc(operation, 'rolled_back')
+                raise
+            metrics.booking_retries.inc(operation, reason)
+            time.sleep(random.uniform(0, Config.BOOKING_RETRY_BACKOFF * 2 ** (attempt - 1)))
+            continue
+        except Exception:
+            conn.rollback()
+            metrics.booking_transactions.inc(operation, 'rolled_back')
+            raise
+        metrics.booking_transactions.inc(operation, 'committed')
+        return result
+
+
+# ---------- Booking ----------
+def find_submission(cursor, user_id, idempotency_key):
+    """The booking already created for this form submission, or None."""
+    cursor.execute("""
+        SELECT b.BookingID, r.RoomNumber, b.CheckIn, b.CheckOut, b.NoOfGuests, b.TotalPrice, b.BookingCurrency,
+               COALESCE(rc.PaymentDate, b.BookingDate)
+        FROM Booking b
+        LEFT JOIN Room r ON r.RoomID = b.RoomID
+        LEFT JOIN Receipt rc ON rc.BookingID = b.BookingID
+        WHERE b.UserID = %s AND b.IdempotencyKey = %s
+        LIMIT 1
+    """, (user_id, idempotency_key))
+    row = cursor.fetchone()
+    return Booked(*row) if row else None
+
+
+def book(conn, user_id, hotel_id, room_type_id, check_in, check_out, booking_date, guests, total_price,
+         currency, idempotency_key=None):
+    """Create a confirmed booking with its room and nights, then queue its receipt and rollups; returns Booked.
+
+    A repeated idempotency key returns the booking created by the first
+    submission. Raises RoomUnavailable when no room is free.
+    """
+    if idempotency_key:
+        existing = find_submission(conn.cursor(), user_id, idempotency_key)
+        if existing:
+            metrics.booking_transactions.inc('book', 'replayed')
+            return existing
+
+    def work(cursor):
+        cursor.execute("""
+            INSERT INTO Booking (UserID, HotelID, RoomTypeID, RoomID, CheckIn, CheckOut, BookingDate, NoOfGuests,
+                                 TotalPrice, BookingCurrency, Status, IdempotencyKey)
+            VALUES (%s, %s, %s, NULL, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, (user_id, hotel_id, room_type_id, check_in, check_out, booking_date, guests, total_price, currency,
+              'Confirmed', idempotency_key))
+        booking_id = cursor.lastrowid
+
+        room_id, room_number = allocate_room(cursor, hotel_id, room_type_id, check_in, check_out, booking_id)
+        cursor.execute("UPDATE Booking SET RoomID = %s WHERE BookingID = %s", (room_id, booking_id))
+        payment_date = datetime.now().date()
+        staged = [
+            jobs.stage(cursor, 'write_receipt', booking_id=booking_id, total_price=str(total_price),
+                       payment_date=payment_date.isoformat()),
+            jobs.stage(cursor, 'refresh_rollups', hotel_id=hotel_id, room_type_id=room_type_id,
+                       date_from=to_date(check_in).isoformat(),
+                       date_to=(to_date(check_out) - timedelta(days=1)).isoformat()),
+        ]
+        return Booked(booking_id, room_number, check_in, check_out, guests, total_price, currency,
+                      payment_date), staged
+
+    try:
+        booked, staged = run_transaction(conn, 'book', work)
+    except IntegrityError as e:
+        # A concurrent double submit: the unique (UserID, IdempotencyKey) key made
+        # this one wait for the first, which has now committed.
+        if e.errno != DUPLICATE_ENTRY or not idempotency_key:
+            raise
+        existing = find_submission(conn.cursor(), user_id, idempotency_key)
+        if existing is None:
+            raise
+        metrics.booking_transactions.inc('book', 'replayed')
+        return existing
+
+    jobs.dispatch(conn, staged)
+    return booked
+
+
+# ---------- Cancellation ----------
+def fee_share(days_before):
+    """Share of the booking price charged for cancelling days_before the check-in."""
+    if days_before > 60:
+        return 0.0
+    elif 30 <= days_before <= 60:
+        return 0.5
+    return 1.0
+
+
+def cancellation_fees(rows, cancellation_date):
+    """{BookingID: fee} for (BookingID, CheckIn, TotalPrice) rows cancelled on cancellation_date.
+
+    The share is worked out once per distinct check-in date, so a page or a
+    hotel's worth of bookings costs one dict lookup and a multiply per row.
+    """
+    cancellation_date = to_date(cancellation_date)
+    shares = {}
+    fees = {}
+    for booking_id, check_in, total_price in rows:
+        share = shares.get(check_in)
+        if share is None:
+            share = shares[check_in] = fee_share((to_date(check_in) - cancellation_date).days)
+        fees[booking_id] = round(float(total_price or 0) * share, 2)
+    return fees
+
+
+def fetch_cancellation_fees(cursor, user_id, cancellation_date, booking_ids=None):
+    """Fees for the user's open bookings (or just booking_ids among them), from one query."""
+    query = """
+        SELECT BookingID, CheckIn, TotalPrice FROM Booking
+        WHERE UserID = %s AND Status NOT IN (%s, %s)
+    """
+    params = [user_id, *CLOSED_STATUSES]
+    if booking_ids:
+        query += f" AND BookingID IN ({', '.join(['%s'] * len(booking_ids))})"
+        params.extend(booking_ids)
+    cursor.execute(query, params)
+    return cancellation_fees(cursor.fetchall(), cancellation_date)
+
+
+def cancel(conn, booking_id, user_id, today):
+    """Cancel the user's booking; returns the fee, 0.0 if already cancelled, or None if not theirs."""
+    def work(cursor):
+        # Locking the booking row serialises concurrent cancels of the same booking.
+        cursor.execute("""
+            SELECT HotelID, RoomTypeID, CheckIn, CheckOut, TotalPrice, Status
+            FROM Booking WHERE BookingID = %s AND UserID = %s
+            FOR UPDATE
+        """, (booking_id, user_id))
+        row = cursor.fetchone()
+        if not row:
+            return None
+
+        hotel_id, room_type_id, check_in, check_out, total_price, status = row
+        if status == 'Cancelled':
+            return 0.0, []
+
+        # The same (rounded) fee My Bookings previewed.
+        fee = cancellation_fees([(booking_id, check_in, total_price)], today)[booking_id]
+        cursor.execute("UPDATE Booking SET Status = 'Cancelled' WHERE BookingID = %s", (booking_id,))
+        release_booking(cursor, booking_id)
+        return fee, [jobs.stage(
+            cursor, 'record_cancellation', booking_id=int(booking_id), hotel_id=hotel_id, room_type_id=room_type_id,
+            check_in=to_date(check_in).isoformat(), check_out=to_date(check_out).isoformat(),
+            cancellation_date=to_date(today).isoformat(), fee=fee
+        )]
+
+    result = run_transaction(conn, 'cancel', work)
+    if result is None:
+        return None
+    fee, staged = result
+    jobs.dispatch(conn, staged)
+    return fee
+
+
+def cancel_scope(hotel_id=None, date_from=None, date_to=None):
+    """(clauses, params) for a bulk cancellation of one hotel's bookings and/or a check-in date range.
+
+    Raises ValueError unless a hotel or both ends of the range are given, so
+    a bulk cancellation can never sweep up every open booking.
+    """
+    if not hotel_id and not (date_from and date_to):
+        raise ValueError("Choose a hotel or a check-in date range (from and to) to cancel in bulk.")
+    clauses, params = [], []
+    if hotel_id:
+        clauses.append("b.HotelID = %s")
+        params.append(int(hotel_id))
+    if date_from:
+        clauses.append("b.CheckIn >= %s")
+        params.append(to_date(date_from))
+    if date_to:
+        clauses.append("b.CheckIn <= %s")
+        params.append(to_date(date_to))
+    return clauses, params
+
+
+def _cancellable(clauses, today):
+    # Open bookings whose stay has not finished; past stays are left for archiving.
+    return list(clauses) + ["b.Status NOT IN (%s, %s)", "b.CheckOut > %s"], [*CLOSED_STATUSES, to_date(today)]
+
+
+def count_cancellable(cursor, today, hotel_id=None, date_from=None, date_to=None):
+    """How many bookings cancel_bookings would cancel for this scope today."""
+    clauses, params = cancel_scope(hotel_id, date_from, date_to)
+    clauses, extra = _cancellable(clauses, today)
+    cursor.execute(f"SELECT COUNT(*) FROM Booking b WHERE {' AND '.join(clauses)}", params + extra)
+    return cursor.fetchone()[0]
+
+
+def cancel_batch(cursor, clauses, params, today, batch_size, after=0, waive_fees=False):
+    """Cancel up to batch_size open, unfinished bookings matching clauses with BookingID > after.
+
+    Returns ([Cancelled], staged bookkeeping jobs) for jobs.dispatch once the transaction commits.
+    """
+    clauses, extra = _cancellable(clauses, today)
+    cursor.execute(f"""
+        SELECT b.BookingID, b.HotelID, b.RoomTypeID, b.CheckIn, b.CheckOut, b.TotalPrice
+        FROM Booking b
+        WHERE {' AND '.join(clauses + ["b.BookingID > %s"])}
+        ORDER BY b.BookingID
+        LIMIT %s
+        FOR UPDATE
+    """, list(params) + extra + [after, batch_size])
+    rows = cursor.fetchall()
+    if not rows:
+        return [], []
+
+    ids = [row[0] for row in rows]
+    fees = {} if waive_fees else cancellation_fees([(row[0], row[3], row[5]) for row in rows], today)
+    cursor.execute(f"UPDATE Booking SET Status = 'Cancelled' WHERE BookingID IN ({', '.join(['%s'] * len(ids))})", ids)
+    release_bookings(cursor, ids)
+    batch = [Cancelled(booking_id, hotel_id, room_type_id, check_in, check_out, fees.get(booking_id, 0.0))
+             for booking_id, hotel_id, room_type_id, check_in, check_out, _ in rows]
+    staged = jobs.stage(cursor, 'record_cancellations', cancellation_date=to_date(today).isoformat(), bookings=[{
+        'booking_id': cancelled.booking_id, 'hotel_id': cancelled.hotel_id,
+        'room_type_id': cancelled.room_type_id, 'check_in': to_date(cancelled.check_in).isoformat(),
+        'check_out': to_date(cancelled.check_out).isoformat(), 'fee': cancelled.fee,
+    } for cancelled in batch])
+    return batch, [staged]
+
+
+def cancel_bookings(conn, today, hotel_id=None, date_from=None, date_to=None, batch_size=None, pause=None,
+                    waive_fees=False):
+    """Cancel every open booking in the scope (e.g. a hotel closure) that has not checked out, in batches.
+
+    Each batch locks, cancels and frees the rooms of up to batch_size
+    bookings in one short transaction, which also stages one bookkeeping job
+    for the batch. Safe to re-run: bookings already cancelled are skipped.
+    Returns (bookings cancelled, total fees).
+    """
+    clauses, params = cancel_scope(hotel_id, date_from, date_to)
+    today = to_date(today)
+    batch_size = batch_size or Config.BULK_CANCEL_BATCH_SIZE
+    pause = Config.BULK_CANCEL_PAUSE if pause is None else pause
+    after, count, total_fees = 0, 0, 0.0
+    while True:
+        batch, staged = run_transaction(conn, 'bulk_cancel', lambda cursor: cancel_batch(
+            cursor, clauses, params, today, batch_size, after, waive_fees
+        ))
+        if not batch:
+            break
+        jobs.dispatch(conn, staged)
+        count += len(batch)
+        total_fees += sum(cancelled.fee for cancelled in batch)
+        after = batch[-1].booking_id
+        if len(batch) < batch_size:
+            break
+        time.sleep(pause)
+    return count, round(total_fees, 2)
+
+
+# ---------- Background jobs ----------
+@jobs.handler('write_receipt')
+def write_receipt(conn, booking_id, total_price, payment_date):
+    def work(cursor):
+        cursor.execute("""
+            INSERT INTO Receipt (BookingID, TotalPrice, PaymentDate)
+            SELECT %s, %s, %s FROM DUAL
+            WHERE NOT EXISTS (SELECT 1 FROM Receipt WHERE BookingID = %s)
+        """, (booking_id, Decimal(total_price), payment_date, booking_id))
+
+    run_transaction(conn, 'receipt', work)
+
+
+@jobs.handler('refresh_rollups')
+def refresh_rollups_job(conn, hotel_id, room_type_id, date_from, date_to):
+    run_transaction(conn, 'rollups', lambda cursor: refresh_rollups(cursor, hotel_id, room_type_id, date_from, date_to))
+
+
+@jobs.handler('bulk_cancel')
+def bulk_cancel(conn, cancellation_date, hotel_id=None, date_from=None, date_to=None, waive_fees=False):
+    count, fees = cancel_bookings(conn, cancellation_date, hotel_id, date_from, date_to, waive_fees=waive_fees)
+    logger.info("Bulk cancellation (hotel %s, check-in %s to %s): %d bookings, fees %.2f",
+                hotel_id, date_from, date_to, count, fees)
+
+
+@jobs.handler('record_cancellation')
+def record_cancellation(conn, booking_id, hotel_id, room_type_id, check_in, check_out, cancellation_date, fee):
+    def work(cursor):
+        # The booking row lock makes the existence check safe against a second run of this job.
+        cursor.execute("SELECT BookingID FROM Booking WHERE BookingID = %s FOR UPDATE", (booking_id,))
+        cursor.fetchall()
+        cursor.execute("SELECT 1 FROM Cancellations WHERE BookingID = %s LIMIT 1", (booking_id,))
+        if not cursor.fetchall():
+            cursor.execute("""
+                INSERT INTO Cancellations (CancellationDate, CancellationFee, BookingID)
+                VALUES (%s, %s, %s)
+            """, (cancellation_date, fee, booking_id))
+        last_night = to_date(check_out) - timedelta(days=1)
+        refresh_rollups(cursor, hotel_id, room_type_id, check_in, last_night)
+        refresh_rollups(cursor, hotel_id, room_type_id, cancellation_date, cancellation_date)
+
+    run_transaction(conn, 'cancellation_bookkeeping', work)
+
+
+@jobs.handler('record_cancellations')
+def record_cancellations(conn, cancellation_date, bookings):
+    """Batch form of record_cancellation: one transaction and one rollup refresh per room type."""
+    def work(cursor):
+        ids = [booking['booking_id'] for booking in bookings]
+        placeholders = ", ".join(["%s"] * len(ids))
+        cursor.execute(f"SELECT BookingID FROM Booking WHERE BookingID IN ({placeholders}) FOR UPDATE", ids)
+        cursor.fetchall()
+        cursor.execute(f"SELECT BookingID FROM Cancellations WHERE BookingID IN ({placeholders})", ids)
+        recorded = {row[0] for row in cursor.fetchall()}
+        missing = [(cancellation_date, booking['fee'], booking['booking_id'])
+                   for booking in bookings if booking['booking_id'] not in recorded]
+        if missing:
+            cursor.executemany("""
+                INSERT INTO Cancellations (CancellationDate, CancellationFee, BookingID)
+                VALUES (%s, %s, %s)
+            """, missing)
+
+        spans = {}
+        for booking in bookings:
+            key = (booking['hotel_id'], booking['room_type_id'])
+            first, last = to_date(booking['check_in']), to_date(booking['check_out']) - timedelta(days=1)
+            low, high = spans.get(key, (first, last))
+            spans[key] = (min(low, first), max(high, last))
+        for (hotel_id, room_type_id), (first, last) in spans.items():
+            refresh_rollups(cursor, hotel_id, room_type_id, first, last)
+            refresh_rollups(cursor, hotel_id, room_type_id, cancellation_date, cancellation_date)
+
+    run_transaction(conn, 'cancellation_bookkeeping', work)
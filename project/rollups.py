@@ -0,0 +1,163 @@
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from inventory import stay_nights, to_date
+
+# DailyRollup holds one row per (HotelID, RoomTypeID, Day) with the booked room
+# nights, the revenue earned on those nights and the cancellations made that
+# day. Admin edits adjust it incrementally inside their own transaction.
+# Bookings and cancellations queue a job that calls refresh() for the days
+# they touched. rebuild() recomputes everything from scratch.
+
+CENT = Decimal("0.01")
+
+
+def nightly_revenue(check_in, check_out, total_price):
+    """Split a stay's price across its nights; the last night absorbs rounding."""
+    nights = stay_nights(check_in, check_out)
+    total = Decimal(total_price or 0)
+    share = (total / len(nights)).quantize(CENT, rounding=ROUND_HALF_UP)
+    last = total - share * (len(nights) - 1)
+    return [(night, share if i < len(nights) - 1 else last) for i, night in enumerate(nights)]
+
+
+def apply_booking(cursor, hotel_id, room_type_id, check_in, check_out, total_price, sign=1):
+    """Add (sign=1) or remove (sign=-1) a booking's nights and revenue."""
+    rows = nightly_revenue(check_in, check_out, total_price)
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows))
+    params = []
+    for night, revenue in rows:
+        params.extend((hotel_id, room_type_id, night, sign, revenue * sign))
+    cursor.execute(f"""
+        INSERT INTO DailyRollup (HotelID, RoomTypeID, Day, RoomNights, Revenue)
+        VALUES {placeholders} AS new
+        ON DUPLICATE KEY UPDATE
+            RoomNights = DailyRollup.RoomNights + new.RoomNights,
+            Revenue = DailyRollup.Revenue + new.Revenue
+    """, params)
+
+
+# Recompute statements shared by rebuild() and refresh(). They set absolute
+# values, so running one again for the same range changes nothing. Both read
+# the live and the archive tier (see archive.py). A live booking's days can
+# also hold archived bookings' nights and cancellations, for example a long
+# stay, or a past stay cancelled before it was archived. Each tier is
+# filtered and grouped on its own, because its nights and cancellations only
+# reference bookings in that tier (foreign keys on the live side, archived
+# together on the other). The per-tier counts are then summed.
+TIERS = (
+    {'nights': 'RoomNight', 'bookings': 'Booking', 'cancellations': 'Cancellations'},
+    {'nights': 'RoomNightArchive', 'bookings': 'BookingArchive', 'cancellations': 'CancellationsArchive'},
+)
+_NIGHTS_TIER = """
+    SELECT b.HotelID, b.RoomTypeID, n.NightDate AS Day, COUNT(*) AS NightCount,
+           SUM(CASE
+               WHEN n.NightDate = b.CheckOut - INTERVAL 1 DAY
+               THEN IFNULL(b.TotalPrice, 0) - ROUND(IFNULL(b.TotalPrice, 0) / DATEDIFF(b.CheckOut, b.CheckIn), 2) * (DATEDIFF(b.CheckOut, b.CheckIn) - 1)
+               ELSE ROUND(IFNULL(b.TotalPrice, 0) / DATEDIFF(b.CheckOut, b.CheckIn), 2)
+           END) AS NightRevenue
+    FROM {nights} n
+    JOIN {bookings} b ON b.BookingID = n.BookingID
+    WHERE n.NightDate BETWEEN %s AND %s {scope}
+    GROUP BY b.HotelID, b.RoomTypeID, n.NightDate
+"""
+_NIGHTS_SQL = """
+    INSERT INTO DailyRollup (HotelID, RoomTypeID, Day, RoomNights, Revenue)
+    SELECT * FROM (
+        SELECT HotelID, RoomTypeID, Day, SUM(NightCount) AS Nights, SUM(NightRevenue) AS NightsRevenue
+        FROM ({tiers}) AS tiers
+        GROUP BY HotelID, RoomTypeID, Day
+    ) AS nights
+    ON DUPLICATE KEY UPDATE RoomNights = Nights, Revenue = NightsRevenue
+"""
+
+_CANCELLATIONS_TIER = """
+    SELECT b.HotelID, b.RoomTypeID, DATE(c.CancellationDate) AS Day, COUNT(*) AS CancelCount,
+           SUM(CAST(c.CancellationFee AS DECIMAL(12, 2))) AS CancelFees
+    FROM {cancellations} c
+    JOIN {bookings} b ON b.BookingID = c.BookingID
+    WHERE DATE(c.CancellationDate) BETWEEN %s AND %s {scope}
+    GROUP BY b.HotelID, b.RoomTypeID, DATE(c.CancellationDate)
+"""
+_CANCELLATIONS_SQL = """
+    INSERT INTO DailyRollup (HotelID, RoomTypeID, Day, Cancellations, CancellationFees)
+    SELECT * FROM (
+        SELECT HotelID, RoomTypeID, Day, SUM(CancelCount) AS Cancelled, SUM(CancelFees) AS Fees
+        FROM ({tiers}) AS tiers
+        GROUP BY HotelID, RoomTypeID, Day
+    ) AS cancelled
+    ON DUPLICATE KEY UPDATE Cancellations = Cancelled, CancellationFees = Fees
+"""
+
+
+def _recompute(cursor, params, scope=''):
+    """Upsert nights/revenue and cancellations for the rows matching params, from both tiers."""
+    for statement, tier_sql in ((_NIGHTS_SQL, _NIGHTS_TIER), (_CANCELLATIONS_SQL, _CANCELLATIONS_TIER)):
+        tiers = " UNION ALL ".join(tier_sql.format(scope=scope, **tier) for tier in TIERS)
+        cursor.execute(statement.format(tiers=tiers), list(params) * len(TIERS))
+
+
+def rebuild(conn, date_from=None, date_to=None):
+    """Recompute DailyRollup from live and archived bookings, nights and cancellations in one transaction."""
+    date_from = to_date(date_from) if date_from else date(1970, 1, 1)
+    date_to = to_date(date_to) if date_to else date(9999, 12, 31)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM DailyRollup WHERE Day BETWEEN %s AND %s", (date_from, date_to))
+    _recompute(cursor, (date_from, date_to))
+    conn.commit()
+
+
+def refresh(cursor, hotel_id, room_type_id, date_from, date_to):
+    """Recompute one hotel/room type's rows for [date_from, date_to] (both tiers) inside the caller's transaction."""
+    date_from, date_to = to_date(date_from), to_date(date_to)
+    scope = "AND b.HotelID = %s AND b.RoomTypeID = %s"
+    params = (date_from, date_to, hotel_id, room_type_id)
+    # Zero the range first so days that lost their last booking or cancellation drop back to 0.
+    cursor.execute("""
+        UPDATE DailyRollup SET RoomNights = 0, Revenue = 0, Cancellations = 0, CancellationFees = 0
+        WHERE HotelID = %s AND RoomTypeID = %s AND Day BETWEEN %s AND %s
+    """, (hotel_id, room_type_id, date_from, date_to))
+    _recompute(cursor, params, scope)
+
+
+def hotel_summary(cursor, date_from, date_to, room_counts):
+    """Per-hotel occupancy and revenue for [date_from, date_to], read from DailyRollup only."""
+    date_from, date_to = to_date(date_from), to_date(date_to)
+    days = (date_to - date_from).days + 1
+    cursor.execute("""
+        SELECT HotelID, RoomTypeID, SUM(RoomNights), SUM(Revenue), SUM(Cancellations), SUM(CancellationFees)
+        FROM DailyRollup
+        WHERE Day BETWEEN %s AND %s
+        GROUP BY HotelID, RoomTypeID
+    """, (date_from, date_to))
+
+    summary = {}
+    for hotel_id, room_type_id, room_nights, revenue, cancellations, fees in cursor.fetchall():
+        capacity = room_counts.get((hotel_id, room_type_id), 0) * days
+        hotel = summary.setdefault(hotel_id, {
+            'hotel_id': hotel_id, 'room_nights': 0, 'capacity': 0, 'revenue': Decimal(0),
+            'cancellations': 0, 'cancellation_fees': Decimal(0), 'room_types': {},
+        })
+        hotel['room_types'][room_type_id] = {
+            'room_nights': int(room_nights),
+            'occupancy': round(int(room_nights) / capacity, 4) if capacity else None,
+            'revenue': float(revenue),
+        }
+        hotel['room_nights'] += int(room_nights)
+        hotel['revenue'] += revenue
+        hotel['cancellations'] += int(cancellations)
+        hotel['cancellation_fees'] += fees
+
+    for (hotel_id, _), rooms in room_counts.items():
+        if hotel_id in summary:
+            summary[hotel_id]['capacity'] += rooms * days
+
+    for hotel in summary.values():
+        hotel['occupancy'] = round(hotel['room_nights'] / hotel['capacity'], 4) if hotel['capacity'] else None
+        hotel['revenue'] = float(hotel['revenue'])
+        hotel['cancellation_fees'] = float(hotel['cancellation_fees'])
+    return summary
+
+
+def default_window(today=None):
+    today = today or date.today()
+    return today - timedelta(days=29), today
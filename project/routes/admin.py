@@ -1,6 +1,23 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from db import get_connection
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, Response, jsonify
+from db import get_connection, get_unpooled_connection
+from inventory import release_booking, reserve_nights
+from reservations import cancel_scope, count_cancellable
+from rollups import apply_booking, hotel_summary, default_window
+from refdata import get_hotels, get_room_counts, invalidate_hotels, invalidate_rates
+from routes.booking import invalidate_booking_counts, read_connection, note_write
+from routes.auth import get_user_role, invalidate_user_role
+from bulk_import import run_import, detect_format, open_text, DATASETS
+from archive import fetch_bookings
+import ratecalendar
+import jobs
 from functools import wraps
+from datetime import MAXYEAR, MINYEAR, datetime
+import csv
+import io
+import json
+import threading
+import zlib
+from config import Config
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -8,7 +25,15 @@ admin_bp = Blueprint('admin', __name__)
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session or session.get('role') != 'admin':
+        # The role comes from the (briefly cached) User row, not the session, so
+        # change_role and delete_user take effect without waiting for a logout.
+        user_id = session.get('user_id')
+        role = get_user_role(user_id) if user_id is not None else None
+        if user_id is not None and role is None:
+            session.clear()
+        elif role is not None and session.get('role') != role:
+            session['role'] = role
+        if role != 'admin':
             flash("Admin access required.")
             return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
@@ -19,11 +44,36 @@ def admin_required(f):
 @admin_bp.route('/admin_dashboard')
 @admin_required
 def admin_dashboard():
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT HotelID, HotelName, Capacity FROM Hotel")
-        hotels = cursor.fetchall()
-    return render_template('AdminDashboard.html', hotels=hotels)
+    date_from, date_to, summary = dashboard_summary()
+    return render_template('AdminDashboard.html', hotels=get_hotels(), summary=summary,
+                           date_from=date_from, date_to=date_to)
+
+
+@admin_bp.route('/admin_dashboard/stats.json')
+@admin_required
+def admin_dashboard_stats():
+    date_from, date_to, summary = dashboard_summary()
+    names = {hotel_id: name for hotel_id, name, _ in get_hotels()}
+    hotels = [dict(stats, hotel_name=names.get(hotel_id)) for hotel_id, stats in sorted(summary.items())]
+    return jsonify({'date_from': date_from.isoformat(), 'date_to': date_to.isoformat(), 'hotels': hotels})
+
+
+def dashboard_summary():
+    """Occupancy/revenue per hotel for the requested window, from DailyRollup only."""
+    date_from, date_to = default_window()
+    try:
+        if request.args.get('date_from'):
+            date_from = datetime.strptime(request.args['date_from'], "%Y-%m-%d").date()
+        if request.args.get('date_to'):
+            date_to = datetime.strptime(request.args['date_to'], "%Y-%m-%d").date()
+    except ValueError:
+        date_from, date_to = default_window()
+    if date_to < date_from:
+        date_from, date_to = date_to, date_from
+
+    with read_connection() as conn:
+        summary = hotel_summary(conn.cursor(), date_from, date_to, get_room_counts())
+    return date_from, date_to, summary
 
 
 # -------------------- HOTEL ROUTES --------------------
@@ -31,11 +81,7 @@ def admin_dashboard():
 @admin_bp.route('/manage_hotels')
 @admin_required
 def manage_hotels():
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT HotelID, HotelName, Capacity FROM Hotel")
-        hotels = cursor.fetchall()
-    return render_template('modify_Hotels.html', hotels=hotels)
+    return render_template('modify_Hotels.html', hotels=get_hotels())
 
 
 @admin_bp.route('/add_hotel', methods=['POST'])
@@ -47,6 +93,7 @@ def add_hotel():
         cursor = conn.cursor()
         cursor.execute("INSERT INTO Hotel (HotelName, Capacity) VALUES (%s, %s)", (name, capacity))
         conn.commit()
+    invalidate_hotels()
     flash("Hotel added successfully.")
     return redirect(url_for('admin.manage_hotels'))
 
@@ -61,6 +108,9 @@ def delete_hotel(hotel_id):
         try:
             cursor.execute("DELETE FROM Hotel WHERE HotelID = %s", (hotel_id,))
             conn.commit()
+            invalidate_hotels()
+            invalidate_rates(hotel_id)
+            ratecalendar.invalidate(hotel_id)
             flash("Hotel deleted successfully.", "success")
         except IntegrityError:
             flash("Cannot delete hotel: it is linked to rooms or bookings.", "error")
@@ -69,6 +119,59 @@ def delete_hotel(hotel_id):
     return redirect(url_for('admin.manage_hotels'))
 
 
+@admin_bp.route('/import', methods=['POST'])
+@admin_required
+def bulk_import():
+    """Bulk-load hotels, rooms or rates from an uploaded CSV/JSON file or the raw request body."""
+    dataset = request.values.get('dataset', '')
+    upload = request.files.get('file')
+    if upload is not None:
+        stream, fmt = upload.stream, detect_format(upload.filename, upload.mimetype)
+    else:
+        stream, fmt = request.stream, detect_format('', request.mimetype)
+    fmt = request.args.get('format', fmt)
+    wants_json = upload is None or request.accept_mimetypes.best == 'application/json'
+
+    if dataset not in DATASETS or fmt not in ('csv', 'json'):
+        message = f"dataset must be one of {', '.join(DATASETS)} and format csv or json"
+        if wants_json:
+            return jsonify({'error': message}), 400
+        flash(message, "error")
+        return redirect(url_for('admin.manage_hotels'))
+
+    with get_connection() as conn:
+        report = run_import(conn, dataset, open_text(stream), fmt)
+
+    if wants_json:
+        return jsonify(report.as_dict())
+    flash(f"Imported {dataset}: {report.inserted} added, {report.updated} updated, "
+          f"{report.error_count} rejected of {report.rows} rows.",
+          "error" if report.error_count else "success")
+    for line, message in report.errors[:10]:
+        flash(f"Line {line}: {message}", "error")
+    return redirect(url_for('admin.manage_hotels'))
+
+
+@admin_bp.route('/rate_calendar/recompute', methods=['POST'])
+@admin_required
+def recompute_rate_calendar():
+    """Rebuild nightly prices for one hotel (or all) after rates change, instead of waiting for the TTL."""
+    try:
+        hotel_id = int(request.form['hotel_id']) if request.form.get('hotel_id') else None
+        year = int(request.form['year']) if request.form.get('year') else None
+    except ValueError:
+        flash("Hotel and year must be numbers.", "error")
+        return redirect(url_for('admin.manage_hotels'))
+    if year is not None and not MINYEAR <= year < MAXYEAR:
+        flash(f"Year must be between {MINYEAR} and {MAXYEAR - 1}.", "error")
+        return redirect(url_for('admin.manage_hotels'))
+
+    hotel_ids = [hotel_id] if hotel_id is not None else [h[0] for h in get_hotels()]
+    years = [year] if year is not None else ratecalendar.default_years()
+    with get_connection() as conn:
+        built = ratecalendar.recompute(hotel_ids, years, conn.cursor())
+    flash(f"Rate calendar recomputed for {built} hotel-years.", "success")
+    return redirect(url_for('admin.manage_hotels'))
 
 
 # -------------------- USER ROUTES --------------------
@@ -76,7 +179,7 @@ def delete_hotel(hotel_id):
 @admin_bp.route('/manage_users')
 @admin_required
 def manage_users():
-    with get_connection() as conn:
+    with read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT UserID, Username, Email, Role FROM User")
         users = cursor.fetchall()
@@ -93,6 +196,8 @@ def delete_user(user_id):
         try:
             cursor.execute("DELETE FROM User WHERE UserID = %s", (user_id,))
             conn.commit()
+            invalidate_user_role(user_id)
+            note_write()
             flash("User deleted successfully.", "success")
         except IntegrityError as e:
             flash("Cannot delete user: they are linked to existing bookings or other data.", "error")
@@ -110,40 +215,155 @@ def change_role(user_id):
         cursor = conn.cursor()
         cursor.execute("UPDATE User SET Role = %s WHERE UserID = %s", (new_role, user_id))
         conn.commit()
+    invalidate_user_role(user_id)
+    note_write()
     flash("User role updated successfully.")
     return redirect(url_for('admin.manage_users'))
 
 
 # -------------------- BOOKING ROUTES --------------------
 
+BOOKING_STATUSES = ['Confirmed', 'Pending', 'Cancelled', 'Completed']
+
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def booking_filters(args):
+    """Turn the admin booking search args into (filters, joins, where clauses, params)."""
+    filters, joins, clauses, params = {}, [], [], []
+
+    query = args.get('query', '').strip()
+    if query:
+        filters['query'] = query
+        if query.isdigit():
+            clauses.append("b.BookingID = %s")
+            params.append(int(query))
+        else:
+            # Prefix match so the Username index can be used.
+            joins.append("JOIN User u ON b.UserID = u.UserID")
+            clauses.append("u.Username LIKE %s")
+            params.append(escape_like(query) + '%')
+
+    status = args.get('status', '').strip()
+    if status in BOOKING_STATUSES:
+        filters['status'] = status
+        clauses.append("b.Status = %s")
+        params.append(status)
+
+    hotel_id = args.get('hotel_id', type=int)
+    if hotel_id:
+        filters['hotel_id'] = hotel_id
+        clauses.append("b.HotelID = %s")
+        params.append(hotel_id)
+
+    for name, clause in (('date_from', "b.CheckIn >= %s"), ('date_to', "b.CheckIn <= %s")):
+        value = args.get(name, '').strip()
+        try:
+            params.append(datetime.strptime(value, "%Y-%m-%d").date())
+        except ValueError:
+            continue
+        filters[name] = value
+        clauses.append(clause)
+
+    return filters, joins, clauses, params
+
 @admin_bp.route('/manage_bookings')
 @admin_required
 def manage_bookings():
-    query = request.args.get('query', '').strip()
-    with get_connection() as conn:
-        cursor = conn.cursor()
-
-        if query:
-            if query.isdigit():
-                cursor.execute("""
-                    SELECT b.BookingID, b.UserID, b.HotelID, b.RoomID, b.CheckIn, b.CheckOut, b.NoOfGuests, b.Status
-                    FROM Booking b
-                    WHERE b.BookingID = %s
-                """, (int(query),))
-            else:
-                cursor.execute("""
-                    SELECT b.BookingID, b.UserID, b.HotelID, b.RoomID, b.CheckIn, b.CheckOut, b.NoOfGuests, b.Status
-                    FROM Booking b
-                    JOIN User u ON b.UserID = u.UserID
-                    WHERE u.Username LIKE %s
-                """, (f"%{query}%",))
-        else:
-            cursor.execute("""
-                SELECT BookingID, UserID, HotelID, RoomID, CheckIn, CheckOut, NoOfGuests, Status
-                FROM Booking
-            """)
-        bookings = cursor.fetchall()
-    return render_template("modify_Bookings.html", bookings=bookings)
+    filters, joins, clauses, params = booking_filters(request.args)
+    per_page = min(max(request.args.get('per_page', Config.ADMIN_PAGE_SIZE, type=int), 1), Config.ADMIN_PAGE_SIZE_MAX)
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
+
+    # Keyset pagination on BookingID keeps every page a bounded index scan;
+    # archived bookings are only read once a page reaches back to them.
+    if before is not None:
+        clauses.append("b.BookingID > %s")
+        params.append(before)
+        order = "ASC"
+    else:
+        if after is not None:
+            clauses.append("b.BookingID < %s")
+            params.append(after)
+        order = "DESC"
+
+    with read_connection() as conn:
+        rows = fetch_bookings(
+            conn.cursor(),
+            "b.BookingID, b.UserID, b.HotelID, b.RoomID, b.CheckIn, b.CheckOut, b.NoOfGuests, b.Status",
+            joins, clauses, params, order, per_page + 1
+        )
+
+    has_more = len(rows) > per_page
+    bookings = rows[:per_page]
+    if before is not None:
+        bookings.reverse()
+        has_newer, has_older = has_more, True
+    else:
+        has_newer, has_older = after is not None, has_more
+
+    return render_template(
+        "modify_Bookings.html",
+        bookings=bookings,
+        filters=filters,
+        per_page=per_page,
+        statuses=BOOKING_STATUSES,
+        hotels=get_hotels(),
+        newer_cursor=bookings[0][0] if bookings and has_newer else None,
+        older_cursor=bookings[-1][0] if bookings and has_older else None
+    )
+
+
+@admin_bp.route('/bulk_cancel_bookings', methods=['GET', 'POST'])
+@admin_required
+def bulk_cancel_bookings():
+    """Cancel the open bookings of a hotel and/or check-in range (e.g. a hotel closure) as a background job.
+
+    GET shows how many bookings the scope matches; POST queues the job.
+    Only the hotel and the check-in dates of the search apply, and stays
+    that have already checked out are never touched.
+    """
+    source = request.form if request.method == 'POST' else request.args
+    filters = booking_filters(source)[0]
+    scope = {name: filters[name] for name in ('hotel_id', 'date_from', 'date_to') if name in filters}
+    today = datetime.now().date()
+    try:
+        cancel_scope(**scope)
+    except ValueError as e:
+        flash(str(e))
+        return redirect(url_for('admin.manage_bookings', **filters))
+
+    if request.method == 'POST':
+        waive_fees = request.form.get('waive_fees') == '1'
+        jobs.enqueue('bulk_cancel', cancellation_date=today.isoformat(), waive_fees=waive_fees, **scope)
+        note_write()
+        flash("Bulk cancellation started. Bookings are cancelled in batches in the background; "
+              "refresh this page to follow it.")
+        return redirect(url_for('admin.manage_bookings', **scope))
+
+    with read_connection() as conn:
+        count = count_cancellable(conn.cursor(), today, **scope)
+    hotel_names = {hotel[0]: hotel[1] for hotel in get_hotels()}
+    return render_template(
+        "bulk_cancel.html",
+        scope=scope,
+        count=count,
+        hotel_name=hotel_names.get(scope.get('hotel_id')),
+        back=url_for('admin.manage_bookings', **filters)
+    )
+
+
+# Only live bookings can be changed; archived ones are read-only history.
+BOOKING_NOT_FOUND = "Booking not found. Archived bookings cannot be changed."
+
+
+def fetch_rollup_fields(cursor, booking_id):
+    """(HotelID, RoomTypeID, CheckIn, CheckOut, TotalPrice) of a booking, for rollup adjustments."""
+    cursor.execute("""
+        SELECT HotelID, RoomTypeID, CheckIn, CheckOut, TotalPrice
+        FROM Booking WHERE BookingID = %s
+    """, (booking_id,))
+    return cursor.fetchone()
 
 
 @admin_bp.route('/delete_booking/<int:booking_id>')
@@ -151,9 +371,17 @@ def manage_bookings():
 def delete_booking(booking_id):
     with get_connection() as conn:
         cursor = conn.cursor()
+        booking = fetch_rollup_fields(cursor, booking_id)
+        if booking is None:
+            flash(BOOKING_NOT_FOUND)
+            return redirect(url_for('admin.manage_bookings'))
         try:
+            if release_booking(cursor, booking_id):
+                apply_booking(cursor, *booking, sign=-1)
             cursor.execute("DELETE FROM Booking WHERE BookingID = %s", (booking_id,))
             conn.commit()
+            invalidate_booking_counts()
+            note_write()
             flash("Booking deleted.")
         except Exception:
             flash("Cannot delete booking: related cancellation exists.")
@@ -173,12 +401,30 @@ def edit_booking(booking_id):
             guests = request.form['noOfGuests']
             status = request.form['status']
 
+            old = fetch_rollup_fields(cursor, booking_id)
+            if old is None:
+                flash(BOOKING_NOT_FOUND)
+                return redirect(url_for('admin.manage_bookings'))
             cursor.execute("""
                 UPDATE Booking
                 SET RoomID = %s, CheckIn = %s, CheckOut = %s, NoOfGuests = %s, Status = %s
                 WHERE BookingID = %s
             """, (room_id, check_in, check_out, guests, status, booking_id))
+
+            if release_booking(cursor, booking_id):
+                apply_booking(cursor, *old, sign=-1)
+            if status != 'Cancelled':
+                try:
+                    reserve_nights(cursor, room_id, booking_id, check_in, check_out)
+                except (IntegrityError, ValueError):
+                    conn.rollback()
+                    flash("Room is not free for those dates.")
+                    return redirect(url_for('admin.edit_booking', booking_id=booking_id))
+                hotel_id, room_type_id, _, _, total_price = old
+                apply_booking(cursor, hotel_id, room_type_id, check_in, check_out, total_price)
+
             conn.commit()
+            note_write()
             flash("Booking updated.")
             return redirect(url_for('admin.manage_bookings'))
 
@@ -189,4 +435,131 @@ def edit_booking(booking_id):
         """, (booking_id,))
         booking = cursor.fetchone()
 
+    if booking is None:
+        flash(BOOKING_NOT_FOUND)
+        return redirect(url_for('admin.manage_bookings'))
     return render_template("edit_booking.html", booking_id=booking_id, booking=booking)
+
+
+# -------------------- EXPORTS --------------------
+
+EXPORTS = {
+    'bookings': {
+        'columns': ['BookingID', 'UserID', 'HotelID', 'RoomTypeID', 'RoomID', 'CheckIn', 'CheckOut',
+                    'BookingDate', 'NoOfGuests', 'Status', 'TotalPrice', 'BookingCurrency'],
+        'table': 'Booking',
+        'archive': 'BookingArchive',
+        'key': 'BookingID',
+        'date_column': 'BookingDate',
+    },
+    'receipts': {
+        'columns': ['ReceiptID', 'BookingID', 'TotalPrice', 'PaymentDate'],
+        'table': 'Receipt',
+        'archive': 'ReceiptArchive',
+        'key': 'ReceiptID',
+        'date_column': 'PaymentDate',
+    },
+    'cancellations': {
+        'columns': ['CancellationID', 'BookingID', 'CancellationDate', 'CancellationFee'],
+        'table': 'Cancellations',
+        'archive': 'CancellationsArchive',
+        'key': 'CancellationID',
+        'date_column': 'DATE(CancellationDate)',
+    },
+}
+
+_export_slots = threading.BoundedSemaphore(Config.EXPORT_MAX_CONCURRENT)
+
+def _encode_csv(columns):
+    def header():
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(columns)
+        return buffer.getvalue()
+
+    def chunk(rows, first):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
+
+    return header(), chunk, ""
+
+def _encode_json(columns):
+    def chunk(rows, first):
+        body = ",\n".join(json.dumps(dict(zip(columns, row)), default=str) for row in rows)
+        return body if first else ",\n" + body
+
+    return "[\n", chunk, "\n]\n"
+
+def stream_export(queries, columns, fmt, compress):
+    """Yield the export in chunks from an unbuffered cursor so memory stays flat.
+
+    `queries` are (sql, params) pairs streamed one after another into the same file.
+    """
+    header, encode, footer = (_encode_json if fmt == 'json' else _encode_csv)(columns)
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def emit(text):
+        data = text.encode('utf-8')
+        return compressor.compress(data) if compressor else data
+
+    conn = get_unpooled_connection()
+    try:
+        cursor = conn.cursor()
+        yield emit(header)
+        first = True
+        for sql, params in queries:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(Config.EXPORT_CHUNK_SIZE)
+                if not rows:
+                    break
+                yield emit(encode(rows, first))
+                first = False
+        yield emit(footer)
+        if compressor:
+            yield compressor.flush()
+    finally:
+        conn.close()
+
+@admin_bp.route('/export/<dataset>')
+@admin_required
+def export_data(dataset):
+    spec = EXPORTS.get(dataset)
+    if not spec:
+        return "Unknown export", 404
+    fmt = 'json' if request.args.get('format') == 'json' else 'csv'
+    compress = request.args.get('gzip') in ('1', 'true', 'on')
+
+    clauses, params = [], []
+    for name, op in (('date_from', '>='), ('date_to', '<=')):
+        value = request.args.get(name, '').strip()
+        if value:
+            try:
+                params.append(datetime.strptime(value, "%Y-%m-%d").date().isoformat())
+            except ValueError:
+                return f"Invalid {name}, expected YYYY-MM-DD", 400
+            clauses.append(f"{spec['date_column']} {op} %s")
+
+    # Archived history first, then the live table: each in key order, without
+    # a UNION that would have MySQL sort the whole export before sending a row.
+    # The trailing Archived column tells the two tiers apart.
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    select = ', '.join(spec['columns'])
+    queries = [
+        (f"SELECT {select}, {archived} FROM {table} {where} ORDER BY {spec['key']}", params)
+        for table, archived in ((spec['archive'], 1), (spec['table'], 0))
+    ]
+    columns = spec['columns'] + ['Archived']
+
+    if not _export_slots.acquire(blocking=False):
+        return "Too many exports running, please retry shortly.", 429
+
+    filename = f"{dataset}.{fmt}" + (".gz" if compress else "")
+    mimetype = 'application/gzip' if compress else ('application/json' if fmt == 'json' else 'text/csv')
+    response = Response(stream_export(queries, columns, fmt, compress), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Accel-Buffering': 'no',
+    })
+    # Released when the response is closed, whether or not the stream ran to completion.
+    response.call_on_close(_export_slots.release)
+    return response
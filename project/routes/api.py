@@ -0,0 +1,252 @@
+import base64
+import hashlib
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+from flask import Blueprint, current_app, request, session, jsonify
+from config import Config
+from archive import fetch_bookings
+from routes.booking import read_connection
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Versioned JSON API. Lists use cursor pagination (?cursor=...&limit=...),
+# and every endpoint takes ?fields=a,b to return only those fields. ETags
+# hash each returned row's key and UpdatedAt (maintained by MySQL through ON
+# UPDATE), so a poll with a matching If-None-Match is answered with a 304
+# after one narrow, LIMITed index read and no JSON encoding.
+
+Resource = namedtuple('Resource', ['table', 'key', 'fields', 'filters'])
+
+RESOURCES = {
+    'hotels': Resource('Hotel', 'HotelID', {
+        'id': 'HotelID', 'name': 'HotelName', 'capacity': 'Capacity', 'updated_at': 'UpdatedAt',
+    }, {}),
+    'rooms': Resource('Room', 'RoomID', {
+        'id': 'RoomID', 'hotel_id': 'HotelID', 'room_type_id': 'RoomTypeID', 'room_number': 'RoomNumber',
+        'wifi': 'Wifi', 'minibar': 'MiniBar', 'tv': 'TV', 'breakfast': 'Breakfast', 'available': 'IsAvailable',
+        'updated_at': 'UpdatedAt',
+    }, {'hotel_id': 'HotelID', 'room_type_id': 'RoomTypeID'}),
+    'rates': Resource('Rate', 'RateID', {
+        'id': 'RateID', 'hotel_id': 'HotelID', 'room_type_id': 'RoomTypeID', 'peak_rate': 'PeakRate',
+        'off_peak_rate': 'OffPeakRate', 'updated_at': 'UpdatedAt',
+    }, {'hotel_id': 'HotelID', 'room_type_id': 'RoomTypeID'}),
+    'bookings': Resource('Booking', 'BookingID', {
+        'id': 'BookingID', 'hotel_id': 'HotelID', 'room_type_id': 'RoomTypeID', 'room_id': 'RoomID',
+        'check_in': 'CheckIn', 'check_out': 'CheckOut', 'booking_date': 'BookingDate', 'guests': 'NoOfGuests',
+        'total_price': 'TotalPrice', 'currency': 'BookingCurrency', 'status': 'Status', 'updated_at': 'UpdatedAt',
+    }, {'hotel_id': 'HotelID', 'status': 'Status'}),
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@api_bp.errorhandler(ApiError)
+def handle_api_error(e):
+    return jsonify({"error": e.message}), e.status
+
+
+# -------------------- REQUEST PARSING --------------------
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(str(key).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        return int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise ApiError("Invalid cursor")
+
+
+def selected_fields(resource):
+    """Requested API field names (all by default); the key and UpdatedAt are always read for the ETag."""
+    requested = request.args.get('fields')
+    if not requested:
+        return list(resource.fields)
+    names = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = [name for name in names if name not in resource.fields]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(resource.fields)}")
+    return names
+
+
+def select_list(resource, names):
+    columns = [resource.key, 'UpdatedAt'] + [resource.fields[name] for name in names]
+    return ", ".join(f"b.{column}" for column in columns)
+
+
+def list_filters(resource):
+    clauses, params = [], []
+    for name, column in resource.filters.items():
+        value = request.args.get(name)
+        if value is not None:
+            clauses.append(f"b.{column} = %s")
+            params.append(value)
+    return clauses, params
+
+
+def page_limit():
+    limit = request.args.get('limit', Config.API_PAGE_SIZE, type=int)
+    return min(max(limit, 1), Config.API_PAGE_SIZE_MAX)
+
+
+# -------------------- RESPONSES --------------------
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode()
+    return value
+
+
+def to_dict(names, row):
+    # row = (key, UpdatedAt, *selected columns)
+    return {name: _json_value(value) for name, value in zip(names, row[2:])}
+
+
+def versioned_response(rows, build_body, private=False):
+    """JSON response with an ETag from the rows' (key, UpdatedAt); 304 when the client's copy matches."""
+    version = hashlib.sha1(request.full_path.encode())
+    for row in rows:
+        version.update(f"{row[0]}:{row[1]};".encode())
+    etag = version.hexdigest()
+
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build_body())
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    if private:
+        response.cache_control.private = True
+        response.vary.add('Cookie')
+    return response
+
+
+def list_response(resource, names, rows, limit, private=False):
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1][0]) if rows and has_more else None
+    return versioned_response(rows, lambda: {
+        "data": [to_dict(names, row) for row in rows],
+        "next_cursor": next_cursor,
+    }, private)
+
+
+# -------------------- REFERENCE DATA --------------------
+def list_resource(name):
+    resource = RESOURCES[name]
+    names = selected_fields(resource)
+    clauses, params = list_filters(resource)
+    if request.args.get('cursor'):
+        clauses.append(f"b.{resource.key} > %s")
+        params.append(decode_cursor(request.args['cursor']))
+    limit = page_limit()
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT {select_list(resource, names)}
+            FROM {resource.table} b
+            {where}
+            ORDER BY b.{resource.key}
+            LIMIT %s
+        """, params + [limit + 1])
+        rows = cursor.fetchall()
+    return list_response(resource, names, rows, limit)
+
+
+def get_resource(name, key):
+    resource = RESOURCES[name]
+    names = selected_fields(resource)
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {select_list(resource, names)} FROM {resource.table} b WHERE b.{resource.key} = %s",
+                       (key,))
+        row = cursor.fetchone()
+    if row is None:
+        raise ApiError(f"{name[:-1].capitalize()} {key} not found", 404)
+    return versioned_response([row], lambda: to_dict(names, row))
+
+
+@api_bp.route('/hotels')
+def list_hotels():
+    return list_resource('hotels')
+
+
+@api_bp.route('/hotels/<int:hotel_id>')
+def get_hotel(hotel_id):
+    return get_resource('hotels', hotel_id)
+
+
+@api_bp.route('/rooms')
+def list_rooms():
+    return list_resource('rooms')
+
+
+@api_bp.route('/rooms/<int:room_id>')
+def get_room(room_id):
+    return get_resource('rooms', room_id)
+
+
+@api_bp.route('/rates')
+def list_rates():
+    return list_resource('rates')
+
+
+@api_bp.route('/rates/<int:rate_id>')
+def get_rate(rate_id):
+    return get_resource('rates', rate_id)
+
+
+# -------------------- BOOKINGS --------------------
+def current_user_id():
+    user_id = session.get('user_id')
+    if user_id is None:
+        raise ApiError("Login required", 401)
+    return user_id
+
+
+@api_bp.route('/bookings')
+def list_bookings():
+    """The signed-in user's bookings, newest first, live and archived."""
+    user_id = current_user_id()
+    resource = RESOURCES['bookings']
+    names = selected_fields(resource)
+    clauses, params = list_filters(resource)
+    clauses.insert(0, "b.UserID = %s")
+    params.insert(0, user_id)
+    if request.args.get('cursor'):
+        clauses.append("b.BookingID < %s")
+        params.append(decode_cursor(request.args['cursor']))
+    limit = page_limit()
+    with read_connection() as conn:
+        rows = fetch_bookings(conn.cursor(), select_list(resource, names), [], clauses, params, 'DESC', limit + 1)
+    return list_response(resource, names, rows, limit, private=True)
+
+
+@api_bp.route('/bookings/<int:booking_id>')
+def get_booking(booking_id):
+    user_id = current_user_id()
+    resource = RESOURCES['bookings']
+    names = selected_fields(resource)
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        for table in ('Booking', 'BookingArchive'):
+            cursor.execute(f"""
+                SELECT {select_list(resource, names)} FROM {table} b
+                WHERE b.BookingID = %s AND b.UserID = %s
+            """, (booking_id, user_id))
+            row = cursor.fetchone()
+            if row is not None:
+                break
+    if row is None:
+        raise ApiError(f"Booking {booking_id} not found", 404)
+    return versioned_response([row], lambda: to_dict(names, row), private=True)
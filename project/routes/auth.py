@@ -1,9 +1,56 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from werkzeug.security import generate_password_hash, check_password_hash
+import math
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, make_response
+from mysql.connector.errors import IntegrityError
 from db import get_connection
+from config import Config
+from cache import make_cache
+from sessions import rotate_session
+from passwords import hash_password, verify_password, needs_rehash, HashingBusy
+from ratelimit import TokenBucket
+import metrics
 
 auth_bp = Blueprint('auth', __name__)
 
+_user_roles = make_cache('user_roles', Config.ROLE_CACHE_SIZE, Config.ROLE_CACHE_TTL)
+_ip_attempts = TokenBucket(Config.LOGIN_RATE_PER_IP, Config.LOGIN_BURST_PER_IP, Config.RATE_LIMIT_MAX_KEYS)
+_user_attempts = TokenBucket(Config.LOGIN_RATE_PER_USER, Config.LOGIN_BURST_PER_USER, Config.RATE_LIMIT_MAX_KEYS)
+
+
+# -------------------- ROLE LOOKUP --------------------
+def get_user_role(user_id):
+    """Current role of the user, or None if they no longer exist."""
+    def load():
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT Role FROM User WHERE UserID = %s", (user_id,))
+            row = cursor.fetchone()
+        return row[0] if row else None
+    return _user_roles.get_or_load(user_id, load)
+
+
+def invalidate_user_role(user_id=None):
+    if user_id is None:
+        _user_roles.invalidate()
+    else:
+        _user_roles.invalidate(user_id)
+
+
+# -------------------- THROTTLING --------------------
+def throttled(template, message, retry_after, reason):
+    metrics.login_throttled.inc(reason)
+    response = make_response(render_template(template, error=message), 429 if reason != 'busy' else 503)
+    response.headers['Retry-After'] = str(max(math.ceil(retry_after), 1))
+    return response
+
+
+def login_wait(username):
+    """(seconds to wait, limiting key) for a login attempt; seconds is 0 when it may proceed."""
+    ip_wait = _ip_attempts.take(request.remote_addr or '')
+    if ip_wait:
+        return ip_wait, 'ip'
+    user_wait = _user_attempts.take(username.lower())
+    return user_wait, 'username'
+
 
 # -------------------- LOGIN --------------------
 @auth_bp.route('/login.html', methods=['GET', 'POST'])
@@ -12,15 +59,35 @@ def login():
         username = request.form['Username']
         password = request.form['password']
 
+        wait, reason = login_wait(username)
+        if wait:
+            return throttled('login.html', "Too many login attempts. Please try again shortly.", wait, reason)
+
         with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT UserID, HashedPassword, Role FROM User WHERE Username = %s", (username,))
             user = cursor.fetchone()
 
-        if user and check_password_hash(user[1], password):
+        # Hashing can wait on the hash executor, so no pool connection is held meanwhile.
+        try:
+            # Unknown usernames are checked against a dummy hash so they cost as much as a wrong password.
+            valid = verify_password(user[1] if user else None, password)
+            if valid and needs_rehash(user[1]):
+                # Move the stored hash onto the current policy while we hold the plaintext.
+                new_hash = hash_password(password)
+                with get_connection() as conn:
+                    conn.cursor().execute("UPDATE User SET HashedPassword = %s WHERE UserID = %s",
+                                          (new_hash, user[0]))
+                    conn.commit()
+        except HashingBusy:
+            return throttled('login.html', "The server is busy. Please try again shortly.", 1, 'busy')
+
+        if valid:
+            rotate_session(session)
             session['user_id'] = user[0]
             session['role'] = user[2]
             session['username'] = username
+            _user_roles.set(user[0], user[2])
             flash(f"Welcome back, {username}!")
             return redirect(url_for('main_page'))
 
@@ -38,19 +105,30 @@ def sign_up():
         email = request.form['Email']
         username = request.form['Username']
         password = request.form['password']
-        hashed_password = generate_password_hash(password)
+
+        wait = _ip_attempts.take(request.remote_addr or '')
+        if wait:
+            return throttled('signUp.html', "Too many attempts. Please try again shortly.", wait, 'ip')
+        try:
+            hashed_password = hash_password(password)
+        except HashingBusy:
+            return throttled('signUp.html', "The server is busy. Please try again shortly.", 1, 'busy')
 
         with get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO User (Username, FirstName, LastName, Email, HashedPassword, Role)
-                VALUES (%s, %s, %s, %s, %s, 'customer')
-            """, (username, firstname, lastname, email, hashed_password))
+            try:
+                cursor.execute("""
+                    INSERT INTO User (Username, FirstName, LastName, Email, HashedPassword, Role)
+                    VALUES (%s, %s, %s, %s, %s, 'customer')
+                """, (username, firstname, lastname, email, hashed_password))
+            except IntegrityError:
+                return render_template('signUp.html', error="That username or email is already registered.")
             conn.commit()
 
             cursor.execute("SELECT UserID FROM User WHERE Username = %s", (username,))
             user_id = cursor.fetchone()[0]
 
+        rotate_session(session)
         session['user_id'] = user_id
         session['username'] = username
         session['role'] = 'customer'
@@ -99,7 +177,10 @@ def change_password():
         if not username:
             return "Username not found, please retry the process.", 400
 
-        hashed_password = generate_password_hash(password)
+        try:
+            hashed_password = hash_password(password)
+        except HashingBusy:
+            return "The server is busy. Please try again shortly.", 503
 
         with get_connection() as conn:
             cursor = conn.cursor()
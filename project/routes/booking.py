@@ -1,53 +1,76 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, jsonify
 from datetime import datetime
-from decimal import Decimal
-from db import get_connection
+import time
+from db import get_connection, get_read_connection
+from config import Config
+from cache import make_cache
+from refdata import get_hotel_id
+from ratecalendar import quote, quote_many
+from inventory import RoomUnavailable
+from reservations import book, cancel, cancellation_fees, fetch_cancellation_fees, CLOSED_STATUSES
+from search import search_availability
+from archive import fetch_bookings, count_bookings
 
 booking_bp = Blueprint('booking', __name__)
 
+_booking_counts = make_cache('booking_counts', Config.BOOKING_COUNT_CACHE_SIZE, Config.BOOKING_COUNT_CACHE_TTL)
+
+# ---------------- READ ROUTING ---------------- #
+
+def read_connection():
+    """Replica connection for this request's reads, or the primary right after the user's own write."""
+    return get_read_connection(session.get('last_write_at'))
+
+def note_write():
+    """Pin the user's reads to the primary until replicas have caught up with this write."""
+    session['last_write_at'] = time.time()
+
 # ---------------- PRICE CALCULATION ---------------- #
 
-def calculate_total_price(check_in_date_str, check_out_date_str, booking_date_str, hotel_id, room_type_id, num_guests, db_cursor):
+def calculate_total_price(check_in_date_str, check_out_date_str, booking_date_str, hotel_id, room_type_id, num_guests, db_cursor=None):
     check_in = datetime.strptime(check_in_date_str, "%Y-%m-%d")
     check_out = datetime.strptime(check_out_date_str, "%Y-%m-%d")
     booking_date = datetime.strptime(booking_date_str, "%Y-%m-%d")
 
-    db_cursor.execute(
-        "SELECT PeakRate, OffPeakRate FROM Rate WHERE HotelID = %s AND RoomTypeID = %s",
-        (hotel_id, room_type_id)
-    )
-    result = db_cursor.fetchone()
-    if not result:
-        raise Exception("Rate not found for this hotel and room type")
-
-    peak_rate, off_peak_rate = map(Decimal, result)
-
-    peak_months = [4, 5, 6, 7, 8, 11, 12]
-    is_peak = check_in.month in peak_months
-    daily_rate = peak_rate if is_peak else off_peak_rate
-
-    if room_type_id == 2:
-        daily_rate *= Decimal("1.2")
-        if num_guests == 2:
-            daily_rate += peak_rate * Decimal("0.1")
-    elif room_type_id == 3:
-        daily_rate *= Decimal("1.5")
-
-    nights = (check_out - check_in).days
-    base_price = daily_rate * nights
-
-    days_advance = (check_in - booking_date).days
-    if 80 <= days_advance <= 90:
-        discount = Decimal("0.3")
-    elif 60 <= days_advance < 80:
-        discount = Decimal("0.2")
-    elif 45 <= days_advance < 60:
-        discount = Decimal("0.1")
-    else:
-        discount = Decimal("0")
-
-    final_price = base_price * (1 - discount)
-    return base_price.quantize(Decimal("0.01")), final_price.quantize(Decimal("0.01"))
+    return quote(hotel_id, room_type_id, check_in, check_out, booking_date, num_guests, db_cursor)
+
+def calculate_total_prices(items, booking_date, hotel_ids_by_name):
+    """Price a batch of quote requests from the rate calendar, one result per item."""
+    parsed_dates = {}
+
+    def parse(value):
+        if value not in parsed_dates:
+            parsed_dates[value] = datetime.strptime(value, "%Y-%m-%d")
+        return parsed_dates[value]
+
+    stays, errors = [], {}
+    for index, item in enumerate(items):
+        try:
+            if item.get("hotelId") is not None:
+                hotel_id = int(item["hotelId"])
+            else:
+                hotel_id = hotel_ids_by_name.get(item.get("hotelName"))
+                if hotel_id is None:
+                    raise ValueError("Hotel not found")
+            stays.append((
+                hotel_id, int(item["roomTypeId"]), parse(item["checkInDate"]), parse(item["checkOutDate"]),
+                booking_date, int(item["guests"])
+            ))
+        except KeyError as e:
+            errors[index] = f"Missing field {e}"
+        except (TypeError, ValueError) as e:
+            errors[index] = str(e)
+
+    quotes = iter(quote_many(stays))
+    results = []
+    for index in range(len(items)):
+        quote = None if index in errors else next(quotes)
+        error = errors.get(index) or quote.error
+        if error:
+            results.append({"error": error})
+        else:
+            results.append({"total_price": float(quote.total_price), "discounted_price": float(quote.discounted_price)})
+    return results
 
 # ---------------- BOOKING HANDLING ---------------- #
 
@@ -61,6 +84,7 @@ def handle_booking_submission():
     booking_date = request.form['booking-date']
     guests = int(request.form['noOfGuests'])
     currency = "GBP"
+    idempotency_key = request.form.get('idempotency_key', '').strip()[:64] or None
 
     with get_connection() as conn:
         cursor = conn.cursor()
@@ -69,43 +93,28 @@ def handle_booking_submission():
             check_in, check_out, booking_date, hotel_id, room_type_id, guests, cursor
         )
 
-        cursor.execute("""
-            SELECT RoomID, RoomNumber FROM Room
-            WHERE HotelID = %s AND RoomTypeID = %s AND IsAvailable = 1
-            LIMIT 1
-        """, (hotel_id, room_type_id))
-        room = cursor.fetchone()
-        if not room:
-            return render_template('no_rooms.html')
-
-        room_id, room_number = room
-
-        cursor.execute("""
-            INSERT INTO Booking (UserID, HotelID, RoomTypeID, RoomID, CheckIn, CheckOut, BookingDate, NoOfGuests, TotalPrice, BookingCurrency, Status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (user_id, hotel_id, room_type_id, room_id, check_in, check_out, booking_date, guests, discounted, currency, 'Confirmed'))
-        booking_id = cursor.lastrowid
-        session['latest_booking_id'] = booking_id
-
-        cursor.execute("UPDATE Room SET IsAvailable = 0 WHERE RoomID = %s", (room_id,))
-
-        cursor.execute("""
-            INSERT INTO Receipt (BookingID, TotalPrice, PaymentDate)
-            VALUES (%s, %s, %s)
-        """, (booking_id, discounted, datetime.now().date()))
+        try:
+            booked = book(
+                conn, user_id, hotel_id, room_type_id, check_in, check_out, booking_date, guests,
+                discounted, currency, idempotency_key
+            )
+        except RoomUnavailable:
+            return render_template('noMoreRooms.html')
 
-        conn.commit()
+    session['latest_booking_id'] = booked.booking_id
+    note_write()
+    invalidate_booking_counts(user_id)
 
     return render_template(
         'booking_success.html',
-        room_number=room_number,
-        check_in=check_in,
-        check_out=check_out,
-        guests=guests,
-        total_price=discounted,
-        currency=currency,
-        receipt_id=booking_id,
-        payment_date=datetime.now().date()
+        room_number=booked.room_number,
+        check_in=booked.check_in,
+        check_out=booked.check_out,
+        guests=booked.guests,
+        total_price=booked.total_price,
+        currency=booked.currency,
+        receipt_id=booked.booking_id,
+        payment_date=booked.payment_date
     )
 
 # ---------------- PRICE CHECK ---------------- #
@@ -123,65 +132,130 @@ def calculate_price():
         if not all([room_type_id, check_in, check_out, guests, hotel_name]):
             return jsonify({"error": "Missing required fields"}), 400
 
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT HotelID FROM Hotel WHERE HotelName = %s", (hotel_name,))
-            result = cursor.fetchone()
-            if not result:
-                return jsonify({"error": "Hotel not found"}), 400
+        hotel_id = get_hotel_id(hotel_name)
+        if hotel_id is None:
+            return jsonify({"error": "Hotel not found"}), 400
 
-            hotel_id = result[0]
-            original, discounted = calculate_total_price(
-                check_in, check_out, booking_date, hotel_id, room_type_id, guests, cursor
-            )
+        original, discounted = calculate_total_price(
+            check_in, check_out, booking_date, hotel_id, room_type_id, guests
+        )
 
-            return jsonify({
-                "total_price": float(original),
-                "discounted_price": float(discounted)
-            })
+        return jsonify({
+            "total_price": float(original),
+            "discounted_price": float(discounted)
+        })
 
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+@booking_bp.route('/calculate_prices', methods=['POST'])
+def calculate_prices():
+    payload = request.get_json(silent=True) or {}
+    items = payload.get("quotes") if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items or not all(isinstance(i, dict) for i in items):
+        return jsonify({"error": "Expected a non-empty list of quotes"}), 400
+    if len(items) > Config.QUOTE_BATCH_LIMIT:
+        return jsonify({"error": f"At most {Config.QUOTE_BATCH_LIMIT} quotes per request"}), 400
+
+    hotel_ids_by_name = {}
+    for item in items:
+        if item.get("hotelId") is None and item.get("hotelName") not in hotel_ids_by_name:
+            hotel_ids_by_name[item.get("hotelName")] = get_hotel_id(item.get("hotelName"))
+
+    booking_date = datetime.combine(datetime.today().date(), datetime.min.time())
+    return jsonify({"quotes": calculate_total_prices(items, booking_date, hotel_ids_by_name)})
+
+# ---------------- AVAILABILITY SEARCH ---------------- #
+
+@booking_bp.route('/search')
+def search_rooms():
+    try:
+        check_in = datetime.strptime(request.args.get("checkInDate", ""), "%Y-%m-%d")
+        check_out = datetime.strptime(request.args.get("checkOutDate", ""), "%Y-%m-%d")
+        guests = int(request.args.get("guests", 1))
+    except ValueError:
+        return jsonify({"error": "checkInDate and checkOutDate (YYYY-MM-DD) and a numeric guests are required"}), 400
+    if check_out <= check_in:
+        return jsonify({"error": "Check-out date must be after check-in date"}), 400
+    if guests < 1:
+        return jsonify({"error": "guests must be at least 1"}), 400
+
+    booking_date = datetime.combine(datetime.today().date(), datetime.min.time())
+    results, complete = search_availability(check_in, check_out, guests, booking_date)
+    return jsonify({"results": results, "complete": complete})
+
 # ---------------- MY BOOKINGS ---------------- #
 
+def count_user_bookings(cursor, user_id):
+    """Total bookings for the user (live and archived), cached so paging doesn't recount every request."""
+    def load():
+        return count_bookings(cursor, ["b.UserID = %s"], [user_id])
+    return _booking_counts.get_or_load(user_id, load)
+
+def invalidate_booking_counts(user_id=None):
+    if user_id is None:
+        _booking_counts.invalidate()
+    else:
+        _booking_counts.invalidate(user_id)
+
 @booking_bp.route('/my_bookings')
 def my_bookings():
     if 'user_id' not in session:
         return redirect(url_for('auth.login'))
 
     user_id = session['user_id']
-    page = request.args.get('page', 1, type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
     per_page = 10
-    offset = (page - 1) * per_page
 
-    with get_connection() as conn:
+    # Keyset pagination on (UserID, BookingID): every page is an index range
+    # scan of per_page + 1 rows, however far back the user pages. Archived
+    # (long past) bookings are only read once the page reaches them.
+    columns = ("b.BookingID, b.HotelID, b.RoomID, b.CheckIn, b.CheckOut, b.NoOfGuests, b.Status, h.HotelName, "
+               "b.TotalPrice")
+    joins = ["JOIN Hotel h ON b.HotelID = h.HotelID"]
+    with read_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM Booking WHERE UserID = %s", (user_id,))
-        total = cursor.fetchone()[0]
-        total_pages = (total + per_page - 1) // per_page
-
-        cursor.execute("""
-            SELECT b.BookingID, b.HotelID, b.RoomID, b.CheckIn, b.CheckOut, b.NoOfGuests, b.Status, h.HotelName
-            FROM Booking b
-            JOIN Hotel h ON b.HotelID = h.HotelID
-            WHERE b.UserID = %s
-            ORDER BY b.BookingID DESC
-            LIMIT %s OFFSET %s
-        """, (user_id, per_page, offset))
-        bookings = cursor.fetchall()
-
-    return render_template('my_bookings.html', bookings=bookings, page=page, total_pages=total_pages)
+        total = count_user_bookings(cursor, user_id)
+        total_pages = max((total + per_page - 1) // per_page, 1)
+
+        if before is not None:
+            rows = fetch_bookings(cursor, columns, joins, ["b.UserID = %s", "b.BookingID > %s"],
+                                  [user_id, before], 'ASC', per_page + 1)
+            has_newer = len(rows) > per_page
+            bookings = rows[:per_page][::-1]
+            has_older = True
+        else:
+            clauses, params = ["b.UserID = %s"], [user_id]
+            if after is not None:
+                clauses.append("b.BookingID < %s")
+                params.append(after)
+            rows = fetch_bookings(cursor, columns, joins, clauses, params, 'DESC', per_page + 1)
+            has_older = len(rows) > per_page
+            bookings = rows[:per_page]
+            has_newer = after is not None
+
+    if before is not None and not has_newer:
+        page = 1
+
+    # Today's cancellation fee for every open booking on the page, so the
+    # Cancel confirmation needs no request of its own.
+    fees = cancellation_fees(
+        [(row[0], row[3], row[8]) for row in bookings if row[6] not in CLOSED_STATUSES and not row[-1]], datetime.today().date()
+    )
 
-# ---------------- CANCELLATION ---------------- #
+    return render_template(
+        'my_bookings.html',
+        bookings=bookings,
+        fees=fees,
+        page=page,
+        total_pages=total_pages,
+        newer_cursor=bookings[0][0] if bookings and has_newer else None,
+        older_cursor=bookings[-1][0] if bookings and has_older else None
+    )
 
-def calculate_cancellation_fee(booking_date, check_in, cancellation_date, total_price):
-    days_before = (check_in - cancellation_date).days
-    if days_before > 60:
-        return 0.0
-    elif 30 <= days_before <= 60:
-        return total_price * 0.5
-    return total_price
+# ---------------- CANCELLATION ---------------- #
 
 @booking_bp.route('/cancel_booking', methods=['POST'])
 def cancel_booking():
@@ -192,46 +266,47 @@ def cancel_booking():
     user_id = session['user_id']
 
     with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT RoomID, CheckIn, BookingDate, TotalPrice
-            FROM Booking WHERE BookingID = %s AND UserID = %s
-        """, (booking_id, user_id))
-        result = cursor.fetchone()
-        if not result:
-            return "Unauthorized or not found", 403
-
-        room_id, check_in, booking_date, total_price = result
-        check_in = datetime.strptime(str(check_in), "%Y-%m-%d")
-        booking_date = datetime.strptime(str(booking_date), "%Y-%m-%d")
-        today = datetime.now().date()
-        fee = calculate_cancellation_fee(booking_date, check_in.date(), today, float(total_price))
-
-        cursor.execute("UPDATE Booking SET Status = 'Cancelled' WHERE BookingID = %s", (booking_id,))
-        cursor.execute("UPDATE Room SET IsAvailable = 1 WHERE RoomID = %s", (room_id,))
-        cursor.execute("""
-            INSERT INTO Cancellations (CancellationDate, CancellationFee, BookingID)
-            VALUES (%s, %s, %s)
-        """, (today, fee, booking_id))
-        conn.commit()
+        fee = cancel(conn, booking_id, user_id, datetime.now().date())
+    if fee is None:
+        return "Unauthorized or not found", 403
+    note_write()
 
     return redirect(url_for('booking.my_bookings'))
 
 @booking_bp.route('/check_cancellation_fee')
 def check_cancellation_fee():
     booking_id = request.args.get('booking_id')
-    with get_connection() as conn:
+    with read_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT CheckIn, BookingDate, TotalPrice FROM Booking WHERE BookingID = %s", (booking_id,))
+        cursor.execute("SELECT BookingID, CheckIn, TotalPrice FROM Booking WHERE BookingID = %s", (booking_id,))
         row = cursor.fetchone()
-        if not row:
-            return jsonify({"error": "Booking not found"}), 404
-
-        check_in, booking_date, price = row
-        fee = calculate_cancellation_fee(
-            datetime.strptime(str(booking_date), "%Y-%m-%d"),
-            datetime.strptime(str(check_in), "%Y-%m-%d").date(),
-            datetime.today().date(),
-            float(price)
-        )
-        return jsonify({"fee": round(fee, 2)})
+    if not row:
+        return jsonify({"error": "Booking not found"}), 404
+    return jsonify({"fee": cancellation_fees([row], datetime.today().date())[row[0]]})
+
+@booking_bp.route('/cancellation_fees', methods=['GET', 'POST'])
+def bulk_cancellation_fees():
+    """Today's fee for each of the user's open bookings, or only the booking_id values given."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Login required"}), 401
+
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Expected a JSON object with booking_ids"}), 400
+    booking_ids = payload.get("booking_ids", request.values.getlist('booking_id'))
+    if not isinstance(booking_ids, list):
+        return jsonify({"error": "booking_ids must be a list"}), 400
+    try:
+        booking_ids = [int(booking_id) for booking_id in booking_ids]
+    except (TypeError, ValueError):
+        return jsonify({"error": "booking_ids must be numbers"}), 400
+    if len(booking_ids) > Config.CANCELLATION_FEE_BATCH_LIMIT:
+        return jsonify({"error": f"At most {Config.CANCELLATION_FEE_BATCH_LIMIT} bookings per request"}), 400
+
+    today = datetime.today().date()
+    with read_connection() as conn:
+        fees = fetch_cancellation_fees(conn.cursor(), session['user_id'], today, booking_ids)
+    return jsonify({
+        "cancellation_date": today.isoformat(),
+        "fees": {str(booking_id): fee for booking_id, fee in fees.items()}
+    })
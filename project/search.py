@@ -0,0 +1,96 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from mysql.connector import Error
+from config import Config
+from db import get_read_connection, PoolError
+from inventory import count_free_rooms_by_type
+from ratecalendar import NOT_READY, quote_many
+from refdata import get_hotels, get_room_types
+
+# Availability across every hotel is counted with grouped queries, one per
+# chunk of hotels, each on its own pooled connection. The hotels are split
+# into at most SEARCH_WORKERS chunks (of at least SEARCH_CHUNK_SIZE hotels),
+# so a search on an idle executor runs as a single parallel wave. The executor
+# is shared per process, and SEARCH_WORKERS caps how many pool connections
+# searches hold at once. Concurrent searches therefore queue behind each
+# other's chunks, and a busy process answers in several waves.
+
+logger = logging.getLogger('worldhotels.search')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=Config.SEARCH_WORKERS, thread_name_prefix='search')
+    return _executor
+
+
+def _count_chunk(hotel_ids, room_type_ids, check_in, check_out):
+    # Counts are only indicative (booking re-checks on the primary), so replica lag is fine.
+    with get_read_connection() as conn:
+        return count_free_rooms_by_type(conn.cursor(), hotel_ids, room_type_ids, check_in, check_out)
+
+
+def search_availability(check_in, check_out, guests, booking_date):
+    """Price every hotel/room type with a free room for the stay; returns (results, complete).
+
+    `complete` is False when a chunk failed or timed out, or a hotel's rate
+    calendar isn't built yet; the results then only cover the hotels that could be priced.
+    """
+    room_types = {
+        room_type_id: type_name
+        for room_type_id, type_name, max_guests in get_room_types() if max_guests >= guests
+    }
+    hotels = {hotel_id: hotel_name for hotel_id, hotel_name, _ in get_hotels()}
+    if not room_types or not hotels:
+        return [], True
+
+    hotel_ids, room_type_ids = list(hotels), sorted(room_types)
+    size = max(Config.SEARCH_CHUNK_SIZE, -(-len(hotel_ids) // Config.SEARCH_WORKERS))
+    executor = get_executor()
+    futures = [
+        executor.submit(_count_chunk, hotel_ids[i:i + size], room_type_ids, check_in, check_out)
+        for i in range(0, len(hotel_ids), size)
+    ]
+    done, pending = wait(futures, timeout=Config.SEARCH_TIMEOUT)
+    for future in pending:
+        future.cancel()
+
+    free, complete = {}, not pending
+    for future in done:
+        try:
+            free.update(future.result())
+        except (PoolError, Error) as e:
+            logger.warning("Availability chunk failed: %s", e)
+            complete = False
+        except Exception:
+            # A bug in one chunk still leaves the other hotels searchable.
+            logger.exception("Availability chunk raised")
+            complete = False
+
+    # Prices come only from calendars already built by the refresher (see ratecalendar).
+    keys = sorted(free)
+    quotes = quote_many([(h, t, check_in, check_out, booking_date, guests) for h, t in keys], load=False)
+
+    results = []
+    for (hotel_id, room_type_id), quote in zip(keys, quotes):
+        if quote.error:
+            if quote.error == NOT_READY:
+                complete = False
+            continue
+        results.append({
+            "hotelId": hotel_id,
+            "hotelName": hotels[hotel_id],
+            "roomTypeId": room_type_id,
+            "roomType": room_types[room_type_id],
+            "freeRooms": free[(hotel_id, room_type_id)],
+            "total_price": float(quote.total_price),
+            "discounted_price": float(quote.discounted_price),
+        })
+    return results, complete
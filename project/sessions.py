@@ -0,0 +1,212 @@
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+# Server-side sessions: the cookie only carries a random session id and the
+# data lives in a store. 'memory' is per process (one worker only); 'file'
+# and 'sqlite' are shared by every worker on the host. SESSION_BACKEND=cookie
+# keeps Flask's default signed-cookie sessions.
+
+_serializer = TaggedJSONSerializer()
+_SID = re.compile(r'^[A-Za-z0-9_-]{32,64}$')
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, expires_at=None):
+        def on_update(session):
+            session.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.new = sid is None
+        self.modified = False
+        self.previous_sid = None
+
+    def regenerate(self):
+        """Move the data to a fresh session id (call on login to prevent session fixation)."""
+        if self.sid is not None and self.previous_sid is None:
+            self.previous_sid = self.sid
+        self.sid = None
+        self.modified = True
+
+
+# ---------- Stores ----------
+class MemoryStore:
+    def __init__(self):
+        self._data = {}  # sid -> (expires_at, payload)
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def load(self, sid):
+        with self._lock:
+            entry = self._data.get(sid)
+        if entry is None or entry[0] <= time.time():
+            return None
+        return entry
+
+    def save(self, sid, payload, expires_at):
+        with self._lock:
+            self._data[sid] = (expires_at, payload)
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                now = time.time()
+                for key in [k for k, (expires, _) in self._data.items() if expires <= now]:
+                    del self._data[key]
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+
+class FileStore:
+    """One file per session; writes go through a temp file and an atomic rename."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sid):
+        return os.path.join(self.directory, sid)
+
+    def load(self, sid):
+        try:
+            with open(self._path(sid), encoding='utf-8') as f:
+                expires_at, payload = float(f.readline()), f.read()
+        except (OSError, ValueError):
+            return None
+        if expires_at <= time.time():
+            self.delete(sid)
+            return None
+        return expires_at, payload
+
+    def save(self, sid, payload, expires_at):
+        tmp = f"{self._path(sid)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(f"{expires_at}\n{payload}")
+        os.replace(tmp, self._path(sid))
+
+    def delete(self, sid):
+        try:
+            os.remove(self._path(sid))
+        except FileNotFoundError:
+            pass
+
+
+class SQLiteStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    sid TEXT PRIMARY KEY,
+                    expires_at REAL NOT NULL,
+                    payload TEXT NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5)
+        return conn
+
+    def load(self, sid):
+        row = self._connect().execute(
+            "SELECT expires_at, payload FROM sessions WHERE sid = ? AND expires_at > ?", (sid, time.time())
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def save(self, sid, payload, expires_at):
+        with self._connect() as conn:
+            conn.execute("REPLACE INTO sessions (sid, expires_at, payload) VALUES (?, ?, ?)",
+                         (sid, expires_at, payload))
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, sid):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+
+# ---------- Session interface ----------
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, store, ttl):
+        self.store = store
+        self.ttl = ttl
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and _SID.match(sid):
+            entry = self.store.load(sid)
+            if entry is not None:
+                expires_at, payload = entry
+                return ServerSession(_serializer.loads(payload), sid, expires_at)
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.previous_sid:
+            self.store.delete(session.previous_sid)
+
+        if not session:
+            if session.sid is not None:
+                self.store.delete(session.sid)
+            if session.modified or session.previous_sid:
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = time.time()
+        # Unchanged sessions are only rewritten once half their lifetime has passed.
+        stale = session.expires_at is None or session.expires_at - now < self.ttl / 2
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+        elif not session.modified and not stale:
+            return
+
+        self.store.save(session.sid, _serializer.dumps(dict(session)), now + self.ttl)
+        response.set_cookie(
+            name, session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+def rotate_session(session):
+    """Issue a new session id for the current data, where the backend supports it."""
+    regenerate = getattr(session, 'regenerate', None)
+    if regenerate is not None:
+        regenerate()
+
+
+def make_store(config):
+    backend = config.SESSION_BACKEND
+    if backend == 'memory':
+        return MemoryStore()
+    if backend == 'file':
+        return FileStore(config.SESSION_FILE_DIR)
+    if backend == 'sqlite':
+        return SQLiteStore(config.SESSION_SQLITE_PATH)
+    raise ValueError(f"Unknown SESSION_BACKEND {backend!r}")
+
+
+def init_app(app, config):
+    if config.SESSION_BACKEND == 'cookie':
+        return
+    app.session_interface = ServerSessionInterface(make_store(config), config.SESSION_TTL)
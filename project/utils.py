@@ -1,53 +1,19 @@
 from datetime import datetime
+from pricing import parse_date, discount_rate
+from ratecalendar import quote
 
-def calculate_total_price(check_in_date_str, check_out_date_str, booking_date_str, hotel_id, room_type_id, num_guests, db_cursor):
-    """Calculate total and discounted price for a hotel booking."""
-    check_in = datetime.strptime(check_in_date_str, '%Y-%m-%d')
-    check_out = datetime.strptime(check_out_date_str, '%Y-%m-%d')
-    booking_date = datetime.strptime(booking_date_str, '%Y-%m-%d')
+def calculate_total_price(check_in_date_str, check_out_date_str, booking_date_str, hotel_id, room_type_id, num_guests, db_cursor=None):
+    """Calculate total and discounted price for a hotel booking (dict form of ratecalendar.quote)."""
+    check_in = parse_date(check_in_date_str)
+    booking_date = parse_date(booking_date_str)
 
-    num_nights = (check_out - check_in).days
-    if num_nights <= 0:
-        raise ValueError("Check-out date must be after check-in date.")
-
-    db_cursor.execute(
-        "SELECT PeakRate, OffPeakRate FROM Rate WHERE HotelID = %s AND RoomTypeID = %s",
-        (hotel_id, room_type_id)
+    total_price, discounted_price = quote(
+        hotel_id, room_type_id, check_in, parse_date(check_out_date_str), booking_date, num_guests, db_cursor
     )
-    rates = db_cursor.fetchone()
-    if not rates:
-        raise ValueError("Rate not found for the selected hotel and room type.")
-    
-    peak_rate, off_peak_rate = rates
-    is_peak = check_in.month in {4, 5, 6, 7, 8, 11, 12}
-    base_rate = peak_rate if is_peak else off_peak_rate
-
-    # Room type multipliers
-    multiplier = 1.0
-    if room_type_id == 2:
-        multiplier = 1.2 + (0.1 if num_guests == 2 else 0)
-    elif room_type_id == 3:
-        multiplier = 1.5
-
-    total_price = num_nights * base_rate * multiplier
-
-    # Discount logic
-    days_advance = (check_in - booking_date).days
-    if days_advance >= 80:
-        discount = 0.30
-    elif days_advance >= 60:
-        discount = 0.20
-    elif days_advance >= 45:
-        discount = 0.10
-    else:
-        discount = 0.0
-
-    discounted_price = round(total_price * (1 - discount), 2)
-
     return {
-        'total_price': round(total_price, 2),
-        'discounted_price': discounted_price,
-        'discount_percent': int(discount * 100)
+        'total_price': float(total_price),
+        'discounted_price': float(discounted_price),
+        'discount_percent': int(discount_rate((check_in - booking_date).days) * 100)
     }
 
 